@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import orjson
+
+from sqlite_store import SQLiteStore
+
+
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+# Only bump last_access on a hit if it is older than this, so hot reads do
+# not turn into a write per request
+TOUCH_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_last_access ON analyses (last_access);
+"""
+
+
+def prompt_version(prompt):
+    """
+    Short content hash of a prompt template; editing the prompt invalidates
+    every entry generated with the old one.
+    """
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def normalize_emotion(emotion, step=10):
+    """
+    Canonical form of a DeepFace emotion dict: percentages rounded to `step`,
+    zero buckets dropped. Nearby frames map to the same cache key.
+    """
+    total = sum(float(emotion.get(e, 0.0)) for e in EMOTIONS) or 1.0
+    buckets = []
+    for e in EMOTIONS:
+        pct = float(emotion.get(e, 0.0)) * 100.0 / total
+        rounded = int(round(pct / step) * step)
+        if rounded:
+            buckets.append(f"{e}={rounded}")
+    return ",".join(buckets) or "neutral=100"
+
+
+def state_key(dominant, energy):
+    """
+    Coarse cache key for a (dominant emotion, energy level) state; these are
+    few enough to precompute them all.
+    """
+    return f"state:{dominant}/{energy}"
+
+
+class AnalysisCache(SQLiteStore):
+    """
+    Persistent LLM analysis cache in a SQLite database in WAL mode.
+
+    WAL lets every worker on the host read concurrently while one writes, so
+    there is no global lock on the read path. The async methods run their
+    queries on a small thread pool, so a write waiting on another worker's
+    lock never stalls the event loop. The table is trimmed back to
+    `max_entries` by least recent access every `check_every` inserts (other
+    workers' inserts included, it can briefly run over by that much).
+    """
+
+    def __init__(self, path, max_entries=5000, check_every=None):
+        self.max_entries = max_entries
+        self.check_every = check_every or max(1, max_entries // 50)
+        self._puts = 0
+        super().__init__(path, SCHEMA)
+
+    @staticmethod
+    def make_key(model, version, emotion_key):
+        return hashlib.sha256(f"{model}\0{version}\0{emotion_key}".encode("utf-8")).hexdigest()
+
+    def _get(self, model, version, emotion_key):
+        key = self.make_key(model, version, emotion_key)
+        conn = self._conn()
+        row = conn.execute("SELECT value, last_access FROM analyses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:
+            try:
+                conn.execute("UPDATE analyses SET last_access = ? WHERE key = ?", (now, key))
+            except sqlite3.OperationalError:
+                pass  # another worker holds the write lock; the touch can wait
+        return orjson.loads(row[0])
+
+    def _get_any(self, models, version, emotion_key):
+        for model in models:
+            value = self._get(model, version, emotion_key)
+            if value is not None:
+                return value, model
+        return None, None
+
+    def _newest(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        row = self._conn().execute(
+            f"SELECT MAX(created) FROM analyses WHERE key IN ({placeholders})", keys
+        ).fetchone()
+        return row[0]
+
+    def _put(self, model, version, emotion_key, value, evict):
+        key = self.make_key(model, version, emotion_key)
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO analyses (key, model, prompt_version, value, created, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, version, orjson.dumps(value), now, now),
+        )
+        if evict:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM analyses WHERE key IN "
+                "(SELECT key FROM analyses ORDER BY last_access LIMIT ?)",
+                (excess,),
+            )
+
+    async def get(self, model, version, emotion_key):
+        return await self._run(self._get, model, version, emotion_key)
+
+    async def get_any(self, models, version, emotion_key):
+        """
+        First hit across models in preference order: (value, model) or (None, None).
+        """
+        return await self._run(self._get_any, list(models), version, emotion_key)
+
+    async def newest(self, models, version, emotion_key):
+        """
+        Creation time of the newest entry for this key across models, or None.
+        """
+        keys = [self.make_key(model, version, emotion_key) for model in models]
+        if not keys:
+            return None
+        return await self._run(self._newest, keys)
+
+    async def put(self, model, version, emotion_key, value):
+        self._puts += 1
+        evict = self._puts >= self.check_every
+        if evict:
+            self._puts = 0
+        await self._run(self._put, model, version, emotion_key, value, evict)
+
+    def __len__(self):
+        # Blocking; for tools and tests, not the request path
+        return self._conn().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+
+def cache_from_env():
+    path = os.getenv("EMOTICAM_CACHE_PATH", os.path.join("cache", "analyses.sqlite3"))
+    max_entries = int(os.getenv("EMOTICAM_CACHE_MAX_ENTRIES", "5000"))
+    return AnalysisCache(path, max_entries=max_entries)
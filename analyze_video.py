@@ -0,0 +1,145 @@
+"""
+Offline emotion timeline for recorded sessions.
+
+    python analyze_video.py session.mp4 [more.mp4 ...] --sample-fps 2 --workers 4
+
+Frames are stream-decoded with OpenCV (frames between samples are only
+grabbed, never decoded), fanned out to a process pool running the same
+per-frame analysis as app.py (frame_pipeline, so EMOTICAM_PIPELINE_MODE=gray
+decodes and analyzes luminance only here too), and written in order to
+<video>.emotions.jsonl. At most --max-inflight frames are held in memory, so
+multi-hour files run in constant memory.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+from serialization import dumps_bytes
+
+
+def _init_worker():
+    # Build the detector and models once per worker process, through the
+    # same pipeline _analyze uses
+    from emotion_pipeline import frame_pipeline, warm_up
+    warm_up(*frame_pipeline())
+
+
+def _analyze(frame):
+    from emotion_pipeline import frame_pipeline
+    analyze, _ = frame_pipeline()
+    try:
+        faces = analyze(frame)
+    except Exception as e:
+        return {"error": str(e)}
+    best = max(faces, key=lambda f: f.get("face_confidence") or 0)
+    return {
+        "faces": len(faces),
+        "dominant_emotion": best["dominant_emotion"],
+        "emotion": best["emotion"],
+        "region": best.get("region"),
+    }
+
+
+def iter_frames(path, sample_fps, max_width=None, mode="RGB"):
+    """
+    Yield (frame_index, timestamp_seconds, frame) at roughly sample_fps;
+    frames are RGB, or grayscale with mode="L", as decode_frame returns them.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise OSError(f"Cannot open video: {path}")
+    conversion = cv2.COLOR_BGR2GRAY if mode == "L" else cv2.COLOR_BGR2RGB
+    native_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, int(round(native_fps / sample_fps))) if sample_fps else 1
+
+    index = 0
+    try:
+        while True:
+            if index % step:
+                # Advance without decoding the frame
+                if not capture.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if max_width and frame.shape[1] > max_width:
+                scale = max_width / frame.shape[1]
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            # app.py feeds the pipeline PIL-decoded RGB or L arrays; match that
+            yield index, index / native_fps, cv2.cvtColor(frame, conversion)
+            index += 1
+    finally:
+        capture.release()
+
+
+def analyze_video(path, pool, output, sample_fps=2.0, max_inflight=32, max_width=None):
+    """
+    Analyze one video into a JSONL timeline; returns (frames, seconds).
+    """
+    from emotion_pipeline import frame_pipeline
+    _, mode = frame_pipeline()
+    started = time.perf_counter()
+    inflight = deque()
+    frames = 0
+
+    with open(output, "wb") as out:
+        def drain(limit):
+            nonlocal frames
+            while len(inflight) > limit:
+                index, timestamp, future = inflight.popleft()
+                record = {"frame": index, "t": round(timestamp, 3), **future.result()}
+                out.write(dumps_bytes(record) + b"\n")
+                frames += 1
+
+        for index, timestamp, frame in iter_frames(path, sample_fps, max_width, mode):
+            inflight.append((index, timestamp, pool.submit(_analyze, frame)))
+            # Bounded queue keeps memory flat and results in frame order
+            drain(max_inflight)
+        drain(0)
+
+    return frames, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-frame emotion timeline for video files")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--sample-fps", type=float, default=2.0, help="frames analyzed per second of video (0 = every frame)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-inflight", type=int, default=None, help="frames queued at once (default 4 x workers)")
+    parser.add_argument("--max-width", type=int, default=None, help="downscale wider frames before analysis")
+    parser.add_argument("--output-dir", default=None, help="where to write timelines (default: next to each video)")
+    args = parser.parse_args(argv)
+
+    max_inflight = args.max_inflight or 4 * args.workers
+    total_frames = 0
+    total_seconds = 0.0
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        for path in args.videos:
+            base = os.path.splitext(os.path.basename(path))[0] + ".emotions.jsonl"
+            directory = args.output_dir or os.path.dirname(os.path.abspath(path))
+            output = os.path.join(directory, base)
+            frames, seconds = analyze_video(
+                path, pool, output,
+                sample_fps=args.sample_fps,
+                max_inflight=max_inflight,
+                max_width=args.max_width,
+            )
+            total_frames += frames
+            total_seconds += seconds
+            print(f"{path}: {frames} frames in {seconds:.1f}s ({frames / max(seconds, 1e-9):.1f} fps) -> {output}")
+
+    if len(args.videos) > 1:
+        print(f"total: {total_frames} frames in {total_seconds:.1f}s ({total_frames / max(total_seconds, 1e-9):.1f} fps)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
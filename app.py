@@ -1,38 +1,144 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse 
+# Thread pools must be sized before TensorFlow, torch and OpenCV are imported
+import runtime_topology
+runtime_topology.configure_env()
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import re
-import json
+from typing import Optional
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 import os
-from PIL import Image
-import io
 import random
-import base64
 import torch
 # from llava import LlavaModel 
 # import your LLM client wrapper
-from client import get_client
+from client import client_kind, get_client
+from llm_analysis import parse_analysis
+from llm_router import LLMRouter, load_routes
+from llm_scheduler import BATCH, INTERACTIVE
+from serialization import ORJSONResponse, dumps
+from emotion_pipeline import (
+    PIPELINE_MODE, analyze_faces, decode_frame, frame_pipeline, group_pipeline, summarize_group, warm_up,
+)
+from face_models import ModelBudgetExceeded, registry as face_models
+from recommender import ENERGY_LEVELS, recommend
+from refinements import PENDING as REFINEMENT_PENDING, READY as REFINEMENT_READY, store_from_env as refinements_from_env
+from analysis_cache import cache_from_env, normalize_emotion, prompt_version, state_key
+from ingest import ImageRejected, decode_base64
+from frame_cache import FrameAnalysisCache, frame_digest
+from metrics import metrics
+from tracing import span, tracer
+from profiling import new_request_id, profiled_call, profiler
+from health import FAILED, READY, ServiceHealth
+from emotion_events import EmotionHub
+from sqlite_store import state_path_from_env
+from emotion_smoothing import EmotionSmoother
+from video_index import index_from_env
+from precompute import AnalysisRefresher, refresher_runs_here
+from timeline_store import EMOTIONS as TIMELINE_EMOTIONS, emotion_vector, store_from_env
 # from fer import FER
-from deepface import DeepFace
-import cv2
-import numpy as np
+
+runtime_topology.apply()
 
 import sys
 sys.path.append("/path/to/LLaVA")
 # from LLaVA.llava.model import 
 # Initialize app and model client
-app = FastAPI(title="Kids Emotion & Safe Content API", version="1.0")
+app = FastAPI(title="Kids Emotion & Safe Content API", version="1.0", default_response_class=ORJSONResponse)
 client = get_client()
+# Ordered models with deadlines, hedging and circuit breaking (EMOTICAM_LLM_MODELS)
+llm_router = LLMRouter(client, load_routes())
 
 
 
 sentiment_ans = "happy"
+# Per-session dominant emotion with change versions, for subscribers; the
+# versions are shared by workers so any of them can serve a subscription
+emotion_hub = EmotionHub(state_path_from_env(), default_emotion=sentiment_ans)
+
+# LLM analyses still running after /api/emotion has answered; shared by
+# workers so any of them can answer /api/emotion/refined
+refinements = refinements_from_env()
+
+# LLM analyses persisted across restarts and shared by workers (SQLite, WAL)
+analysis_cache = cache_from_env()
+
+# Curated searches inside vetted kids' channels, matched to an emotion
+# distribution locally
+video_index = index_from_env()
+
+# Per-session smoothed emotion state, shared by the workers; gates LLM re-analysis
+smoother = EmotionSmoother(state_path_from_env())
+
+# Append-only per-session emotion history (memory-mapped segment files)
+timeline = store_from_env()
+
+# Content-addressed per-frame results shared by all analysis endpoints
+frame_cache = FrameAnalysisCache()
+
+# Decode + DeepFace run here, off the event loop. One thread by default:
+# inference is CPU bound and the runtimes have their own intra-op threads.
+inference_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("EMOTICAM_INFERENCE_THREADS", "1")),
+    thread_name_prefix="inference",
+)
+health = ServiceHealth()
+
+
 
 
 
 
 
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    # Sampled at EMOTICAM_TRACE_SAMPLE; "x-trace: 1" forces a trace
+    root = tracer.start_trace(
+        f"{request.method} {request.url.path}",
+        trace_id=request.headers.get("x-trace-id"),
+        force=request.headers.get("x-trace") == "1",
+    )
+    with root:
+        response = await call_next(request)
+        root.set(status=response.status_code)
+    if root.trace_id:
+        response.headers["x-trace-id"] = root.trace_id
+    return response
+
+
+@app.middleware("http")
+async def profile_requests(request, call_next):
+    # On demand with "x-profile: <EMOTICAM_ADMIN_TOKEN>", or a sampled fraction
+    if not profiler.wanted(request.headers.get("x-profile")):
+        return await call_next(request)
+    profile = profiler.start()
+    if profile is None:
+        return await call_next(request)
+
+    request_id = new_request_id()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop(profile, request_id, f"{request.method} {request.url.path}")
+    response.headers["x-profile-id"] = request_id
+    return response
+
+
+@app.middleware("http")
+async def record_latency(request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    if request.method == "POST":
+        elapsed = (time.perf_counter() - started) * 1000
+        route = request.scope.get("route")
+        metrics.observe("request.latency_ms", elapsed)
+        metrics.observe(f"request.latency_ms {getattr(route, 'path', request.url.path)}", elapsed)
+    return response
 
 
 # Enable CORS for all origins (can restrict later)
@@ -116,62 +222,256 @@ def generate_fallback_response():
     return fallback_analysis
 
 
-def convert_np(obj):
+# System prompt for the structured analysis returned by /api/emotion
+ANALYSIS_SYSTEM_PROMPT = """
+                You are a child-focused facial expression analyst. Analyze the image and provide a comprehensive response in EXACT JSON format.
+
+CRITICAL INSTRUCTIONS:
+1. If you see a person of ANY age (even if not clearly a child), provide analysis assuming they are a child
+2. If no clear face is visible, provide general recommendations for a 4-6 year old child
+3. ALWAYS return complete analysis - never use "N/A" or empty values
+4. Return ONLY the JSON object - no additional text
+
+REQUIRED JSON FORMAT (copy exactly):
+{
+  "childAnalysis": {
+    "ageEstimate": "4-6 years",
+    "primaryEmotion": "Happy/Excited",
+    "energyLevel": "High",
+    "developmentalStage": "Preschool",
+    "moodIndicators": "Bright eyes, alert expression, engaged posture"
+  },
+  "contentStrategy": {
+    "emotionalNeed": "Engaging and fun activities to match current state",
+    "learningOpportunity": "Creative expression and interactive learning",
+    "energyMatch": "Active content with movement and interaction",
+    "attentionSpan": "Short to medium format (5-15 minutes)"
+  },
+  "youtubeKidsQueries": [
+    "educational cartoons children safety vedios",
+    "educational cartoons children safe",
+    "kids dance movement videos",
+    "simple crafts activities children",
+    "storytelling videos kids animated"
+  ],
+  "googleSafeQueries": [
+    "kid-friendly educational videos 4-6 years",
+    "safe learning activities preschool children",
+    "age-appropriate entertainment kids",
+    "supervised children content educational",
+    "family-friendly kids videos learning"
+  ],
+  "queryRanking": {
+    "bestMatch": "educational cartoons children safety vedios",
+    "reason": "Perfect match for happy preschooler with high energy - songs provide engagement and learning",
+    "rankedQueries": [
+      {
+        "query": "educational cartoons children safety vedios",
+        "score": 95,
+        "reasoning": "Optimal for happy, high-energy preschooler - combines education with fun"
+      },
+      {
+        "query": "kids dance movement videos",
+        "score": 90,
+        "reasoning": "Excellent for high energy level and physical expression"
+      },
+      {
+        "query": "educational cartoons children safe",
+        "score": 85,
+        "reasoning": "Good educational value with visual engagement for age group"
+      },
+      {
+        "query": "simple crafts activities children",
+        "score": 75,
+        "reasoning": "Creative but may require adult supervision for this age"
+      },
+      {
+        "query": "storytelling videos kids animated",
+        "score": 70,
+        "reasoning": "Good for attention span but less interactive for high energy"
+      }
+    ]
+  },
+  "parentalGuidance": {
+    "suggestedDuration": "15-20 minutes",
+    "supervisionLevel": "Guided supervision recommended",
+    "coViewingOpportunities": "Join in songs, discuss learning topics, engage with content",
+    "discussionPoints": "Talk about emotions, colors, characters, and learning concepts",
+    "followUpActivities": "Real-world crafts, singing, dancing, outdoor play"
+  },
+  "developmentalBenefits": {
+    "emotionalDevelopment": "Supports emotional recognition and healthy expression",
+    "cognitiveSkills": "Enhances learning through visual and auditory stimulation",
+    "socialSkills": "Encourages interaction, sharing, and social development",
+    "creativeExpression": "Promotes imagination, creativity, and artistic expression"
+  },
+  "safetyAssurance": [
+    "Age-appropriate content only",
+    "No inappropriate themes or language", 
+    "Educational value included",
+    "Positive role models featured",
+    "Parent supervision recommended",
+    "Safe platform recommendations"
+  ]
+}
+
+EMOTION DETECTION GUIDELINES:
+- Happy/Excited: Smiles, bright eyes, animated features
+- Calm/Content: Relaxed expression, peaceful look
+- Curious/Alert: Wide eyes, attentive posture
+- Tired/Sleepy: Droopy eyes, yawning, relaxed
+- Sad/Upset: Downturned mouth, withdrawn look
+- Surprised/Amazed: Wide eyes, open mouth, raised eyebrows
+
+QUERY RANKING GUIDELINES:
+- Score queries from 0-100 based on how well they match the child's:
+  * Emotional state (happy = active content, tired = calm content)
+  * Energy level (high = movement/songs, low = quiet/stories)
+  * Developmental stage (toddler = simple, preschool = colors/shapes, school = educational)
+  * Age appropriateness (2-4 = basic concepts, 4-6 = interactive learning, 6+ = complex topics)
+- Always provide detailed reasoning for each score
+- Select the highest-scoring query as "bestMatch"
+- Ensure the ranking makes logical sense for child development
+
+AGE ESTIMATION GUIDELINES:
+- Look for facial features, proportions, and expressions
+- If uncertain, default to "4-6 years" for preschool content
+- Adjust content recommendations based on estimated age
+
+ENERGY LEVEL ASSESSMENT:
+- High: Bright, animated, active expressions
+- Medium: Alert but calm, engaged
+- Low: Tired, sleepy, or very relaxed
+
+Always provide helpful, safe, educational content recommendations with intelligent query ranking based on the child's specific needs.
+                
+                """
+
+
+# Cache entries are tied to the prompt they were generated with
+# The client kind is part of the cache key, so stub answers (load tests,
+# offline development) are never served as real ones from a shared cache
+ANALYSIS_PROMPT_VERSION = f"{client_kind(client)}/{prompt_version(ANALYSIS_SYSTEM_PROMPT)}"
+
+
+def read_upload(image_data):
     """
-    Recursively convert numpy types in dict/list to native Python types.
+    Base64 upload -> encoded image bytes; rejected uploads become HTTP errors.
     """
-    if isinstance(obj, dict):
-        return {k: convert_np(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_np(i) for i in obj]
-    elif isinstance(obj, (np.float32, np.float64)):
-        return float(obj)
-    elif isinstance(obj, (np.int32, np.int64)):
-        return int(obj)
-    else:
-        return obj
+    try:
+        return decode_base64(image_data)
+    except ImageRejected as e:
+        metrics.incr("ingest.rejected")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 
+def load_frame(img_bytes, mode="RGB"):
+    """
+    Bounded decode of an uploaded frame; rejected uploads become HTTP errors.
+    """
+    try:
+        return decode_frame(img_bytes, mode=mode)
+    except ImageRejected as e:
+        metrics.incr("ingest.rejected")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 
+def decode_and_analyze(img_bytes, analyze, mode):
+    """
+    Decode and analyze one upload as a single inference job, so the decoded
+    frame is only held for as long as the analysis needs it.
+    `analyze` and `mode` come from frame_pipeline/group_pipeline.
+    Returns (result, error); rejected uploads raise HTTPException.
+    """
+    img_np = load_frame(img_bytes, mode)
+    started = time.perf_counter()
+    try:
+        return analyze(img_np), None
+    except Exception as e:
+        return None, e
+    finally:
+        metrics.observe("inference.analyze_ms", (time.perf_counter() - started) * 1000)
+
+
+async def analyze_upload(image_data, analyze, mode, variant):
+    """
+    (result, error) for an uploaded frame, decoded and analyzed at most once
+    per `variant` (which pipeline and settings) however many endpoints
+    receive the same frame. Results are shared: do not modify them.
+    """
+    img_bytes = read_upload(image_data)
+    key = (frame_digest(img_bytes), variant)
+    return await frame_cache.get_or_compute(
+        key,
+        lambda: run_inference(decode_and_analyze, img_bytes, analyze, mode),
+        cacheable=lambda outcome: outcome[1] is None,
+    )
+
+
+async def analyze_single_frame(image_data):
+    # The single-face endpoints all share this variant, and so the cache
+    return await analyze_upload(image_data, *frame_pipeline(), variant=f"frame/{PIPELINE_MODE}")
+
+
+async def run_inference(fn, *args):
+    """
+    Run blocking decode/inference on the inference executor so the event
+    loop (and /readyz) stays responsive; queued jobs count as queue depth.
+    """
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry contextvars (trace spans) by itself
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        metrics.observe("inference.queue_ms", (started - submitted) * 1000)
+        try:
+            return ctx.run(profiled_call, fn, *args)
+        finally:
+            finished = time.perf_counter()
+            metrics.observe("inference.run_ms", (finished - started) * 1000)
+            # Readiness judges inference capacity (queue wait + decode and
+            # analysis), not request time, which includes LLM calls
+            health.observe_latency((finished - submitted) * 1000)
+
+    with health.inference_slot():
+        return await loop.run_in_executor(inference_executor, job)
+
+
+def split_lines(content):
+    lines = [line.strip() for line in content.strip().split("\n") if line.strip()]
+    if not lines:
+        raise ValueError("Empty model response")
+    return lines
+
 
 # Request schema
 class EmotionRequest(BaseModel):
     imageData: str
+    # /api/emotion only: also start an LLM refinement of the instant analysis
+    refine: bool = True
+    # Camera/child session the frame belongs to, for the emotion timeline
+    sessionId: str = "default"
 
 
 @app.post("/api/emotion-v2")
 async def analyse_emotions_v2(req: EmotionRequest):
-    global sentiment_ans
     image_data = req.imageData
 
-    if "," in image_data:
-        img_base64 = image_data.split(",")[1]
-    else:
-        img_base64 = image_data
-    
-    img_bytes = base64.b64decode(img_base64)
-
-    # Open the image with PIL
-    image = Image.open(io.BytesIO(img_bytes)).convert("RGB")  # Convert to RGB to avoid issues
-
     # Analyze emotions using DeepFace
-    try:
-        img_np = np.array(image)
-        result = DeepFace.analyze(img_np, actions=['emotion'], enforce_detection = False)
-        sentiment_ans = result[0]['dominant_emotion']
+    result, error = await analyze_single_frame(image_data)
+    if error is None:
+        await set_sentiment(req.sessionId, result[0]['dominant_emotion'])
         print("Emotion Analysis Result:", result)
-    except Exception as e:
-        print("Error analyzing image:", e)
+    else:
+        print("Error analyzing image:", error)
 
 
     # print(image_data)
     if not image_data:
         raise HTTPException(status_code=400, detail="No image data provided")
 
-    # Remove data:image/... prefix
-    base64_image = re.sub(r"^data:image\/[a-z]+;base64,", "", image_data)
-
     try:
         # === Step 1: Ask model for structured child emotion + content analysis ===
         
@@ -181,11 +481,8 @@ async def analyse_emotions_v2(req: EmotionRequest):
         else:
             face_data = [result]  # wrap single dict in a list
 
-        # Convert all numpy types to native Python
-        face_data = convert_np(face_data)
-
-        # Now safe to JSON encode
-        image_description = json.dumps(face_data)
+        # orjson serializes the numpy scalars in the DeepFace result directly
+        image_description = dumps(face_data)
 
         messages = [
             {
@@ -202,29 +499,17 @@ async def analyse_emotions_v2(req: EmotionRequest):
 
 
 
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-20b",  # or "gpt-4.1-mini"
-            # model="meta-llama/llama-4-maverick-17b-128e-instruct",  # or "gpt-4.1-mini"
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.7,
-        )
-
-        # === Step 2: Parse LLM output safely ===
-        content = response.choices[0].message.content.strip()
-        print("content : ", response.choices[0].message.content)
-        ans = response.choices[0].message.content.strip()
-        urls = [url.strip() for url in ans.split("\n") if url.strip()]
-        # print(ans)
+        # === Step 2: Ask the model router, parse LLM output safely ===
+        urls, model = await llm_router.complete(messages, validate=split_lines, max_tokens=1500, temperature=0.7)
         print(urls)
-        return JSONResponse(content={"success": True, "analysis": urls})
+        return ORJSONResponse(content={"success": True, "analysis": urls})
 
     except Exception as e:
         FALLBACK_RESPONSES = [generate_fallback_response() for _ in range(20)]
         response = random.choice(FALLBACK_RESPONSES)
-        return JSONResponse(content={"success": False, "analysis": response})
+        return ORJSONResponse(content={"success": False, "analysis": response})
 
-        # return JSONResponse(content={"success": False, "analysis": fallback_analysis})
+        # return ORJSONResponse(content={"success": False, "analysis": fallback_analysis})
 
     
     
@@ -240,48 +525,25 @@ async def analyse_emotions_v2(req: EmotionRequest):
     
 @app.post("api/sentiment")
 async def sentiment_grabber(req: EmotionRequest):
-    global sentiment_ans
     image_data = req.imageData
 
     if not image_data:
         raise HTTPException(status_code=400, detail="No image data provided")
 
-    # Remove "data:image/..." prefix if exists
-    if "," in image_data:
-        img_base64 = image_data.split(",")[1]
-    else:
-        img_base64 = image_data
-
-    img_bytes = base64.b64decode(img_base64)
-
-    # Open image with PIL
-    image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-
     # Analyze emotions using DeepFace
-    try:
-        img_np = np.array(image)
-        result = DeepFace.analyze(img_np, actions=['emotion'], enforce_detection = False)
-        sentiment_ans = result[0]['dominant_emotion']
+    result, error = await analyze_single_frame(image_data)
+    if error is None:
+        await set_sentiment(req.sessionId, result[0]['dominant_emotion'])
         print("Emotion Analysis Result:", result)
-    except Exception as e:
-        print("Error analyzing image:", e)
+    else:
+        print("Error analyzing image:", error)
         result = {"emotion": {"neutral": 1}}  # fallback to neutral if analysis fails
 
     # Wrap single dict in a list if needed
     face_data = result if isinstance(result, list) else [result]
 
-    # Convert numpy types to native Python
-    def convert_np(obj):
-        if isinstance(obj, list):
-            return [convert_np(i) for i in obj]
-        elif isinstance(obj, dict):
-            return {k: convert_np(v) for k, v in obj.items()}
-        elif isinstance(obj, np.generic):
-            return obj.item()
-        return obj
-
-    face_data = convert_np(face_data)
-    image_description = json.dumps(face_data)
+    # orjson serializes the numpy scalars in the DeepFace result directly
+    image_description = dumps(face_data)
 
     try:
         # === Step 1: Ask model for structured titles ===
@@ -300,18 +562,10 @@ Do not provide any URLs, descriptions, or extra text — only the titles, separa
             }
         ]
 
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-20b",  # or your preferred model
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.7,
-        )
-
-        content = response.choices[0].message.content.strip()
-        titles = [title.strip() for title in content.split("\n") if title.strip()]
+        titles, model = await llm_router.complete(messages, validate=split_lines, max_tokens=1500, temperature=0.7)
         print("Generated Titles:", titles)
 
-        return JSONResponse(content={"success": True, "titles": titles})
+        return ORJSONResponse(content={"success": True, "titles": titles})
 
     except Exception as e:
         print("Error generating titles:", e)
@@ -321,244 +575,439 @@ Do not provide any URLs, descriptions, or extra text — only the titles, separa
 @app.post("/api/get_sentiment")
 async def get_Sentiment_val():
     global sentiment_ans
-    return JSONResponse(content={"emotion" : sentiment_ans})
+    return ORJSONResponse(content={"emotion" : sentiment_ans})
 
 
+async def set_sentiment(session_id, emotion):
+    global sentiment_ans
+    sentiment_ans = emotion
+    await emotion_hub.publish(session_id, emotion)
 
 
-@app.post("/api/emotion")
-async def analyze_emotion(req: EmotionRequest):
-    global sentiment_ans
-    image_data = req.imageData
+# Long-poll / SSE replacements for polling /api/get_sentiment
+SUBSCRIBE_TIMEOUT = float(os.getenv("EMOTICAM_SUBSCRIBE_TIMEOUT", "25"))
 
-    if "," in image_data:
-        img_base64 = image_data.split(",")[1]
-    else:
-        img_base64 = image_data
-    
-    img_bytes = base64.b64decode(img_base64)
 
-    # Open the image with PIL
-    image = Image.open(io.BytesIO(img_bytes)).convert("RGB")  # Convert to RGB to avoid issues
+@app.get("/api/emotion/subscribe/{session_id}")
+async def subscribe_emotion(session_id: str, since: Optional[int] = None, timeout: float = SUBSCRIBE_TIMEOUT):
+    """
+    Long-poll: returns immediately if the session's version differs from
+    `since` (or `since` is omitted), otherwise holds until the dominant
+    emotion changes or `timeout` passes (changed=false). Pass the returned
+    version as `since` on the next call.
+    """
+    timeout = min(max(timeout, 0.0), SUBSCRIBE_TIMEOUT)
+    state = await emotion_hub.wait(session_id, since, timeout)
+    return ORJSONResponse(content=state)
+
 
-    # Analyze emotions using DeepFace
+@app.get("/api/emotion/stream/{session_id}")
+async def stream_emotion(session_id: str, request: Request):
+    """
+    Server-sent events: one `emotion` event now and one per change, with a
+    comment heartbeat every SUBSCRIBE_TIMEOUT seconds to keep proxies open.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    since = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    async def events():
+        version = since
+        while not await request.is_disconnected():
+            state = await emotion_hub.wait(session_id, version, SUBSCRIBE_TIMEOUT)
+            if not state["changed"]:
+                yield ": keepalive\n\n"
+                continue
+            version = state["version"]
+            yield f"id: {version}\nevent: emotion\ndata: {dumps(state)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+
+async def request_llm_analysis(image_description, emotion_key=None, priority=INTERACTIVE):
+    """
+    Structured analysis from the first model to give a valid answer; raises
+    LLMUnavailable when none does. With an emotion_key the answer is stored
+    in the persistent analysis cache.
+    """
+    messages = [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Emotion data: {image_description}"},
+    ]
+    # parse_analysis repairs fences, trailing text, single quotes and
+    # truncation, then validates against the full analysis schema; an
+    # unusable answer counts as that model failing
+    analysis, model = await llm_router.complete(
+        messages, validate=parse_analysis, priority=priority, max_tokens=1500, temperature=0.7
+    )
+    analysis = analysis.model_dump()
+    if emotion_key is not None:
+        await analysis_cache.put(model, ANALYSIS_PROMPT_VERSION, emotion_key, analysis)
+    return analysis
+
+
+async def cached_llm_analysis(emotion_key):
+    # Models in router preference order, so a primary-model answer wins
+    models = [route.name for route in llm_router.routes]
+    return await analysis_cache.get_any(models, ANALYSIS_PROMPT_VERSION, emotion_key)
+
+
+def describe_emotion(emotion, dominant):
+    # The LLM's input: one DeepFace-style face result
+    return dumps([{"emotion": emotion, "dominant_emotion": dominant}])
+
+
+async def precompute_analysis(emotion, emotion_key):
+    await request_llm_analysis(describe_emotion(emotion, max(emotion, key=emotion.get)), emotion_key, priority=BATCH)
+
+
+async def precomputed_at(emotion_key):
+    models = [route.name for route in llm_router.routes]
+    return await analysis_cache.newest(models, ANALYSIS_PROMPT_VERSION, emotion_key)
+
+
+# Keeps every (emotion, energy) state's analysis warm, off the request path
+refresher = AnalysisRefresher(precompute_analysis, precomputed_at)
+
+
+async def refine_analysis(refinement_id, image_description, emotion_key):
     try:
-        img_np = np.array(image)
-        result = DeepFace.analyze(img_np, actions=['emotion'], enforce_detection = False)
-        sentiment_ans = result[0]['dominant_emotion']
-        print("Emotion Analysis Result:", result)
+        analysis = await request_llm_analysis(image_description, emotion_key)
+        await refinements.resolve(refinement_id, analysis)
     except Exception as e:
-        print("Error analyzing image:", e)
+        print("Error refining analysis:", e)
+        await refinements.fail(refinement_id)
 
 
-    # print(image_data)
+async def reuse_analysis(session):
+    """
+    The analysis last served for this session's state, upgraded in place to
+    the LLM refinement once that has finished.
+    """
+    content = session.analysis
+    refinement_id = content["refinementId"]
+    if refinement_id is not None:
+        entry = await refinements.get(refinement_id)
+        status = entry["status"] if entry is not None else None
+        if status != REFINEMENT_PENDING:
+            content = dict(content, refinementId=None)
+            if status == REFINEMENT_READY:
+                content.update(source="llm", analysis=entry["analysis"])
+            await smoother.set_analysis(session, content)
+    return dict(content, reused=True)
+
+
+@app.post("/api/emotion")
+async def analyze_emotion(req: EmotionRequest):
+    image_data = req.imageData
+
     if not image_data:
         raise HTTPException(status_code=400, detail="No image data provided")
 
-    # Remove data:image/... prefix
-    base64_image = re.sub(r"^data:image\/[a-z]+;base64,", "", image_data)
+    # Analyze emotions using DeepFace
+    face_data, error = await analyze_single_frame(image_data)
+    session = None
+    if error is None:
+        print("Emotion Analysis Result:", face_data)
+        probs = emotion_vector(face_data[0]["emotion"])
+        await timeline.append(req.sessionId, probs)
+        # Noise flicker between emotions is not a state change; until the
+        # smoothed state changes the session keeps its last analysis
+        session, changed = await smoother.update(req.sessionId, probs)
+        await set_sentiment(req.sessionId, session.state)
+        if not changed and session.analysis is not None:
+            metrics.incr("analysis.reused")
+            return ORJSONResponse(content=await reuse_analysis(session))
+        # Everything below (rules, cache keys, LLM prompt) works from the
+        # smoothed distribution and its stable state, not this one frame
+        emotion, state = smoother.emotion_dict(session), session.state
+    else:
+        print("Error analyzing image:", error)
+        emotion, state = {"neutral": 100.0}, "neutral"
+
+    # Answer immediately from the precomputed table; the LLM only refines it
+    with span("recommend"):
+        analysis, dominant, energy = recommend(emotion, dominant=state)
+        video_searches = video_index.query(emotion, k=VIDEO_RESULTS, energy=energy)
+    content = {
+        "success": True,
+        "source": "rules",
+        "analysis": analysis,
+        "energyLevel": energy,
+        "videoSearches": video_searches,
+        "refinementId": None,
+    }
 
-    try:
-        # === Step 1: Ask model for structured child emotion + content analysis ===
-        
-        # image_description = json.dumps([face for face in result])
-        if isinstance(result, list):
-            face_data = result  # list of faces
+    # A past LLM answer for the same normalized emotion and state is served
+    # as is, else the background-generated one for the (emotion, energy)
+    # state. The state is part of the key because hysteresis can hold it
+    # away from the distribution's top emotion, and the prompt names it
+    emotion_key = f"{normalize_emotion(emotion)}|{dominant}"
+    with span("cache.lookup") as lookup:
+        cached, cached_model = await cached_llm_analysis(emotion_key)
+        if cached is not None:
+            content.update(source="cache", analysis=cached)
         else:
-            face_data = [result]  # wrap single dict in a list
+            cached, cached_model = await cached_llm_analysis(state_key(dominant, energy))
+            if cached is not None:
+                content.update(source="precomputed", analysis=cached)
+        lookup.set(hit=cached is not None, source=content["source"])
 
-        # Convert all numpy types to native Python
-        face_data = convert_np(face_data)
+    if req.refine and cached is None:
+        image_description = describe_emotion(emotion, dominant)
+        refinement_id = await refinements.create()
+        task = asyncio.create_task(refine_analysis(refinement_id, image_description, emotion_key))
+        refinements.attach_task(refinement_id, task)
+        content["refinementId"] = refinement_id
 
-        # Now safe to JSON encode
-        image_description = json.dumps(face_data)
+    if session is not None:
+        await smoother.set_analysis(session, content)
+    return ORJSONResponse(content=content)
 
-        messages = [
-            {
-                "role": "system",
-                "content": """
-                You are a child-focused facial expression analyst. Analyze the image and provide a comprehensive response in EXACT JSON format.
 
-CRITICAL INSTRUCTIONS:
-1. If you see a person of ANY age (even if not clearly a child), provide analysis assuming they are a child
-2. If no clear face is visible, provide general recommendations for a 4-6 year old child
-3. ALWAYS return complete analysis - never use "N/A" or empty values
-4. Return ONLY the JSON object - no additional text
+@app.get("/api/emotion/refined/{refinement_id}")
+async def get_refined_analysis(refinement_id: str):
+    entry = await refinements.get(refinement_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired refinement id")
+    return ORJSONResponse(content={"refinementId": refinement_id, "source": "llm", **entry})
 
-REQUIRED JSON FORMAT (copy exactly):
-{
-  "childAnalysis": {
-    "ageEstimate": "4-6 years",
-    "primaryEmotion": "Happy/Excited",
-    "energyLevel": "High",
-    "developmentalStage": "Preschool",
-    "moodIndicators": "Bright eyes, alert expression, engaged posture"
-  },
-  "contentStrategy": {
-    "emotionalNeed": "Engaging and fun activities to match current state",
-    "learningOpportunity": "Creative expression and interactive learning",
-    "energyMatch": "Active content with movement and interaction",
-    "attentionSpan": "Short to medium format (5-15 minutes)"
-  },
-  "youtubeKidsQueries": [
-    "educational cartoons children safety vedios",
-    "educational cartoons children safe",
-    "kids dance movement videos",
-    "simple crafts activities children",
-    "storytelling videos kids animated"
-  ],
-  "googleSafeQueries": [
-    "kid-friendly educational videos 4-6 years",
-    "safe learning activities preschool children",
-    "age-appropriate entertainment kids",
-    "supervised children content educational",
-    "family-friendly kids videos learning"
-  ],
-  "queryRanking": {
-    "bestMatch": "educational cartoons children safety vedios",
-    "reason": "Perfect match for happy preschooler with high energy - songs provide engagement and learning",
-    "rankedQueries": [
-      {
-        "query": "educational cartoons children safety vedios",
-        "score": 95,
-        "reasoning": "Optimal for happy, high-energy preschooler - combines education with fun"
-      },
-      {
-        "query": "kids dance movement videos",
-        "score": 90,
-        "reasoning": "Excellent for high energy level and physical expression"
-      },
-      {
-        "query": "educational cartoons children safe",
-        "score": 85,
-        "reasoning": "Good educational value with visual engagement for age group"
-      },
-      {
-        "query": "simple crafts activities children",
-        "score": 75,
-        "reasoning": "Creative but may require adult supervision for this age"
-      },
-      {
-        "query": "storytelling videos kids animated",
-        "score": 70,
-        "reasoning": "Good for attention span but less interactive for high energy"
-      }
-    ]
-  },
-  "parentalGuidance": {
-    "suggestedDuration": "15-20 minutes",
-    "supervisionLevel": "Guided supervision recommended",
-    "coViewingOpportunities": "Join in songs, discuss learning topics, engage with content",
-    "discussionPoints": "Talk about emotions, colors, characters, and learning concepts",
-    "followUpActivities": "Real-world crafts, singing, dancing, outdoor play"
-  },
-  "developmentalBenefits": {
-    "emotionalDevelopment": "Supports emotional recognition and healthy expression",
-    "cognitiveSkills": "Enhances learning through visual and auditory stimulation",
-    "socialSkills": "Encourages interaction, sharing, and social development",
-    "creativeExpression": "Promotes imagination, creativity, and artistic expression"
-  },
-  "safetyAssurance": [
-    "Age-appropriate content only",
-    "No inappropriate themes or language", 
-    "Educational value included",
-    "Positive role models featured",
-    "Parent supervision recommended",
-    "Safe platform recommendations"
-  ]
-}
 
-EMOTION DETECTION GUIDELINES:
-- Happy/Excited: Smiles, bright eyes, animated features
-- Calm/Content: Relaxed expression, peaceful look
-- Curious/Alert: Wide eyes, attentive posture
-- Tired/Sleepy: Droopy eyes, yawning, relaxed
-- Sad/Upset: Downturned mouth, withdrawn look
-- Surprised/Amazed: Wide eyes, open mouth, raised eyebrows
+VIDEO_RESULTS = int(os.getenv("EMOTICAM_VIDEO_RESULTS", "5"))
 
-QUERY RANKING GUIDELINES:
-- Score queries from 0-100 based on how well they match the child's:
-  * Emotional state (happy = active content, tired = calm content)
-  * Energy level (high = movement/songs, low = quiet/stories)
-  * Developmental stage (toddler = simple, preschool = colors/shapes, school = educational)
-  * Age appropriateness (2-4 = basic concepts, 4-6 = interactive learning, 6+ = complex topics)
-- Always provide detailed reasoning for each score
-- Select the highest-scoring query as "bestMatch"
-- Ensure the ranking makes logical sense for child development
 
-AGE ESTIMATION GUIDELINES:
-- Look for facial features, proportions, and expressions
-- If uncertain, default to "4-6 years" for preschool content
-- Adjust content recommendations based on estimated age
+class VideoQuery(BaseModel):
+    # DeepFace-style emotion distribution (percent or probabilities)
+    emotion: dict[str, float]
+    k: int = VIDEO_RESULTS
+    energyLevel: Optional[str] = None
 
-ENERGY LEVEL ASSESSMENT:
-- High: Bright, animated, active expressions
-- Medium: Alert but calm, engaged
-- Low: Tired, sleepy, or very relaxed
 
-Always provide helpful, safe, educational content recommendations with intelligent query ranking based on the child's specific needs.
-                
-                """
-            },
+@app.post("/api/videos")
+async def recommend_videos(req: VideoQuery):
+    """
+    Nearest catalog channel searches for an emotion distribution; no LLM or
+    search API call. Entries link to a search, not to one video.
+    """
+    if req.energyLevel is not None and req.energyLevel not in ENERGY_LEVELS:
+        raise HTTPException(status_code=400, detail=f"energyLevel must be one of {ENERGY_LEVELS}")
+    k = max(1, min(req.k, 50))
+    video_searches = video_index.query(req.emotion, k=k, energy=req.energyLevel)
+    return ORJSONResponse(content={"videoSearches": video_searches})
+
+
+class GroupEmotionRequest(BaseModel):
+    imageData: str
+    detectorBackend: str = "opencv"
+    sessionId: str = "default"
+
+
+@app.post("/api/emotion/group")
+async def analyze_group_emotion(req: GroupEmotionRequest):
+    if not req.imageData:
+        raise HTTPException(status_code=400, detail="No image data provided")
+
+    # One detection pass for the whole frame, one batched CNN pass for all crops
+    pipeline = group_pipeline(req.detectorBackend)
+    group, error = await analyze_upload(
+        req.imageData, *pipeline, variant=f"group/{PIPELINE_MODE}/{req.detectorBackend}"
+    )
+    if error is not None:
+        print("Error analyzing group image:", error)
+        raise HTTPException(status_code=422, detail="Could not analyze image")
+
+    if group["face_count"]:
+        await set_sentiment(req.sessionId, group["dominant_emotion"])
+
+    try:
+        # The LLM only sees the aggregate, not N raw face dicts
+        summary = dumps(summarize_group(group))
+        messages = [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
             {
                 "role": "user",
-                "content": f"""Emotion data: {image_description}"""
-            }
+                "content": f"Group emotion summary for a classroom of children: {summary}",
+            },
         ]
 
+        analysis, model = await llm_router.complete(
+            messages, validate=parse_analysis, max_tokens=1500, temperature=0.7
+        )
+        analysis_result = analysis.model_dump()
+        return ORJSONResponse(content={"success": True, "group": group, "analysis": analysis_result})
 
+    except Exception as e:
+        print("Error:", e)
+        return ORJSONResponse(content={"success": False, "group": group, "analysis": generate_fallback_response()})
 
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-20b",  # or "gpt-4.1-mini"
-            # model="meta-llama/llama-4-maverick-17b-128e-instruct",  # or "gpt-4.1-mini"
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.7,
-        )
 
-        # === Step 2: Parse LLM output safely ===
-        content = response.choices[0].message.content.strip()
-        print("content : ", response.choices[0].message.content)
-        ans = response.choices[0].message.content.strip()
-        urls = [url.strip() for url in ans.split("\n") if url.strip()]
-        # print(ans)
-        print(urls)
-        # return urls
-        if not content:
-            raise ValueError("Empty model response")
+class FaceAnalysisRequest(BaseModel):
+    imageData: str
+    # Any of "emotion", "age", "gender"; all run on one detection pass
+    actions: list[str] = ["emotion", "age", "gender"]
+    detectorBackend: str = "opencv"
+    sessionId: str = "default"
+    refine: bool = False
 
-        clean_content = re.sub(r"```json|```", "", content).strip()
-        analysis_result = json.loads(clean_content)
-        
-        
-        # print(analysis_result)
 
-        # Validate minimum structure
-        required_keys = ["childAnalysis", "contentStrategy", "queryRanking"]
-        if not all(k in analysis_result for k in required_keys):
-            raise ValueError("Invalid JSON structure from model")
+@app.post("/api/analyze")
+async def analyze_face_attributes(req: FaceAnalysisRequest):
+    """
+    Per-face emotion / age / gender from a single detection and alignment
+    pass. With emotion selected, the largest face also gets the rule-based
+    analysis, using the measured apparent age instead of a guess.
+    """
+    actions = tuple(dict.fromkeys(req.actions))
+    try:
+        face_models.check(actions)
+    except (ValueError, ModelBudgetExceeded) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    analyze = functools.partial(analyze_faces, actions=actions, detector_backend=req.detectorBackend)
+    variant = f"faces/{','.join(sorted(actions))}/{req.detectorBackend}"
+    result, error = await analyze_upload(req.imageData, analyze, "RGB", variant)
+    if error is not None:
+        print("Error analyzing faces:", error)
+        if isinstance(error, ModelBudgetExceeded):
+            raise HTTPException(status_code=503, detail=str(error))
+        raise HTTPException(status_code=422, detail="Could not analyze image")
+    faces, _ = result
+
+    content = {"success": True, "faceCount": len(faces), "faces": faces, "refinementId": None}
+    if faces and "emotion" in actions:
+        primary = max(faces, key=lambda f: f["region"]["w"] * f["region"]["h"])
+        await set_sentiment(req.sessionId, primary["dominant_emotion"])
+        analysis, dominant, energy = recommend(primary["emotion"])
+        if "age" in primary:
+            # The precomputed analyses are shared; copy before changing one
+            child = dict(analysis["childAnalysis"], ageEstimate=f"about {round(primary['age'])} years")
+            analysis = dict(analysis, childAnalysis=child)
+        content.update(analysis=analysis, energyLevel=energy)
+
+        if req.refine:
+            # Age and gender make the input too specific for the shared cache
+            refinement_id = await refinements.create()
+            task = asyncio.create_task(refine_analysis(refinement_id, dumps([primary]), None))
+            refinements.attach_task(refinement_id, task)
+            content["refinementId"] = refinement_id
+
+    return ORJSONResponse(content=content)
+
+
+# Bounds for /api/timeline: a day of history in at most this many buckets
+TIMELINE_MAX_MINUTES = 24 * 60
+TIMELINE_MAX_BUCKETS = 1440
+
+
+@app.get("/api/timeline/{session_id}")
+async def get_emotion_timeline(
+    session_id: str,
+    minutes: float = Query(10, gt=0, le=TIMELINE_MAX_MINUTES),
+    bucket_seconds: float = Query(60, gt=0, le=TIMELINE_MAX_MINUTES * 60),
+):
+    """
+    Emotion history of a session: average distribution over the last
+    `minutes` plus per-bucket averages for charting.
+    """
+    now = time.time()
+    window = minutes * 60
+    if window / bucket_seconds > TIMELINE_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {TIMELINE_MAX_BUCKETS} buckets; use a larger bucket_seconds",
+        )
+    average, samples = timeline.window_average(session_id, window, now=now)
+    starts, means, counts = timeline.bucketed(session_id, now - window, now, bucket_seconds)
+    return ORJSONResponse(content={
+        "sessionId": session_id,
+        "average": average,
+        "samples": samples,
+        "emotions": TIMELINE_EMOTIONS,
+        "buckets": {"start": starts, "mean": means, "count": counts},
+    })
 
-        return JSONResponse(content={"success": True, "analysis": analysis_result})
 
-    except Exception as e:
-        print("Error:", e)
-        FALLBACK_RESPONSES = [generate_fallback_response() for _ in range(20)]
-        response = random.choice(FALLBACK_RESPONSES)
-        return JSONResponse(content={"success": False, "analysis": response})
+@app.get("/api/metrics")
+async def get_metrics():
+    return ORJSONResponse(content=dict(metrics.snapshot(), precompute=refresher.last_pass))
 
-        
 
+def require_admin(token):
+    if not profiler.is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 
+@app.post("/api/admin/metrics/reset")
+async def reset_metrics(x_admin_token: str = Header(default="")):
+    # Lets a load test measure each ramp stage on its own
+    require_admin(x_admin_token)
+    metrics.reset()
+    return ORJSONResponse(content={"reset": True})
 
 
+@app.get("/api/admin/profiles")
+async def list_profiles(x_admin_token: str = Header(default="")):
+    require_admin(x_admin_token)
+    return ORJSONResponse(content={"profiles": profiler.list()})
 
 
+@app.get("/api/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = "prof", x_admin_token: str = Header(default="")):
+    """
+    The raw pstats dump (load with pstats/snakeviz), or ?format=text for a
+    cumulative-time summary.
+    """
+    require_admin(x_admin_token)
+    path = profiler.path_for(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile id")
+    if format == "text":
+        return PlainTextResponse(profiler.summary(profile_id))
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
 
+def warm_up_models():
+    # Runs the face detector and the emotion model once end to end
+    warm_up(*frame_pipeline())
 
 
+@app.on_event("startup")
+async def start_warm_up():
+    async def warm():
+        try:
+            await asyncio.get_running_loop().run_in_executor(inference_executor, warm_up_models)
+            health.warm_state = READY
+        except Exception as e:
+            print("Model warm-up failed:", e)
+            health.warm_state = FAILED
+            health.warm_error = str(e)
 
+    # Keep references so the tasks are not garbage collected
+    app.state.warm_up_task = asyncio.create_task(warm())
+    if refresher_runs_here():
+        app.state.precompute_task = asyncio.create_task(refresher.run())
 
 
+@app.get("/healthz")
+async def liveness():
+    return ORJSONResponse(content=health.liveness())
 
 
+@app.get("/readyz")
+async def readiness():
+    """
+    200 with a routing weight when this worker should get traffic, 503 with
+    drain=true when it should not (still warming up, saturated or too slow).
+    """
+    state = health.readiness(
+        p95_ms=health.latency_p95(),
+        circuits=llm_router.circuit_states(),
+        llm_queue=llm_router.queue_depth(),
+    )
+    return ORJSONResponse(content=state, status_code=200 if state["ready"] else 503)
+
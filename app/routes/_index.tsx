@@ -1,4 +1,4 @@
-import { useRef, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import type { MetaFunction, LoaderFunctionArgs } from "@remix-run/node";
 import { json } from "@remix-run/node";
 import { useLoaderData, Link, useAsyncError } from "@remix-run/react";
@@ -212,42 +212,15 @@ export default function Index() {
   };
 
 
-  const getSentimentAnalysis = async () =>{
-
-    try {      
-      const response = await fetch("http://127.0.0.1:8000/api/get_sentiment", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({ capturedPhoto }),
-      });
-
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-
-      const result = await response.json();
-      console.log("result : " + result);
-      
-      
-      if (result.error) {
-        throw new Error(result.error);
-      }
-
-      // Step 3: Show results
-      setSentiment(result['emotion']);
-      console.log(result['emotion']);
-      
-      
-    } catch (err) {
-      setError("Error getting expression. Please check your Code Base.");
-      setDetectionStep("");
-      console.error("Error analyzing expression:", err);
-    } finally {
-      setIsDetecting(false);
-    }
-  }
+  // Follow the detected emotion over server-sent events instead of polling
+  useEffect(() => {
+    if (!isWebcamActive) return;
+    const source = new EventSource("http://127.0.0.1:8000/api/emotion/stream/default");
+    source.addEventListener("emotion", (event) => {
+      setSentiment(JSON.parse((event as MessageEvent).data)["emotion"]);
+    });
+    return () => source.close();
+  }, [isWebcamActive]);
 
   // Search for YouTube videos based on analysis (direct call with analysis parameter)
   const searchYouTubeVideosForAnalysis = async (analysisData: AnalysisResult) => {
@@ -529,11 +502,7 @@ export default function Index() {
           {isWebcamActive && (
             <div className="animate-slide-up">
               <button
-                // onClick={analyzeExpression}
-                onClick={() => {
-                  analyzeExpression();
-                  getSentimentAnalysis();
-                }}
+                onClick={analyzeExpression}
                 disabled={isDetecting}
                 className="group px-12 py-6 bg-gradient-to-r from-rainbow-red via-rainbow-yellow to-rainbow-green hover:from-rainbow-orange hover:via-rainbow-pink hover:to-rainbow-purple disabled:from-gray-400 disabled:to-gray-500 disabled:cursor-not-allowed rounded-3xl font-fun font-bold text-2xl transition-all duration-300 shadow-2xl hover:shadow-3xl transform hover:scale-110 active:scale-95 border-4 border-white/50 text-white"
               >
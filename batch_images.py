@@ -0,0 +1,283 @@
+"""
+Bulk emotion analysis over stored snapshots.
+
+    python batch_images.py SNAPSHOT_DIR_OR_MANIFEST OUT_DIR [--workers 4] [--format parquet|memmap]
+
+Images are read and decoded by an I/O thread pool a few chunks ahead of
+inference. Each chunk is sent to a worker process that detects faces per
+image and classifies all face crops of the chunk in one batched forward pass.
+Results go to OUT_DIR either as Parquet part files (one per chunk) or as a
+float32 NumPy memmap of probabilities plus an index. Parquet needs pyarrow,
+which is optional; without it the default is the memmap format. OUT_DIR/checkpoint.json
+records finished chunks, so a rerun after a crash resumes where it stopped.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+
+# Same order as emotion_pipeline.EMOTIONS; not imported from there so the
+# parent process never loads TensorFlow before forking workers
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+CHECKPOINT = "checkpoint.json"
+
+
+def list_images(source):
+    """
+    Sorted image paths from a directory tree, or the lines of a manifest file.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+    with open(source) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_image(path, max_side=None):
+    """
+    Decoded RGB image, or None if the file is missing, unreadable or not an
+    image; one bad file becomes an error row instead of stopping the batch.
+    """
+    # np.fromfile + imdecode releases the GIL, so threads decode in parallel
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    except (OSError, cv2.error):
+        return None
+    if image is None:
+        return None
+    if max_side and max(image.shape[:2]) > max_side:
+        scale = max_side / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def _init_worker():
+    # Build the detector and the emotion model once per worker process, on
+    # the path infer_chunk uses
+    from emotion_pipeline import classify_crops, detect_faces, preprocess_crops
+    classify_crops(preprocess_crops(detect_faces(np.zeros((240, 320, 3), dtype=np.uint8))))
+
+
+def infer_chunk(images, detector_backend="opencv"):
+    """
+    Worker side: per-image detection, then one batched emotion pass over the
+    best face of every image in the chunk.
+
+    Returns (probs (N, 7) float32, face_counts, confidences, errors).
+    """
+    from emotion_pipeline import classify_crops, detect_faces, preprocess_crops
+
+    n = len(images)
+    probs = np.full((n, len(EMOTIONS)), np.nan, dtype=np.float32)
+    face_counts = np.zeros(n, dtype=np.int32)
+    confidences = np.zeros(n, dtype=np.float32)
+    errors = [None] * n
+
+    crops, owners = [], []
+    for i, image in enumerate(images):
+        if image is None:
+            errors[i] = "unreadable or not an image"
+            continue
+        try:
+            faces = [f for f in detect_faces(image, detector_backend) if f.get("confidence", 0) > 0]
+        except Exception as e:
+            errors[i] = str(e)
+            continue
+        face_counts[i] = len(faces)
+        if faces:
+            best = max(faces, key=lambda f: f["confidence"])
+            confidences[i] = best["confidence"]
+            crops.append(best)
+            owners.append(i)
+
+    if crops:
+        probs[owners] = classify_crops(preprocess_crops(crops))
+    return probs, face_counts, confidences, errors
+
+
+class ParquetWriter:
+    def __init__(self, out_dir, total):
+        import pyarrow  # noqa: F401  (fail early if the format is unavailable)
+        self.out_dir = out_dir
+
+    def write(self, chunk_index, start, paths, probs, face_counts, confidences, errors):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {
+            "path": pa.array(paths, type=pa.string()),
+            "face_count": pa.array(face_counts),
+            "face_confidence": pa.array(confidences),
+            "dominant_emotion": pa.array(
+                [None if np.isnan(p[0]) else EMOTIONS[int(p.argmax())] for p in probs], type=pa.string()
+            ),
+            "error": pa.array(errors, type=pa.string()),
+        }
+        for j, emotion in enumerate(EMOTIONS):
+            columns[emotion] = pa.array(probs[:, j])
+        path = os.path.join(self.out_dir, f"part-{chunk_index:06d}.parquet")
+        pq.write_table(pa.table(columns), path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        pass
+
+
+class MemmapWriter:
+    """
+    probs.f32: (total, 7) float32 memmap, row i = image i of the manifest.
+    index.jsonl: one line per image with path, face count and error. A chunk
+    redone after a crash appends its lines again; the last line for a row wins.
+    """
+
+    def __init__(self, out_dir, total):
+        path = os.path.join(out_dir, "probs.f32")
+        mode = "r+" if os.path.exists(path) else "w+"
+        self.probs = np.memmap(path, dtype=np.float32, mode=mode, shape=(max(total, 1), len(EMOTIONS)))
+        self.index = open(os.path.join(out_dir, "index.jsonl"), "a")
+
+    def write(self, chunk_index, start, paths, probs, face_counts, confidences, errors):
+        self.probs[start:start + len(paths)] = probs
+        self.probs.flush()
+        for offset, path in enumerate(paths):
+            self.index.write(json.dumps({
+                "row": start + offset,
+                "path": path,
+                "face_count": int(face_counts[offset]),
+                "face_confidence": float(confidences[offset]),
+                "error": errors[offset],
+            }) + "\n")
+        self.index.flush()
+        os.fsync(self.index.fileno())
+
+    def close(self):
+        self.index.close()
+        del self.probs
+
+
+WRITERS = {"parquet": ParquetWriter, "memmap": MemmapWriter}
+
+
+def default_format():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "memmap"
+    return "parquet"
+
+
+def load_checkpoint(out_dir, manifest_id):
+    path = os.path.join(out_dir, CHECKPOINT)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("manifest") != manifest_id:
+        raise SystemExit(f"{path} belongs to a different input list; use a fresh output directory")
+    return state["completed_chunks"]
+
+
+def save_checkpoint(out_dir, manifest_id, completed_chunks, chunk_size):
+    path = os.path.join(out_dir, CHECKPOINT)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"manifest": manifest_id, "completed_chunks": completed_chunks, "chunk_size": chunk_size}, f)
+    os.replace(path + ".tmp", path)
+
+
+def run(source, out_dir, workers=2, io_threads=8, chunk_size=64, fmt=None, max_side=None, detector_backend="opencv"):
+    fmt = fmt or default_format()
+    paths = list_images(source)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_id = hashlib.sha256(f"{chunk_size}\n".encode() + "\n".join(paths).encode()).hexdigest()[:16]
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    first = load_checkpoint(out_dir, manifest_id)
+    if first:
+        print(f"resuming at chunk {first}/{len(chunks)}")
+
+    writer = WRITERS[fmt](out_dir, len(paths))
+    started = time.perf_counter()
+    done_images = 0
+
+    with ThreadPoolExecutor(io_threads) as io_pool, \
+            ProcessPoolExecutor(workers, initializer=_init_worker) as infer_pool:
+
+        # Decoded chunks waiting for a worker, and chunks being inferred;
+        # both bounded so memory does not grow with the input size
+        prefetch = deque()
+        inflight = deque()
+        next_chunk = first
+
+        def fill():
+            nonlocal next_chunk
+            while next_chunk < len(chunks) and len(prefetch) + len(inflight) < 2 * workers:
+                decoded = [io_pool.submit(load_image, p, max_side) for p in chunks[next_chunk]]
+                prefetch.append((next_chunk, decoded))
+                next_chunk += 1
+
+        fill()
+        while prefetch or inflight:
+            while prefetch and len(inflight) < workers:
+                index, decoded = prefetch.popleft()
+                images = [f.result() for f in decoded]
+                inflight.append((index, infer_pool.submit(infer_chunk, images, detector_backend)))
+            fill()
+
+            index, future = inflight.popleft()
+            probs, face_counts, confidences, errors = future.result()
+            writer.write(index, index * chunk_size, chunks[index], probs, face_counts, confidences, errors)
+            # Chunks complete in order, so one counter is a full checkpoint
+            save_checkpoint(out_dir, manifest_id, index + 1, chunk_size)
+
+            done_images += len(chunks[index])
+            elapsed = time.perf_counter() - started
+            print(f"chunk {index + 1}/{len(chunks)}  {done_images / max(elapsed, 1e-9):.1f} img/s", flush=True)
+
+    writer.close()
+    return done_images, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch DeepFace emotion analysis over stored images")
+    parser.add_argument("source", help="image directory or manifest file (one path per line)")
+    parser.add_argument("out_dir")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--io-threads", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--format", choices=sorted(WRITERS), default=None,
+                        help="parquet if pyarrow is installed, else memmap")
+    parser.add_argument("--max-side", type=int, default=None, help="downscale images larger than this")
+    parser.add_argument("--detector-backend", default="opencv")
+    args = parser.parse_args(argv)
+    if args.format == "parquet" and default_format() != "parquet":
+        parser.error("--format parquet needs pyarrow (pip install pyarrow); or use --format memmap")
+
+    images, seconds = run(
+        args.source, args.out_dir,
+        workers=args.workers,
+        io_threads=args.io_threads,
+        chunk_size=args.chunk_size,
+        fmt=args.format,
+        max_side=args.max_side,
+        detector_backend=args.detector_backend,
+    )
+    print(f"{images} images in {seconds:.1f}s ({images / max(seconds, 1e-9):.1f} img/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
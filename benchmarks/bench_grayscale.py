@@ -0,0 +1,94 @@
+"""
+Compare per-frame CPU time and memory of the RGB and grayscale pipelines.
+
+    python benchmarks/bench_grayscale.py [--image face.jpg] [--frames 50] [--full]
+
+For each upload format (JPEG, PNG, WebP) the same frame is encoded once,
+then decoded through ingest.ingest_image in RGB and in luminance-only ("L")
+mode. With --full each decoded frame is also analyzed: DeepFace end to end
+for RGB, the grayscale cascade + emotion CNN path for L (needs deepface).
+
+Reported per frame: CPU ms (process time, so it counts every thread),
+Python-heap peak from tracemalloc (numpy buffers included, PIL's C-side
+buffers not) and ingestion's est_peak_bytes. The last is a formula over the
+image sizes, not a measurement, so it is not comparable with the heap peak;
+it is shown only to compare formats and modes with each other.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest import ingest_image  # noqa: E402
+
+
+def synthetic_frame(width=1280, height=960):
+    # Smooth gradients plus noise, so the encoders do not compress it to nothing
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    return np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+
+
+def encode(frame, fmt):
+    buf = io.BytesIO()
+    Image.fromarray(frame).save(buf, fmt, quality=90)
+    return buf.getvalue()
+
+
+def run(img_bytes, mode, frames, analyze):
+    ingest_image(img_bytes, mode=mode)  # warm-up: codec init
+    if analyze is not None:
+        analyze(ingest_image(img_bytes, mode=mode)[0])
+
+    tracemalloc.start()
+    cpu_started = time.process_time()
+    for _ in range(frames):
+        frame, stats = ingest_image(img_bytes, mode=mode)
+        if analyze is not None:
+            analyze(frame)
+    cpu_ms = (time.process_time() - cpu_started) * 1000 / frames
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, heap_peak, stats["est_peak_bytes"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", help="source image (default: synthetic 1280x960 frame)")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--full", action="store_true", help="include emotion analysis, not just decode")
+    args = parser.parse_args()
+
+    if args.image:
+        frame = np.asarray(Image.open(args.image).convert("RGB"))
+    else:
+        frame = synthetic_frame()
+
+    analyzers = {"RGB": None, "L": None}
+    if args.full:
+        from emotion_pipeline import analyze_frame, analyze_frame_gray
+        analyzers = {"RGB": analyze_frame, "L": analyze_frame_gray}
+
+    print(f"source {frame.shape[1]}x{frame.shape[0]}, {args.frames} frames, {'decode + analyze' if args.full else 'decode only'}")
+    print(f"{'format':<6} {'bytes':>9} {'mode':>4} {'cpu ms':>8} {'heap peak KB':>13} {'est peak KB':>12}")
+    for fmt in ("JPEG", "PNG", "WEBP"):
+        img_bytes = encode(frame, fmt)
+        results = {}
+        for mode in ("RGB", "L"):
+            cpu_ms, heap_peak, est_peak = run(img_bytes, mode, args.frames, analyzers[mode])
+            results[mode] = cpu_ms
+            print(f"{fmt:<6} {len(img_bytes):>9} {mode:>4} {cpu_ms:>8.2f} {heap_peak / 1024:>13.0f} {est_peak / 1024:>12.0f}")
+        print(f"{'':<6} {'':>9} {'':>4} RGB / L cpu time: {results['RGB'] / results['L']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Microbenchmark: old convert_np + json.dumps path vs orjson serialization.
+
+    python benchmarks/bench_serialization.py [--faces N] [--repeat R]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serialization import dumps, dumps_bytes  # noqa: E402
+
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+
+def convert_np(obj):
+    # The recursive conversion app.py used to run on every request
+    if isinstance(obj, dict):
+        return {k: convert_np(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_np(i) for i in obj]
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def same(a, b):
+    # orjson writes float32 scores at float32 precision, json.dumps at float64
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float):
+        return isinstance(b, (int, float)) and math.isclose(a, b, rel_tol=1e-6)
+    return a == b
+
+
+def make_faces(n, rng):
+    faces = []
+    for _ in range(n):
+        probs = rng.dirichlet(np.ones(len(EMOTIONS))).astype(np.float32) * 100
+        emotion = {name: np.float32(p) for name, p in zip(EMOTIONS, probs)}
+        faces.append({
+            "emotion": emotion,
+            "dominant_emotion": max(emotion, key=emotion.get),
+            "region": {
+                "x": np.int64(rng.integers(0, 600)), "y": np.int64(rng.integers(0, 400)),
+                "w": np.int64(rng.integers(40, 200)), "h": np.int64(rng.integers(40, 200)),
+                # DeepFace returns eye positions as tuples of plain ints
+                "left_eye": (10, 20), "right_eye": None,
+            },
+            "face_confidence": np.float64(rng.random()),
+        })
+    return faces
+
+
+def make_response(faces):
+    # Shape of the /api/emotion body: the analysis plus the raw faces
+    ranked = [{"query": f"kids query {i}", "score": 95 - 5 * i, "reasoning": "matches energy level " * 3}
+              for i in range(5)]
+    return {
+        "success": True,
+        "faces": faces,
+        "analysis": {
+            "childAnalysis": {"ageEstimate": "4-6 years", "primaryEmotion": "Happy/Excited",
+                              "energyLevel": "High", "developmentalStage": "Preschool",
+                              "moodIndicators": "Bright eyes, alert expression"},
+            "youtubeKidsQueries": [r["query"] for r in ranked],
+            "queryRanking": {"bestMatch": ranked[0]["query"], "reason": "best fit", "rankedQueries": ranked},
+            "safetyAssurance": ["Age-appropriate content only"] * 6,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--faces", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    faces = make_faces(args.faces, rng)
+    body = make_response(faces)
+
+    scenarios = {
+        "prompt (faces)": {
+            "convert_np + json.dumps": lambda: json.dumps(convert_np(faces)),
+            "orjson dumps (str)": lambda: dumps(faces),
+        },
+        "response body": {
+            "convert_np + json.dumps": lambda: json.dumps(convert_np(body)).encode("utf-8"),
+            "orjson dumps (bytes)": lambda: dumps_bytes(body),
+        },
+    }
+    assert same(json.loads(json.dumps(convert_np(body))), json.loads(dumps(body)))
+
+    print(f"faces={args.faces} repeat={args.repeat}")
+    for scenario, cases in scenarios.items():
+        print(scenario)
+        baseline = None
+        for name, fn in cases.items():
+            best = min(timeit.repeat(fn, number=args.repeat, repeat=5)) / args.repeat
+            baseline = baseline or best
+            print(f"  {name:<26} {best * 1e6:8.2f} us/op  x{baseline / best:5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Sweep workers x threads-per-worker and report emotion-pipeline throughput.
+
+    python benchmarks/bench_topology.py [--workers 1,2,4] [--threads 1,2,4] [--seconds 20] [--affinity auto]
+
+Every configuration launches `workers` fresh processes, each with its runtime
+topology set through the same EMOTICAM_* variables app.py reads, and counts
+frames analyzed by emotion_pipeline.analyze_frame on a synthetic camera frame
+during a fixed window after warm-up. The best total frames/s is the
+recommended setting for this host.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def child(seconds, workload):
+    import runtime_topology
+    runtime_topology.configure_env()
+
+    import numpy as np
+    runtime_topology.apply()
+    from emotion_pipeline import analyze_frame, classify_crops, get_emotion_model
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, size=(480, 640, 3), dtype=np.uint8)
+    batch = rng.random((8, 48, 48, 1), dtype=np.float32)
+
+    def step():
+        if workload == "classify":
+            classify_crops(batch)
+            return len(batch)
+        analyze_frame(frame)
+        return 1
+
+    get_emotion_model()
+    for _ in range(3):  # warm-up: graph tracing, detector load
+        step()
+
+    # Start together so the workers' measurement windows overlap
+    start_at = float(os.environ["BENCH_START_AT"])
+    time.sleep(max(0.0, start_at - time.time()))
+    frames = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frames += step()
+    print(frames, flush=True)
+
+
+def run_config(workers, threads, seconds, workload, affinity, warmup_budget):
+    start_at = time.time() + warmup_budget
+    procs = []
+    for index in range(workers):
+        env = dict(
+            os.environ,
+            EMOTICAM_WORKERS=str(workers),
+            EMOTICAM_WORKER_INDEX=str(index),
+            EMOTICAM_INTRA_OP_THREADS=str(threads),
+            EMOTICAM_INTER_OP_THREADS="1",
+            EMOTICAM_CV2_THREADS=str(threads),
+            EMOTICAM_CPU_AFFINITY=affinity,
+            BENCH_START_AT=str(start_at),
+        )
+        procs.append(subprocess.Popen(
+            [sys.executable, __file__, "--child", "--seconds", str(seconds), "--workload", workload],
+            env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True,
+        ))
+    total = 0
+    for proc in procs:
+        out, _ = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"worker failed for workers={workers} threads={threads}")
+        total += int(out.strip().splitlines()[-1])
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--threads", default="1,2,4")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--workload", choices=["analyze", "classify"], default="analyze")
+    parser.add_argument("--affinity", default="", help='"auto" to pin each worker to its own cores')
+    parser.add_argument("--warmup", type=float, default=60.0, help="seconds allowed for model loading")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.seconds, args.workload)
+        return
+
+    cores = os.cpu_count() or 1
+    results = []
+    print(f"{cores} cores, workload={args.workload}, {args.seconds:.0f}s per configuration")
+    print(f"{'workers':>8} {'threads':>8} {'total':>6} {'frames/s':>10}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        for threads in (int(t) for t in args.threads.split(",")):
+            fps = run_config(workers, threads, args.seconds, args.workload, args.affinity, args.warmup)
+            results.append((fps, workers, threads))
+            flag = "  (oversubscribed)" if workers * threads > cores else ""
+            print(f"{workers:>8} {threads:>8} {workers * threads:>6} {fps:>10.1f}{flag}")
+
+    fps, workers, threads = max(results)
+    print(f"\nbest: EMOTICAM_WORKERS={workers} EMOTICAM_INTRA_OP_THREADS={threads} -> {fps:.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
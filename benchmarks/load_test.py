@@ -0,0 +1,348 @@
+"""
+Closed-loop load generator: how many camera sessions can one node sustain?
+
+    EMOTICAM_LLM=stub uvicorn app:app            # or serve.py; stub = no Groq calls
+    python benchmarks/load_test.py [--url http://127.0.0.1:8000] [--fps 2]
+        [--start 1] [--max-sessions 64] [--growth 1.5] [--stage-seconds 20]
+        [--slo-ms 800] [--subscribe] [--admin-token T] [--output run.json]
+
+Each simulated camera keeps one keep-alive connection and posts a frame to
+the endpoint (default /api/emotion) every 1/fps seconds, waiting for each
+answer before sending the next; a camera that falls behind sends the next
+frame immediately and the missed ticks are counted as late. With
+--subscribe every camera also holds the SSE stream for its session open,
+the way the UI does.
+
+The number of cameras grows by --growth per stage until the p95 latency
+of the measured window exceeds --slo-ms (or more than 1% of requests
+fail), then bisects between the last passing and the first failing count.
+The last passing count is the maximum sustainable sessions for this node.
+
+After each stage the service's /api/metrics gives the per-stage
+breakdown (inference queue wait, decode, analysis, LLM queue and call).
+With --admin-token the metrics are reset before every stage so each row
+covers that stage only; otherwise they are the service's rolling window.
+Under serve.py every worker has its own metrics and a row shows whichever
+worker answered.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import orjson
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Service metrics shown per stage: (column, metric name)
+STAGE_METRICS = [
+    ("queue", "inference.queue_ms"),
+    ("decode", "ingest.decode_ms"),
+    ("analyze", "inference.analyze_ms"),
+    ("llm queue", "llm.queue_ms"),
+    ("llm call", "llm.call_ms"),
+]
+
+
+class HttpConnection:
+    """
+    Minimal HTTP/1.1 keep-alive client on asyncio streams (Content-Length
+    bodies only, which is all the API sends for JSON).
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, body=b"", headers=None):
+        if self.writer is None:
+            await self.open()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        if body:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{k}: {v}" for k, v in (headers or {}).items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+        status, response_headers = await self.read_head()
+        length = int(response_headers.get("content-length", 0))
+        payload = await self.reader.readexactly(length) if length else b""
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, payload
+
+    async def read_head(self):
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        headers = {}
+        for line in header_lines:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return int(status_line.split()[1]), headers
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def synthetic_frame_jpeg(width=640, height=480):
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, np.full(x.shape, 128.0)], axis=-1)
+    frame = np.clip(base + rng.normal(0, 10, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(frame).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def unique_frame(jpeg, *tag):
+    """
+    The same JPEG with a distinct tag after the end-of-image marker, which
+    decoders ignore: identical pixels, different content hash.
+    """
+    return jpeg + b"".join(int(t).to_bytes(8, "little") for t in tag)
+
+
+class Stage:
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.latencies = []
+        self.errors = 0
+        self.late = 0
+        self.events = 0
+
+    def summary(self, seconds):
+        lat = np.array(self.latencies) if self.latencies else np.zeros(1)
+        total = len(self.latencies) + self.errors
+        return {
+            "sessions": self.sessions,
+            "requests": total,
+            "rps": total / seconds,
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p95_ms": float(np.percentile(lat, 95)),
+            "p99_ms": float(np.percentile(lat, 99)),
+            "error_rate": self.errors / total if total else 0.0,
+            "late_frames": self.late,
+            "sse_events": self.events,
+        }
+
+
+async def camera(host, port, path, make_body, index, period, measure_from, stop_at, stage):
+    loop = asyncio.get_running_loop()
+    conn = HttpConnection(host, port)
+    # Cameras do not start in lockstep
+    next_at = loop.time() + random.uniform(0, period)
+    frame_no = 0
+    try:
+        while True:
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            if loop.time() >= stop_at:
+                break
+            body = make_body(index, frame_no)
+            frame_no += 1
+            sent = loop.time()
+            try:
+                status, _ = await conn.request("POST", path, body)
+                ok = status < 400
+            except (OSError, asyncio.IncompleteReadError):
+                conn.close()
+                ok = False
+            done = loop.time()
+            if sent >= measure_from:
+                if ok:
+                    stage.latencies.append((done - sent) * 1000)
+                else:
+                    stage.errors += 1
+            next_at += period
+            if next_at < done:
+                if sent >= measure_from:
+                    stage.late += int((done - next_at) / period) + 1
+                next_at = done
+    finally:
+        conn.close()
+
+
+async def subscriber(host, port, session_id, stop_at, stage):
+    conn = HttpConnection(host, port)
+    try:
+        await conn.open()
+        conn.writer.write(
+            f"GET /api/emotion/stream/{session_id} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode("latin-1")
+        )
+        await conn.writer.drain()
+        await conn.read_head()
+        loop = asyncio.get_running_loop()
+        while loop.time() < stop_at:
+            try:
+                line = await asyncio.wait_for(conn.reader.readline(), stop_at - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if not line:
+                break
+            if b"event: emotion" in line:
+                stage.events += 1
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+async def fetch_json(host, port, method, path, headers=None):
+    conn = HttpConnection(host, port)
+    try:
+        status, payload = await conn.request(method, path, headers=headers)
+        return orjson.loads(payload) if status < 400 and payload else None
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+async def run_stage(args, host, port, make_body, sessions):
+    admin = {"x-admin-token": args.admin_token} if args.admin_token else None
+    if admin:
+        await fetch_json(host, port, "POST", "/api/admin/metrics/reset", admin)
+
+    loop = asyncio.get_running_loop()
+    stage = Stage(sessions)
+    start = loop.time()
+    measure_from = start + args.warmup_seconds
+    stop_at = measure_from + args.stage_seconds
+    tasks = [
+        camera(host, port, args.endpoint, make_body, i, 1.0 / args.fps, measure_from, stop_at, stage)
+        for i in range(sessions)
+    ]
+    if args.subscribe:
+        tasks += [subscriber(host, port, f"load-{i}", stop_at, stage) for i in range(sessions)]
+    await asyncio.gather(*tasks)
+
+    result = stage.summary(args.stage_seconds)
+    snapshot = await fetch_json(host, port, "GET", "/api/metrics") or {}
+    samples = snapshot.get("samples", {})
+    result["service"] = {name: samples.get(name) for _, name in STAGE_METRICS}
+    return result
+
+
+def passes(result, slo_ms):
+    return result["requests"] > 0 and result["p95_ms"] <= slo_ms and result["error_rate"] <= 0.01
+
+
+def print_row(result, slo_ms):
+    cells = []
+    for _, name in STAGE_METRICS:
+        summary = result["service"].get(name)
+        cells.append(f"{summary['p95']:>9.1f}" if summary else f"{'-':>9}")
+    verdict = "ok" if passes(result, slo_ms) else "SLO miss"
+    print(
+        f"{result['sessions']:>8} {result['rps']:>7.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+        f"{result['error_rate'] * 100:>6.1f}% {result['late_frames']:>6} " + " ".join(cells) + f"  {verdict}",
+        flush=True,
+    )
+
+
+async def main_async(args):
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image = f.read()
+    else:
+        image = synthetic_frame_jpeg()
+
+    def make_body(index, frame_no):
+        # Real cameras never send the same frame twice; a unique tag keeps
+        # the service's per-frame cache from answering for free
+        data_url = "data:image/jpeg;base64," + base64.b64encode(unique_frame(image, index, frame_no)).decode("ascii")
+        return orjson.dumps({"imageData": data_url, "sessionId": f"load-{index}", "refine": args.refine})
+
+    print(f"{args.url}{args.endpoint} at {args.fps} fps per camera, p95 SLO {args.slo_ms:.0f} ms")
+    print("service p95 per stage (ms): " + ", ".join(f"{col}={name}" for col, name in STAGE_METRICS))
+    header = " ".join(f"{col:>9}" for col, _ in STAGE_METRICS)
+    print(f"{'sessions':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'late':>6} {header}")
+
+    results = []
+    best, worst = 0, None
+    sessions = args.start
+    while sessions <= args.max_sessions:
+        result = await run_stage(args, host, port, make_body, sessions)
+        results.append(result)
+        print_row(result, args.slo_ms)
+        if not passes(result, args.slo_ms):
+            worst = sessions
+            break
+        best = sessions
+        sessions = max(sessions + 1, int(sessions * args.growth))
+
+    # Narrow down between the last passing and the first failing count
+    for _ in range(args.bisect_steps):
+        if worst is None or worst - best <= 1:
+            break
+        sessions = (best + worst) // 2
+        result = await run_stage(args, host, port, make_body, sessions)
+        results.append(result)
+        print_row(result, args.slo_ms)
+        if passes(result, args.slo_ms):
+            best = sessions
+        else:
+            worst = sessions
+
+    if worst is None:
+        print(f"\nSLO held up to --max-sessions={args.max_sessions}; raise it to find the limit")
+    print(f"max sustainable sessions: {best} (p95 <= {args.slo_ms:.0f} ms at {args.fps} fps)")
+
+    if args.output:
+        report = {
+            "config": {
+                "endpoint": args.endpoint,
+                "fps": args.fps,
+                "slo_ms": args.slo_ms,
+                "stage_seconds": args.stage_seconds,
+                "subscribe": args.subscribe,
+                "refine": args.refine,
+            },
+            "max_sessions": best,
+            "stages": results,
+        }
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="/api/emotion")
+    parser.add_argument("--image", help="JPEG frame to send (default: synthetic 640x480)")
+    parser.add_argument("--fps", type=float, default=2.0, help="frames per second per camera")
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--growth", type=float, default=1.5)
+    parser.add_argument("--bisect-steps", type=int, default=3)
+    parser.add_argument("--stage-seconds", type=float, default=20.0)
+    parser.add_argument("--warmup-seconds", type=float, default=3.0)
+    parser.add_argument("--slo-ms", type=float, default=800.0)
+    parser.add_argument("--subscribe", action="store_true", help="also hold an SSE stream per camera")
+    parser.add_argument("--refine", action="store_true", help="request LLM refinement for every frame")
+    parser.add_argument("--admin-token", default=os.getenv("EMOTICAM_ADMIN_TOKEN", ""))
+    parser.add_argument("--output", help="write the stage results as JSON")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Performance regression gate for the emotion pipeline.
+
+    python benchmarks/perf_gate.py --update                  # record a baseline
+    python benchmarks/perf_gate.py                           # compare, exit 1 on regression
+        [--baseline benchmarks/perf_baseline.json] [--image face.jpg]
+        [--frames 60] [--concurrency 4] [--repeats 3]
+        [--tolerance 0.15] [--p95-tolerance 0.3] [--alpha 0.01] [--min-delta-ms 1]
+
+Runs a fixed scenario in process against app.py's /api/emotion handler,
+with the stub LLM (EMOTICAM_LLM=stub) and throwaway cache/timeline
+directories: a sequential latency phase of --frames requests, then
+--repeats throughput phases of --frames requests from --concurrency
+concurrent cameras. Every request is a new session with refinement on, so
+each one takes the full path (decode, DeepFace, cache, rules, LLM
+refinement in the background).
+
+Per stage (end-to-end request, inference queue, decode, analysis, LLM
+queue, LLM call) the raw samples are compared with the baseline's. A
+stage regresses when its median is more than --tolerance slower AND a
+one-sided Mann-Whitney U test says the slowdown is significant at
+--alpha, or when its p95 is more than --p95-tolerance slower; slowdowns
+under --min-delta-ms never count. Throughput regresses when the median frames/s drops by more than
+--tolerance. Exit status: 0 pass, 1 regression, 2 no baseline.
+
+Baselines are only comparable on the same machine and settings; the host
+is recorded and a mismatch is reported. For that reason no baseline is
+committed: on each host (developer machine, CI runner) run --update once
+on a known-good revision before gating, or the gate exits 2.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import orjson
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import synthetic_frame_jpeg, unique_frame  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "perf_baseline.json")
+# Stage name -> service metric ("request" is measured by the gate itself)
+STAGES = {
+    "request": None,
+    "inference.queue": "inference.queue_ms",
+    "decode": "ingest.decode_ms",
+    "analyze": "inference.analyze_ms",
+    "llm.queue": "llm.queue_ms",
+    "llm.call": "llm.call_ms",
+}
+# Samples kept per stage in the baseline file
+MAX_STORED_SAMPLES = 500
+
+
+def configure_service(workdir):
+    # Must run before app is imported: these are read at import time
+    defaults = {
+        "EMOTICAM_LLM": "stub",
+        "EMOTICAM_STUB_LLM_LATENCY_MS": "50",
+        "EMOTICAM_LLM_RPM": "100000",
+        "EMOTICAM_LLM_TPM": "100000000",
+        "EMOTICAM_PRECOMPUTE": "0",
+        "EMOTICAM_TRACE_SAMPLE": "0",
+        "EMOTICAM_PROFILE_SAMPLE": "0",
+        "EMOTICAM_CACHE_PATH": os.path.join(workdir, "analyses.sqlite3"),
+        "EMOTICAM_STATE_PATH": os.path.join(workdir, "state.sqlite3"),
+        "EMOTICAM_TIMELINE_DIR": os.path.join(workdir, "timeline"),
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+async def drain_background():
+    pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Every request carries a distinct frame so the per-frame analysis cache
+# never answers for the pipeline
+_request_no = itertools.count()
+
+
+def data_url_for(image, request_no):
+    return "data:image/jpeg;base64," + base64.b64encode(unique_frame(image, request_no)).decode("ascii")
+
+
+async def run_phase(service, image, frames, concurrency, tag):
+    """
+    Send `frames` requests from `concurrency` cameras; returns (request
+    latencies in ms, frames/s). Background refinements are awaited so their
+    LLM stages land in this phase.
+    """
+    latencies = []
+    counter = iter(range(frames))
+
+    async def worker():
+        for i in counter:
+            data_url = data_url_for(image, next(_request_no))
+            req = service.EmotionRequest(imageData=data_url, sessionId=f"{tag}-{i}", refine=True)
+            started = time.perf_counter()
+            await service.analyze_emotion(req)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await drain_background()
+    return latencies, frames / elapsed
+
+
+async def run_scenario(args):
+    configure_service(tempfile.mkdtemp(prefix="perf-gate-"))
+    import app as service
+    from metrics import metrics
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image = f.read()
+    else:
+        image = synthetic_frame_jpeg()
+    service.warm_up_models()
+    await run_phase(service, image, min(5, args.frames), 1, "warmup")
+    metrics.reset()
+
+    request_ms, _ = await run_phase(service, image, args.frames, 1, "latency")
+    throughput = []
+    for repeat in range(args.repeats):
+        _, fps = await run_phase(service, image, args.frames, args.concurrency, f"load{repeat}")
+        throughput.append(fps)
+
+    stages = {"request": request_ms}
+    for stage, name in STAGES.items():
+        if name is not None:
+            stages[stage] = metrics.samples(name)
+    return {
+        "host": {"machine": platform.machine(), "cpus": os.cpu_count(), "python": platform.python_version()},
+        "scenario": {
+            "frames": args.frames,
+            "concurrency": args.concurrency,
+            "repeats": args.repeats,
+            "image": os.path.basename(args.image) if args.image else "synthetic",
+        },
+        "throughput_fps": throughput,
+        "stages": {k: [round(v, 3) for v in samples[-MAX_STORED_SAMPLES:]] for k, samples in stages.items()},
+    }
+
+
+def mann_whitney_greater(baseline, current):
+    """
+    One-sided p-value that `current` tends to be larger than `baseline`
+    (normal approximation with average ranks for ties).
+    """
+    a, b = np.asarray(baseline, dtype=float), np.asarray(current, dtype=float)
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    _, inverse, counts = np.unique(np.concatenate([a, b]), return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    ranks = ((ends - counts + 1 + ends) / 2.0)[inverse]
+    u = ranks[n1:].sum() - n2 * (n2 + 1) / 2.0
+    sigma = math.sqrt(n1 * n2 * (n1 + n2 + 1) / 12.0)
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def change(base, current):
+    return (current - base) / base if base else 0.0
+
+
+def compare(baseline, current, args):
+    """
+    Print the per-stage diff; returns the list of regressed stage names.
+    """
+    regressions = []
+    print(f"{'stage':<16} {'base p50':>9} {'now p50':>9} {'Δ':>7} {'base p95':>9} {'now p95':>9} {'Δ':>7} {'p-value':>8}  verdict")
+    for stage in STAGES:
+        base = baseline["stages"].get(stage) or []
+        now = current["stages"].get(stage) or []
+        if not base or not now:
+            print(f"{stage:<16} {'(no samples)':>57}")
+            continue
+        b50, n50 = float(np.median(base)), float(np.median(now))
+        b95, n95 = float(np.percentile(base, 95)), float(np.percentile(now, 95))
+        p_value = mann_whitney_greater(base, now)
+        # Sub-millisecond stages (an empty LLM queue) swing by large ratios
+        slower = change(b50, n50) > args.tolerance and p_value < args.alpha and n50 - b50 > args.min_delta_ms
+        tail = change(b95, n95) > args.p95_tolerance and n95 - b95 > args.min_delta_ms
+        verdict = "REGRESSED" if slower or tail else "ok"
+        if slower or tail:
+            regressions.append(stage)
+        print(
+            f"{stage:<16} {b50:>9.2f} {n50:>9.2f} {change(b50, n50):>+7.0%} "
+            f"{b95:>9.2f} {n95:>9.2f} {change(b95, n95):>+7.0%} {p_value:>8.4f}  {verdict}"
+        )
+
+    base_fps = float(np.median(baseline["throughput_fps"]))
+    now_fps = float(np.median(current["throughput_fps"]))
+    dropped = change(base_fps, now_fps) < -args.tolerance
+    if dropped:
+        regressions.append("throughput")
+    print(
+        f"{'throughput fps':<16} {base_fps:>9.2f} {now_fps:>9.2f} {change(base_fps, now_fps):>+7.0%}"
+        f"{'':>36}  {'REGRESSED' if dropped else 'ok'}"
+    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--image", help="JPEG frame (default: synthetic 640x480)")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed median slowdown / throughput drop")
+    parser.add_argument("--p95-tolerance", type=float, default=0.3, help="allowed p95 slowdown")
+    parser.add_argument("--alpha", type=float, default=0.01, help="significance level for the median test")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    current = asyncio.run(run_scenario(args))
+
+    if args.update:
+        with open(args.baseline, "wb") as f:
+            f.write(orjson.dumps(current, option=orjson.OPT_INDENT_2))
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; baselines are per host and not committed, "
+              "run with --update on a known-good revision first")
+        return 2
+    with open(args.baseline, "rb") as f:
+        baseline = orjson.loads(f.read())
+
+    if baseline["host"] != current["host"]:
+        print(f"warning: baseline from {baseline['host']}, this run on {current['host']}")
+    if baseline["scenario"] != current["scenario"]:
+        print(f"warning: baseline scenario {baseline['scenario']} differs from {current['scenario']}")
+
+    regressions = compare(baseline, current, args)
+    if regressions:
+        print(f"\nFAIL: regression in {', '.join(regressions)}")
+        return 1
+    print("\nPASS: within tolerance of the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,3 @@
-from groq import Groq
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -7,7 +6,22 @@ load_dotenv()
 def get_client():
     api_key = os.getenv("GROQ_API_KEY")
     # print(api_key)
-    client = Groq(api_key=api_key)
+    # EMOTICAM_LLM=stub answers from the rule tables offline; only when asked
+    # for, so a missing key in production fails loudly instead
+    if os.getenv("EMOTICAM_LLM") == "stub":
+        from stub_llm import StubClient
+        print("Using the stub LLM client")
+        return StubClient()
+    if not api_key:
+        raise RuntimeError("GROQ_API_KEY is not set (EMOTICAM_LLM=stub runs without an LLM)")
+    from groq import Groq
+    # No SDK retries: a 429 must reach the router so the scheduler backs off,
+    # and any waiting happens in the scheduler's queue
+    client = Groq(api_key=api_key, max_retries=0)
     # client = Groq()
     return client
-    
+
+
+def client_kind(client):
+    # "stub" or "groq"; cached answers are kept apart per kind
+    return getattr(client, "kind", "groq")
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+import asyncio
+import time
+
+from sqlite_store import SQLiteStore
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emotion_sessions (
+    session TEXT PRIMARY KEY,
+    emotion TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    changed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS emotion_sessions_changed ON emotion_sessions (changed);
+"""
+
+# Rows of sessions that have not changed for this long are deleted
+SESSION_TTL = 24 * 3600.0
+
+
+class SessionState:
+    __slots__ = ("emotion", "version", "changed", "waiters")
+
+    def __init__(self, emotion):
+        self.emotion = emotion
+        self.version = 0
+        # Replaced (after being set) on every change, so waiters never miss one
+        self.changed = asyncio.Event()
+        self.waiters = 0
+
+
+class EmotionHub(SQLiteStore):
+    """
+    Latest dominant emotion per session, with a version token that only moves
+    when the emotion actually changes.
+
+    Subscribers pass the last version they saw and are woken on the next
+    change (or time out), so an idle UI holds one open request instead of
+    polling. The authoritative emotion and version live in a SQLite table
+    shared by every worker: a change published on one worker wakes local
+    subscribers at once and other workers' subscribers within
+    `poll_interval` (one query per worker per interval, only while someone
+    is waiting). Lives on the event loop; keeps local state for at most
+    `max_sessions`, dropping the least recently used.
+    """
+
+    def __init__(self, path, default_emotion="happy", max_sessions=1000, poll_interval=0.5):
+        self.default_emotion = default_emotion
+        self.max_sessions = max_sessions
+        self.poll_interval = poll_interval
+        self.sessions = OrderedDict()
+        self._poller = None
+        self._writes = 0
+        super().__init__(path, SCHEMA)
+
+    def _state(self, session_id):
+        state = self.sessions.get(session_id)
+        if state is None:
+            state = self.sessions[session_id] = SessionState(self.default_emotion)
+            while len(self.sessions) > self.max_sessions:
+                _, dropped = self.sessions.popitem(last=False)
+                dropped.changed.set()  # release anyone still waiting on it
+        else:
+            self.sessions.move_to_end(session_id)
+        return state
+
+    def _apply(self, session_id, emotion, version):
+        state = self._state(session_id)
+        if version <= state.version:
+            return
+        state.emotion = emotion
+        state.version = version
+        changed, state.changed = state.changed, asyncio.Event()
+        changed.set()
+
+    def _read(self, session_id):
+        return self._conn().execute(
+            "SELECT emotion, version FROM emotion_sessions WHERE session = ?", (session_id,)
+        ).fetchone()
+
+    def _publish(self, session_id, emotion, cleanup):
+        # Read first: most frames do not change the emotion and need no write
+        row = self._read(session_id)
+        current = row[0] if row is not None else self.default_emotion
+        if emotion != current:
+            conn = self._conn()
+            now = time.time()
+            conn.execute(
+                "INSERT INTO emotion_sessions (session, emotion, version, changed) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (session) DO UPDATE SET emotion = excluded.emotion, version = version + 1, "
+                "changed = excluded.changed WHERE emotion != excluded.emotion",
+                (session_id, emotion, now),
+            )
+            if cleanup:
+                conn.execute("DELETE FROM emotion_sessions WHERE changed < ?", (now - SESSION_TTL,))
+            row = self._read(session_id)
+        return row
+
+    def _changed_since(self, since):
+        return self._conn().execute(
+            "SELECT session, emotion, version FROM emotion_sessions WHERE changed >= ?", (since,)
+        ).fetchall()
+
+    async def publish(self, session_id, emotion):
+        self._writes += 1
+        cleanup = self._writes % 1000 == 0
+        row = await self._run(self._publish, session_id, emotion, cleanup)
+        if row is not None:
+            self._apply(session_id, *row)
+        return self._state(session_id).version
+
+    async def refresh(self, session_id):
+        row = await self._run(self._read, session_id)
+        if row is not None:
+            self._apply(session_id, *row)
+
+    def snapshot(self, session_id):
+        state = self._state(session_id)
+        return {"sessionId": session_id, "emotion": state.emotion, "version": state.version, "changed": True}
+
+    async def wait(self, session_id, since, timeout):
+        """
+        Current state as soon as its version differs from `since`; after
+        `timeout` seconds the unchanged state with changed=False.
+        """
+        await self.refresh(session_id)
+        state = self._state(session_id)
+        if since is None or state.version != since:
+            return self.snapshot(session_id)
+        state.waiters += 1
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            await asyncio.wait_for(state.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            state.waiters -= 1
+        if self.sessions.get(session_id) is not state:
+            # Evicted while waiting: answer from what this waiter knew, as a
+            # timeout, rather than from a fresh default state
+            return {"sessionId": session_id, "emotion": state.emotion, "version": state.version,
+                    "changed": state.version != since}
+        current = self.snapshot(session_id)
+        current["changed"] = current["version"] != since
+        return current
+
+    async def _poll(self):
+        # Picks up changes published by other workers while anyone waits here
+        polled = time.time()
+        while any(state.waiters for state in self.sessions.values()):
+            await asyncio.sleep(self.poll_interval)
+            # Overlap the windows a little; re-applying a version is a no-op
+            since, polled = polled - 1.0, time.time()
+            try:
+                rows = await self._run(self._changed_since, since)
+            except Exception as e:
+                print("Emotion poll failed:", e)
+                continue
+            for session_id, emotion, version in rows:
+                if session_id in self.sessions:
+                    self._apply(session_id, emotion, version)
@@ -0,0 +1,324 @@
+import functools
+import os
+import threading
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+from face_models import registry as models
+from ingest import decode_base64, ingest_image
+from tracing import span
+
+
+# DeepFace emotion model output order
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+# Input size of DeepFace's emotion CNN (grayscale)
+EMOTION_INPUT_SIZE = (48, 48)
+# Input size of the age and gender models (VGG-Face backbone, BGR)
+ATTRIBUTE_INPUT_SIZE = 224
+GENDERS = ["Woman", "Man"]
+
+# "rgb": DeepFace end to end. "gray": decode luminance only and run the
+# emotion CNN on grayscale crops, for detectors that work on one channel.
+PIPELINE_MODE = os.getenv("EMOTICAM_PIPELINE_MODE", "rgb")
+# "skip" classifies the whole frame as one face
+GRAY_DETECTORS = ("opencv", "skip")
+
+_cascades = threading.local()
+
+
+def decode_image(image_data, mode="RGB"):
+    """
+    Decode a base64 (optionally data-URL prefixed) image into a bounded,
+    working-resolution RGB (or with mode="L", grayscale) array.
+    Raises ingest.ImageRejected.
+    """
+    return decode_frame(decode_base64(image_data), mode=mode)
+
+
+def decode_frame(img_bytes, mode="RGB"):
+    """
+    decode_image for already base64-decoded upload bytes.
+    """
+    with span("decode", mode=mode) as decode_span:
+        frame, stats = ingest_image(img_bytes, mode=mode)
+        decode_span.set(source_size=stats["source_size"], est_peak_bytes=stats["est_peak_bytes"])
+    return frame
+
+
+def analyze_frame(img_np):
+    """
+    The per-frame emotion analysis used by the API: DeepFace.analyze with
+    detection not enforced. Always returns a list of face dicts.
+    """
+    with span("deepface.analyze"):
+        result = DeepFace.analyze(img_np, actions=["emotion"], enforce_detection=False)
+    return result if isinstance(result, list) else [result]
+
+
+def warm_up(analyze=analyze_frame, mode="RGB"):
+    """
+    Run a frame pipeline (as returned by frame_pipeline) once on a blank
+    frame, so the detector and every model it uses are built before real
+    frames arrive. analyze_frame goes through DeepFace.analyze, which keeps
+    its own model instances; warming any other path would not help it.
+    """
+    analyze(np.zeros((240, 320) if mode == "L" else (240, 320, 3), dtype=np.uint8))
+
+
+def get_emotion_model():
+    """
+    Return the underlying keras model of DeepFace's emotion classifier (cached).
+    """
+    return models.get("emotion")
+
+
+def detect_faces(img_np, detector_backend="opencv"):
+    """
+    Run face detection and alignment once, returning DeepFace's face dicts
+    (aligned RGB crop in [0, 1], facial_area, confidence).
+    """
+    return DeepFace.extract_faces(
+        img_path=img_np,
+        detector_backend=detector_backend,
+        enforce_detection=False,
+        align=True,
+    )
+
+
+def preprocess_crops(faces):
+    """
+    Stack face crops into one (N, 48, 48, 1) float32 batch for the emotion CNN.
+    """
+    batch = np.empty((len(faces), *EMOTION_INPUT_SIZE, 1), dtype=np.float32)
+    for i, face in enumerate(faces):
+        crop = face["face"]
+        if crop.dtype != np.uint8:
+            crop = (crop * 255).astype(np.uint8)
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        batch[i, :, :, 0] = cv2.resize(gray, EMOTION_INPUT_SIZE)
+    batch /= 255.0
+    return batch
+
+
+def classify_crops(batch):
+    """
+    Classify a batch of preprocessed crops in a single forward pass.
+    Returns an (N, 7) array of probabilities in EMOTIONS order.
+    """
+    if len(batch) == 0:
+        return np.zeros((0, len(EMOTIONS)), dtype=np.float32)
+    model = get_emotion_model()
+    probs = np.asarray(model(batch, training=False), dtype=np.float32)
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def aggregate_distribution(probs):
+    """
+    Mean emotion distribution (percent) and dominant-emotion counts over faces.
+    """
+    if len(probs) == 0:
+        return {"distribution": {e: 0.0 for e in EMOTIONS}, "dominant_counts": {}, "dominant_emotion": "neutral"}
+
+    mean = probs.mean(axis=0) * 100
+    dominant = probs.argmax(axis=1)
+    counts = np.bincount(dominant, minlength=len(EMOTIONS))
+    return {
+        "distribution": dict(zip(EMOTIONS, mean.round(2).tolist())),
+        "dominant_counts": {EMOTIONS[i]: int(c) for i, c in enumerate(counts) if c},
+        "dominant_emotion": EMOTIONS[int(mean.argmax())],
+    }
+
+
+def preprocess_attribute_crops(faces):
+    """
+    Stack face crops into one (N, 224, 224, 3) float32 BGR batch for the
+    age/gender models: aspect-preserving resize, zero padding, [0, 1].
+    """
+    size = ATTRIBUTE_INPUT_SIZE
+    batch = np.zeros((len(faces), size, size, 3), dtype=np.float32)
+    for i, face in enumerate(faces):
+        crop = face["face"]
+        if crop.dtype != np.uint8:
+            crop = (crop * 255).astype(np.uint8)
+        height, width = crop.shape[:2]
+        scale = min(size / height, size / width)
+        resized = cv2.resize(crop[:, :, ::-1], (max(1, int(width * scale)), max(1, int(height * scale))))
+        top = (size - resized.shape[0]) // 2
+        left = (size - resized.shape[1]) // 2
+        batch[i, top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    batch /= 255.0
+    return batch
+
+
+def _predict(action, batch, keep):
+    model = models.get(action, keep=keep)
+    return np.asarray(model(batch, training=False), dtype=np.float32)
+
+
+def analyze_faces(img_np, actions=("emotion",), detector_backend="opencv"):
+    """
+    Detect and align faces once, then run every selected action head
+    (emotion, age, gender) on the shared crops, one batch per head.
+    Models load on first use within the face_models memory budget.
+
+    Returns (faces, emotion probs or None); each face dict has its region
+    plus the selected attributes in DeepFace's result format.
+    """
+    actions = tuple(dict.fromkeys(actions))
+    models.check(actions)
+    with span("detect", backend=detector_backend):
+        faces = detect_faces(img_np, detector_backend=detector_backend)
+    # With enforce_detection=False DeepFace returns the whole frame with
+    # confidence 0 when nothing is found; that is not a face.
+    faces = [f for f in faces if f.get("confidence", 0) > 0]
+
+    results = [{"region": f["facial_area"], "face_confidence": f.get("confidence")} for f in faces]
+    probs = None
+    if "emotion" in actions:
+        with span("emotion.classify", faces=len(faces)):
+            probs = classify_crops(preprocess_crops(faces))
+        for result, p in zip(results, probs):
+            result["emotion"] = dict(zip(EMOTIONS, (p * 100).tolist()))
+            result["dominant_emotion"] = EMOTIONS[int(p.argmax())]
+
+    attributes = [a for a in actions if a in ("age", "gender")]
+    if attributes and faces:
+        # Both heads share the same 224x224 input
+        batch = preprocess_attribute_crops(faces)
+        if "age" in attributes:
+            with span("age.predict", faces=len(faces)):
+                ages = _predict("age", batch, actions) @ np.arange(101, dtype=np.float32)
+            for result, age in zip(results, ages):
+                result["age"] = round(float(age), 1)
+        if "gender" in attributes:
+            with span("gender.predict", faces=len(faces)):
+                genders = _predict("gender", batch, actions)
+            for result, g in zip(results, genders):
+                result["gender"] = dict(zip(GENDERS, (g * 100).tolist()))
+                result["dominant_gender"] = GENDERS[int(g.argmax())]
+    return results, probs
+
+
+def analyze_group(img_np, detector_backend="opencv"):
+    """
+    Analyze every face in a frame: one detection pass, one batched emotion pass.
+
+    Returns per-face results plus the aggregate distribution over all faces.
+    """
+    results, probs = analyze_faces(img_np, ("emotion",), detector_backend=detector_backend)
+    group = aggregate_distribution(probs)
+    group["face_count"] = len(results)
+    group["faces"] = results
+    return group
+
+
+def _face_cascade():
+    # CascadeClassifier is not safe to share between threads
+    cascade = getattr(_cascades, "face", None)
+    if cascade is None:
+        cascade = _cascades.face = cv2.CascadeClassifier(
+            os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        )
+    return cascade
+
+
+def detect_faces_gray(gray, detector_backend="opencv"):
+    """
+    Face boxes and confidences on a grayscale frame. Uses the same Haar
+    cascade and parameters as DeepFace's opencv backend, minus its
+    eye-based alignment.
+    """
+    if detector_backend == "skip":
+        return [], []
+    boxes, _, scores = _face_cascade().detectMultiScale3(gray, 1.1, 10, outputRejectLevels=True)
+    if len(boxes) == 0:
+        return [], []
+    return [tuple(int(v) for v in box) for box in boxes], [float(s) for s in np.ravel(scores)]
+
+
+def preprocess_gray_crops(gray, boxes):
+    """
+    Cut, resize and stack face boxes of a grayscale frame into one
+    (N, 48, 48, 1) float32 batch; no color conversion at any point.
+    """
+    batch = np.empty((len(boxes), *EMOTION_INPUT_SIZE, 1), dtype=np.float32)
+    for i, (x, y, w, h) in enumerate(boxes):
+        batch[i, :, :, 0] = cv2.resize(gray[y:y + h, x:x + w], EMOTION_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+    batch /= 255.0
+    return batch
+
+
+def _gray_faces(gray, detector_backend):
+    with span("detect", backend=detector_backend, mode="L"):
+        boxes, confidences = detect_faces_gray(gray, detector_backend)
+    with span("emotion.classify", faces=len(boxes)):
+        probs = classify_crops(preprocess_gray_crops(gray, boxes))
+    return boxes, confidences, probs
+
+
+def _face_result(box, confidence, p):
+    x, y, w, h = box
+    return {
+        "region": {"x": x, "y": y, "w": w, "h": h},
+        "face_confidence": confidence,
+        "emotion": dict(zip(EMOTIONS, (p * 100).tolist())),
+        "dominant_emotion": EMOTIONS[int(p.argmax())],
+    }
+
+
+def analyze_frame_gray(gray, detector_backend="opencv"):
+    """
+    analyze_frame for a grayscale frame. Like DeepFace without enforced
+    detection, a frame with no detected face is classified as a whole
+    (face_confidence 0).
+    """
+    boxes, confidences, probs = _gray_faces(gray, detector_backend)
+    if not boxes:
+        height, width = gray.shape[:2]
+        whole = (0, 0, width, height)
+        return [_face_result(whole, 0, classify_crops(preprocess_gray_crops(gray, [whole]))[0])]
+    return [_face_result(box, c, p) for box, c, p in zip(boxes, confidences, probs)]
+
+
+def analyze_group_gray(gray, detector_backend="opencv"):
+    """
+    analyze_group for a grayscale frame.
+    """
+    boxes, confidences, probs = _gray_faces(gray, detector_backend)
+    group = aggregate_distribution(probs)
+    group["face_count"] = len(boxes)
+    group["faces"] = [_face_result(box, c, p) for box, c, p in zip(boxes, confidences, probs)]
+    return group
+
+
+def frame_pipeline(detector_backend="opencv"):
+    """
+    (analyze, decode mode) for single-frame analysis under EMOTICAM_PIPELINE_MODE.
+    """
+    if PIPELINE_MODE == "gray" and detector_backend in GRAY_DETECTORS:
+        return functools.partial(analyze_frame_gray, detector_backend=detector_backend), "L"
+    return analyze_frame, "RGB"
+
+
+def group_pipeline(detector_backend="opencv"):
+    """
+    (analyze, decode mode) for group analysis under EMOTICAM_PIPELINE_MODE.
+    """
+    if PIPELINE_MODE == "gray" and detector_backend in GRAY_DETECTORS:
+        return functools.partial(analyze_group_gray, detector_backend=detector_backend), "L"
+    return functools.partial(analyze_group, detector_backend=detector_backend), "RGB"
+
+
+def summarize_group(group):
+    """
+    Compact summary of a group analysis for the LLM prompt (no per-face data).
+    """
+    return {
+        "face_count": group["face_count"],
+        "dominant_emotion": group["dominant_emotion"],
+        "distribution": {e: round(v, 1) for e, v in group["distribution"].items() if v >= 1},
+        "dominant_counts": group["dominant_counts"],
+    }
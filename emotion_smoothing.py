@@ -0,0 +1,164 @@
+import os
+import time
+
+import numpy as np
+import orjson
+
+from sqlite_store import SQLiteStore
+from timeline_store import EMOTIONS
+
+
+# Weight of the newest frame in the moving average
+SMOOTHING_ALPHA = float(os.getenv("EMOTICAM_SMOOTHING_ALPHA", "0.3"))
+# A challenger must beat the current state's smoothed probability by this much
+SWITCH_MARGIN = float(os.getenv("EMOTICAM_SWITCH_MARGIN", "0.1"))
+# ...and keep doing so for this long before the state switches
+MIN_DWELL_SECONDS = float(os.getenv("EMOTICAM_MIN_DWELL_SECONDS", "1.5"))
+# Sessions without a frame for this long are deleted
+SESSION_TTL = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emotion_smoothing (
+    session TEXT PRIMARY KEY,
+    probs BLOB NOT NULL,
+    state TEXT NOT NULL,
+    challenger TEXT,
+    challenger_since REAL,
+    analysis BLOB,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS emotion_smoothing_updated ON emotion_smoothing (updated);
+"""
+
+
+class SessionEmotion:
+    __slots__ = ("session_id", "probs", "state", "challenger", "challenger_since", "analysis", "updated")
+
+    def __init__(self, session_id, probs, now):
+        self.session_id = session_id
+        self.probs = probs
+        self.state = EMOTIONS[int(np.argmax(probs))]
+        self.challenger = None
+        self.challenger_since = None
+        # Last analysis served for `state`, reused until the state changes
+        self.analysis = None
+        self.updated = now
+
+
+class EmotionSmoother(SQLiteStore):
+    """
+    Per-session exponential moving average over emotion probability vectors,
+    with hysteresis on the dominant emotion.
+
+    The stable state only moves to another emotion once that emotion leads
+    the current one by `margin` in the smoothed distribution, continuously
+    for `min_dwell` seconds, so single-frame flicker (neutral <-> happy) does
+    not count as a change.
+
+    A session's frames can land on any worker, so its average, state and
+    last analysis live in the shared state database; each frame is folded
+    in one write transaction, and every worker sees the same state. Sessions
+    idle for `session_ttl` seconds are deleted.
+    """
+
+    def __init__(self, path, alpha=SMOOTHING_ALPHA, margin=SWITCH_MARGIN, min_dwell=MIN_DWELL_SECONDS,
+                 session_ttl=SESSION_TTL):
+        self.alpha = alpha
+        self.margin = margin
+        self.min_dwell = min_dwell
+        self.session_ttl = session_ttl
+        self._updates = 0
+        super().__init__(path, SCHEMA)
+
+    def fold(self, session, probs, now):
+        """
+        Fold one frame's probabilities into `session` in place; returns True
+        when the stable state switched on this frame.
+        """
+        session.probs = self.alpha * probs + (1.0 - self.alpha) * session.probs
+        session.updated = now
+        leader = EMOTIONS[int(np.argmax(session.probs))]
+        current = session.probs[EMOTIONS.index(session.state)]
+        if leader == session.state or session.probs[EMOTIONS.index(leader)] - current < self.margin:
+            session.challenger = session.challenger_since = None
+            return False
+
+        if leader != session.challenger:
+            session.challenger, session.challenger_since = leader, now
+        if now - session.challenger_since < self.min_dwell:
+            return False
+
+        session.state = leader
+        session.challenger = session.challenger_since = None
+        session.analysis = None
+        return True
+
+    async def update(self, session_id, probs, now=None):
+        """
+        Fold one frame's probabilities (EMOTIONS order) into the session.
+        Returns (session, changed); `changed` is True for a new session or
+        when the stable state switched on this frame.
+        """
+        now = time.time() if now is None else now
+        self._updates += 1
+        cleanup = self._updates % 1000 == 0
+        return await self._run(self._update, session_id, np.asarray(probs, dtype=np.float32), now, cleanup)
+
+    async def set_analysis(self, session, analysis):
+        """
+        Remember the analysis served for the session's current state; kept
+        only while that is still the stored state.
+        """
+        session.analysis = analysis
+        await self._run(self._set_analysis, session.session_id, session.state, orjson.dumps(analysis))
+
+    def emotion_dict(self, session):
+        """
+        Smoothed distribution as a DeepFace-style percent dict.
+        """
+        return {e: float(p) * 100.0 for e, p in zip(EMOTIONS, session.probs)}
+
+    def _update(self, session_id, probs, now, cleanup):
+        conn = self._conn()
+        # One writer at a time, so two workers' frames of one session are
+        # folded one after the other, never both into the same old state
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT probs, state, challenger, challenger_since, analysis, updated "
+                "FROM emotion_smoothing WHERE session = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None or now - row[5] > self.session_ttl:
+                session, changed = SessionEmotion(session_id, probs, now), True
+            else:
+                session = SessionEmotion(session_id, np.frombuffer(row[0], dtype=np.float32), row[5])
+                session.state, session.challenger, session.challenger_since = row[1], row[2], row[3]
+                session.analysis = orjson.loads(row[4]) if row[4] is not None else None
+                changed = self.fold(session, probs, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO emotion_smoothing "
+                "(session, probs, state, challenger, challenger_since, analysis, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    session_id,
+                    np.asarray(session.probs, dtype=np.float32).tobytes(),
+                    session.state,
+                    session.challenger,
+                    session.challenger_since,
+                    orjson.dumps(session.analysis) if session.analysis is not None else None,
+                    now,
+                ),
+            )
+            if cleanup:
+                conn.execute("DELETE FROM emotion_smoothing WHERE updated < ?", (now - self.session_ttl,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return session, changed
+
+    def _set_analysis(self, session_id, state, analysis):
+        self._conn().execute(
+            "UPDATE emotion_smoothing SET analysis = ? WHERE session = ? AND state = ?",
+            (analysis, session_id, state),
+        )
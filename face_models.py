@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import gc
+import os
+import threading
+
+from deepface import DeepFace
+
+
+# Approximate resident size of each attribute model's weights. Age and
+# gender are each a full VGG-Face backbone; emotion is a small CNN.
+MODEL_SIZES_MB = {"emotion": 6, "age": 540, "gender": 540}
+MODEL_NAMES = {"emotion": "Emotion", "age": "Age", "gender": "Gender"}
+ACTIONS = tuple(MODEL_SIZES_MB)
+
+MODEL_BUDGET_MB = float(os.getenv("EMOTICAM_MODEL_BUDGET_MB", "1200"))
+
+
+class ModelBudgetExceeded(RuntimeError):
+    pass
+
+
+def _build(action):
+    name = MODEL_NAMES[action]
+    # DeepFace keeps one instance per model and DeepFace.analyze uses the
+    # same one, so the registry shares it rather than holding a second copy
+    try:
+        client = DeepFace.build_model(model_name=name, task="facial_attribute")
+    except TypeError:
+        # deepface < 0.0.93 has no task argument
+        client = DeepFace.build_model(name)
+    return client.model
+
+
+def _release(action):
+    # Evicting must drop DeepFace's instance too, or the weights stay
+    # resident; DeepFace builds it again if anything asks for it later
+    name = MODEL_NAMES[action]
+    try:
+        from deepface.modules import modeling
+        modeling.cached_models["facial_attribute"].pop(name, None)
+    except (ImportError, AttributeError, KeyError):
+        pass
+
+
+class ModelRegistry:
+    """
+    Lazily loaded keras models for the face attribute actions, kept under a
+    memory budget.
+
+    A model is built on first use. When loading one would go over
+    `budget_mb`, the least recently used models not needed by the current
+    call are dropped first; a call whose own actions do not fit raises
+    ModelBudgetExceeded. Loading happens outside the registry lock: callers
+    wanting a model that is still loading wait for that load, while other
+    models stay available.
+    """
+
+    def __init__(self, budget_mb=MODEL_BUDGET_MB, loader=_build, releaser=_release):
+        self.budget_mb = budget_mb
+        self.loader = loader
+        self.releaser = releaser
+        self._models = OrderedDict()
+        # action -> Future of a load in progress
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def loaded(self):
+        return list(self._models)
+
+    def used_mb(self):
+        # Loads in progress count: their memory is being allocated
+        return sum(MODEL_SIZES_MB[action] for action in (*self._models, *self._loading))
+
+    def check(self, actions):
+        unknown = set(actions) - set(ACTIONS)
+        if unknown:
+            raise ValueError(f"unknown actions {sorted(unknown)}; choose from {list(ACTIONS)}")
+        if sum(MODEL_SIZES_MB[a] for a in set(actions)) > self.budget_mb:
+            raise ModelBudgetExceeded(
+                f"actions {sorted(set(actions))} need more than the {self.budget_mb:.0f} MB model budget"
+            )
+
+    def get(self, action, keep=()):
+        """
+        The model for `action`, loading it if needed; models in `keep` (the
+        other actions of the same call) are never evicted for it.
+        """
+        with self._lock:
+            model = self._models.get(action)
+            if model is not None:
+                self._models.move_to_end(action)
+                return model
+            future = self._loading.get(action)
+            loading = future is None
+            if loading:
+                evicted = self._make_room(action, keep)
+                future = self._loading[action] = Future()
+
+        if not loading:
+            return future.result()
+
+        for name in evicted:
+            self.releaser(name)
+        if evicted:
+            gc.collect()
+        try:
+            model = self.loader(action)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[action]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._models[action] = model
+            del self._loading[action]
+        future.set_result(model)
+        return model
+
+    def _make_room(self, action, keep):
+        # Under the lock: check the budget and evict for a new load
+        needed = MODEL_SIZES_MB[action]
+        pinned = set(keep) | {action}
+        in_use = [a for a in (*self._models, *self._loading) if a in pinned]
+        if needed + sum(MODEL_SIZES_MB[a] for a in in_use) > self.budget_mb:
+            raise ModelBudgetExceeded(
+                f"actions {sorted(pinned)} need more than the {self.budget_mb:.0f} MB model budget"
+            )
+        evicted = []
+        for loaded in list(self._models):
+            if self.used_mb() + needed <= self.budget_mb:
+                break
+            if loaded not in pinned:
+                del self._models[loaded]
+                evicted.append(loaded)
+        return evicted
+
+
+registry = ModelRegistry()
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import asyncio
+import functools
+import hashlib
+import os
+
+try:
+    import xxhash
+except ImportError:  # optional; blake2b is slower but always there
+    xxhash = None
+
+from metrics import metrics
+
+
+FRAME_CACHE_ENTRIES = int(os.getenv("EMOTICAM_FRAME_CACHE_ENTRIES", "256"))
+
+
+def frame_digest(img_bytes):
+    """
+    Content address of an uploaded image: 128-bit xxh3 when xxhash is
+    installed, blake2b otherwise.
+    """
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(img_bytes)
+    return hashlib.blake2b(img_bytes, digest_size=16).hexdigest()
+
+
+class FrameAnalysisCache:
+    """
+    Per-frame analysis results keyed by (frame digest, pipeline variant),
+    least recently used dropped beyond `max_entries`.
+
+    Identical frames that arrive together (one capture posted to several
+    endpoints) share a single in-flight computation instead of each
+    starting one. Only successful results are kept. Lives on the event
+    loop; cached results are shared between requests and must be treated
+    as read-only.
+    """
+
+    def __init__(self, max_entries=FRAME_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._inflight = {}
+
+    async def get_or_compute(self, key, compute, cacheable=lambda result: True):
+        """
+        The cached result for `key`, else the result of awaiting `compute()`;
+        stored only if `cacheable(result)`.
+        """
+        if key in self._results:
+            self._results.move_to_end(key)
+            metrics.incr("frame_cache.hit")
+            return self._results[key]
+        task = self._inflight.get(key)
+        if task is None:
+            metrics.incr("frame_cache.miss")
+            # A task of its own, so one caller going away does not cancel
+            # the work for the others
+            task = self._inflight[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(functools.partial(self._finished, key, cacheable))
+        else:
+            metrics.incr("frame_cache.joined")
+        return await asyncio.shield(task)
+
+    def _finished(self, key, cacheable, task):
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if self.max_entries > 0 and cacheable(result):
+            self._results[key] = result
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def __len__(self):
+        return len(self._results)
@@ -0,0 +1,121 @@
+from collections import deque
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+
+# Inference jobs queued or running above which a worker asks to be drained
+MAX_INFERENCE_QUEUE = int(os.getenv("EMOTICAM_MAX_INFERENCE_QUEUE", "8"))
+# Latency objective for inference jobs; weight falls as p95 exceeds it
+P95_SLO_MS = float(os.getenv("EMOTICAM_P95_SLO_MS", "1500"))
+# p95 is taken over inference jobs (queue wait + decode and analysis) of the
+# last this many seconds, so a worker drained for being slow becomes ready
+# again once they age out
+LATENCY_WINDOW_S = float(os.getenv("EMOTICAM_LATENCY_WINDOW_S", "60"))
+# Fewer samples than this in the window are not enough to judge latency
+MIN_LATENCY_SAMPLES = 5
+
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class ServiceHealth:
+    """
+    Liveness/readiness state of one worker.
+
+    Readiness folds model warm-up, inference queue depth, LLM circuit state
+    and the p95 latency of recent inference jobs into a 0-100 routing
+    weight plus a drain flag a local load balancer can act on.
+    """
+
+    def __init__(self, max_queue=MAX_INFERENCE_QUEUE, p95_slo_ms=P95_SLO_MS, latency_window_s=LATENCY_WINDOW_S):
+        self.max_queue = max_queue
+        self.p95_slo_ms = p95_slo_ms
+        self.latency_window_s = latency_window_s
+        self.started = time.time()
+        self.warm_state = WARMING
+        self.warm_error = None
+        self.inference_queue = 0
+        self._lock = threading.Lock()
+        # (monotonic time, latency ms) of recent inference jobs, oldest first
+        self._latencies = deque(maxlen=10000)
+
+    @contextmanager
+    def inference_slot(self):
+        with self._lock:
+            self.inference_queue += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inference_queue -= 1
+
+    def observe_latency(self, ms, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._latencies.append((now, float(ms)))
+
+    def latency_p95(self, now=None):
+        """
+        p95 of the inference latencies seen in the last `latency_window_s`,
+        or None when there are too few to tell.
+        """
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.latency_window_s
+        with self._lock:
+            while self._latencies and self._latencies[0][0] < cutoff:
+                self._latencies.popleft()
+            samples = sorted(ms for _, ms in self._latencies)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def liveness(self):
+        return {"alive": True, "uptime_s": round(time.time() - self.started, 1), "pid": os.getpid()}
+
+    def readiness(self, p95_ms, circuits, llm_queue):
+        reasons = []
+        weight = 100.0
+
+        if self.warm_state != READY:
+            reasons.append(f"models {self.warm_state}")
+            weight = 0.0
+
+        queue = self.inference_queue
+        if queue >= self.max_queue:
+            reasons.append(f"inference queue {queue} >= {self.max_queue}")
+        weight *= max(0.0, 1.0 - queue / self.max_queue)
+
+        if p95_ms is not None and p95_ms > self.p95_slo_ms:
+            reasons.append(f"p95 {p95_ms:.0f}ms over {self.p95_slo_ms:.0f}ms")
+            weight *= self.p95_slo_ms / p95_ms
+
+        open_circuits = [name for name, state in circuits.items() if state == "open"]
+        if circuits and len(open_circuits) == len(circuits):
+            # Still serves rule-based answers, just without LLM refinement
+            reasons.append("all LLM circuits open")
+            weight *= 0.5
+
+        ready = self.warm_state == READY
+        drain = (
+            not ready
+            or queue >= self.max_queue
+            or (p95_ms is not None and p95_ms > 2 * self.p95_slo_ms)
+        )
+        if ready and not drain:
+            weight = max(weight, 1.0)
+
+        return {
+            "ready": ready and not drain,
+            "drain": drain,
+            "weight": int(round(weight)),
+            "reasons": reasons,
+            "models": self.warm_state,
+            "warmError": self.warm_error,
+            "inferenceQueue": queue,
+            "llmQueue": llm_queue,
+            "llmCircuits": circuits,
+            "p95LatencyMs": p95_ms,
+        }
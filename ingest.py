@@ -0,0 +1,133 @@
+import base64
+import binascii
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from metrics import metrics
+
+
+# Hard limits for uploaded frames; anything above is rejected before decode
+MAX_IMAGE_BYTES = int(os.getenv("EMOTICAM_MAX_IMAGE_BYTES", str(8 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("EMOTICAM_MAX_IMAGE_PIXELS", str(40_000_000)))
+# Longest side of the frame handed to the emotion pipeline
+WORKING_SIZE = int(os.getenv("EMOTICAM_WORKING_SIZE", "640"))
+
+# Upload formats decoded at all; anything else is refused from its header
+ACCEPTED_FORMATS = tuple(
+    f.strip().upper() for f in os.getenv("EMOTICAM_IMAGE_FORMATS", "JPEG,PNG,WEBP").split(",") if f.strip()
+)
+# Modes that resize correctly as they are, so conversion can wait until the
+# frame is at working size (palette and 1-bit images must convert first)
+RESIZABLE_MODES = ("L", "LA", "RGB", "RGBA")
+
+# Belt and braces: PIL refuses decompression bombs above this on its own
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class ImageRejected(ValueError):
+    """
+    Upload refused by ingestion; `status_code` is the HTTP status to answer with.
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def decode_base64(image_data, max_bytes=MAX_IMAGE_BYTES):
+    if not image_data:
+        raise ImageRejected("No image data provided")
+    if "," in image_data:
+        image_data = image_data.split(",", 1)[1]
+    # Check the decoded size from the base64 length before decoding anything
+    if len(image_data) * 3 // 4 > max_bytes:
+        raise ImageRejected(f"Image exceeds {max_bytes} bytes", status_code=413)
+    try:
+        return base64.b64decode(image_data, validate=False)
+    except (binascii.Error, ValueError):
+        raise ImageRejected("Invalid base64 image data")
+
+
+def _target_size(width, height, working_size):
+    scale = min(1.0, working_size / max(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _to_mode(image, mode):
+    if image.mode in ("LA", "RGBA"):
+        # Transparent areas (canvas PNG/WebP exports) become white, not black
+        background = Image.new(image.mode[:-1], image.size, 255 if image.mode == "LA" else (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    return image if image.mode == mode else image.convert(mode)
+
+
+def ingest_image(img_bytes, working_size=WORKING_SIZE, max_pixels=MAX_IMAGE_PIXELS, mode="RGB"):
+    """
+    Bounded decode of an encoded image into a working-resolution array.
+
+    Only the header is read before the size check. JPEGs are then decoded at
+    a reduced DCT scale (draft mode) so a large photo is never fully
+    materialized, and any remaining downscale happens before conversion.
+    Returns (read-only array, stats) where stats holds the source size and
+    est_peak_bytes, an estimate (from the image sizes, not measured) of the
+    peak bytes held by this request.
+    """
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(img_bytes))  # lazy: parses the header only
+    except Exception:
+        raise ImageRejected("Unrecognized image format")
+
+    if image.format not in ACCEPTED_FORMATS:
+        raise ImageRejected(f"Unsupported image format {image.format}", status_code=415)
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageRejected(f"Image has {width * height} pixels, limit is {max_pixels}", status_code=413)
+
+    target = _target_size(width, height, working_size)
+    try:
+        # JPEG: decode straight at 1/2, 1/4 or 1/8 scale when that is enough,
+        # and with mode="L" decode only the luminance channel
+        image.draft(mode, target)
+        if image.mode not in RESIZABLE_MODES:
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        decoded_size, decoded_bands = image.size, len(image.getbands())
+        # PNG/WebP have no reduced-scale decode; shrink first so the color
+        # conversion below runs on the small frame
+        if image.size != target:
+            image = image.resize(target, Image.BILINEAR, reducing_gap=2.0)
+        image = _to_mode(image, mode)
+    except Exception as e:
+        raise ImageRejected(f"Could not decode image: {e}")
+
+    # The one copy out of PIL; the array is read-only and never copied again
+    frame = np.asarray(image)
+
+    # Not measured: computed from the sizes involved, assuming the encoded
+    # bytes, the draft-scale decode, the resized image and the frame array
+    # are all alive at once
+    bands = len(image.getbands())
+    peak = (
+        len(img_bytes)
+        + decoded_bands * decoded_size[0] * decoded_size[1]
+        + 2 * bands * image.size[0] * image.size[1]
+    )
+    stats = {
+        "source_size": (width, height),
+        "size": image.size,
+        "est_peak_bytes": peak,
+        "decode_ms": (time.perf_counter() - started) * 1000,
+    }
+    metrics.observe("ingest.est_peak_bytes", peak)
+    metrics.observe("ingest.decode_ms", stats["decode_ms"])
+    return frame, stats
+
+
+def ingest_base64(image_data, **kwargs):
+    img_bytes = decode_base64(image_data)
+    return ingest_image(img_bytes, **kwargs)
@@ -0,0 +1,235 @@
+from typing import List
+import json
+import re
+
+from pydantic import BaseModel, Field, ValidationError
+
+
+# Typed shape of the analysis that /api/emotion asks the LLM for.
+# Leaf fields default to empty values so a truncated answer that lost its
+# last few keys still validates; the top-level sections the UI cannot do
+# without (childAnalysis, contentStrategy, queryRanking) stay required.
+
+class ChildAnalysis(BaseModel):
+    ageEstimate: str = ""
+    primaryEmotion: str = ""
+    energyLevel: str = ""
+    developmentalStage: str = ""
+    moodIndicators: str = ""
+
+
+class ContentStrategy(BaseModel):
+    emotionalNeed: str = ""
+    learningOpportunity: str = ""
+    energyMatch: str = ""
+    attentionSpan: str = ""
+
+
+class RankedQuery(BaseModel):
+    query: str
+    score: float = 0
+    reasoning: str = ""
+
+
+class QueryRanking(BaseModel):
+    bestMatch: str = ""
+    reason: str = ""
+    rankedQueries: List[RankedQuery] = Field(default_factory=list)
+
+
+class ParentalGuidance(BaseModel):
+    suggestedDuration: str = ""
+    supervisionLevel: str = ""
+    coViewingOpportunities: str = ""
+    discussionPoints: str = ""
+    followUpActivities: str = ""
+
+
+class DevelopmentalBenefits(BaseModel):
+    emotionalDevelopment: str = ""
+    cognitiveSkills: str = ""
+    socialSkills: str = ""
+    creativeExpression: str = ""
+
+
+class EmotionAnalysis(BaseModel):
+    childAnalysis: ChildAnalysis
+    contentStrategy: ContentStrategy
+    youtubeKidsQueries: List[str] = Field(default_factory=list)
+    googleSafeQueries: List[str] = Field(default_factory=list)
+    queryRanking: QueryRanking
+    parentalGuidance: ParentalGuidance = Field(default_factory=ParentalGuidance)
+    developmentalBenefits: DevelopmentalBenefits = Field(default_factory=DevelopmentalBenefits)
+    safetyAssurance: List[str] = Field(default_factory=list)
+
+
+class AnalysisParseError(ValueError):
+    pass
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+
+
+def _closes_single_quote(text, i):
+    """
+    Whether the ' at text[i] ends a single-quoted string rather than being an
+    apostrophe inside it: only if what follows can come after a JSON value.
+    """
+    for ch in text[i + 1:]:
+        if ch not in " \t\r\n":
+            return ch in ",:}]"
+    return True
+
+
+def _scan(text):
+    """
+    Walk the text from its first '{' and rewrite it into strict JSON.
+
+    Single-quoted strings become double-quoted, raw newlines inside strings are
+    escaped, trailing commas are dropped and anything after the closing brace is
+    ignored. Returns (json_text, complete, dangling, cut_points): `dangling`
+    is true when the text ends inside a string, and cut_points are
+    (offset, open_stack) pairs recorded after every complete element (at each
+    comma and each nested closing bracket), used to salvage truncated answers.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise AnalysisParseError("No JSON object in model response")
+
+    out = []
+    stack = []
+    cuts = []
+    in_str = False
+    quote = None
+    escape = False
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escape:
+                escape = False
+                if ch == "'":
+                    out[-1] = "'"  # \' is not a valid JSON escape
+                    continue
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == quote and (quote == '"' or _closes_single_quote(text, i)):
+                in_str = False
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')  # bare double quote inside a single-quoted string
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            continue
+
+        if ch in "\"'":
+            in_str = True
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if not stack:
+                break
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                return "".join(out), True, False, cuts
+            cuts.append((len(out), tuple(stack)))
+        elif ch == ",":
+            cuts.append((len(out), tuple(stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    return "".join(out), False, in_str, cuts
+
+
+def _close(prefix, stack):
+    prefix = prefix.rstrip().rstrip(",").rstrip()
+    return prefix + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def repair_json(text):
+    """
+    Best-effort conversion of an LLM answer into a parsed JSON object.
+
+    Handles code fences, leading/trailing chatter, single quotes, trailing
+    commas and answers cut off mid-array or mid-object (the incomplete tail is
+    dropped back to the last complete element).
+    """
+    text = _FENCE_RE.sub("", text or "").strip()
+    fixed, complete, dangling, cuts = _scan(text)
+
+    try:
+        return json.loads(fixed)
+    except json.JSONDecodeError:
+        if complete:
+            raise AnalysisParseError("Malformed JSON in model response")
+
+    # Truncated: close every open container at successively earlier element
+    # boundaries until something parses. The very end only counts when it
+    # finishes a string or container; a cut-off string, number or literal
+    # would otherwise come back as if it were the real value.
+    candidates = list(reversed(cuts))
+    if not dangling and fixed.rstrip()[-1:] in ('"', "}", "]"):
+        candidates.insert(0, (len(fixed), _open_stack(fixed)))
+    for offset, stack in candidates:
+        try:
+            return json.loads(_close(fixed[:offset], stack))
+        except json.JSONDecodeError:
+            continue
+    raise AnalysisParseError("Could not salvage truncated model response")
+
+
+def _open_stack(fixed):
+    stack = []
+    in_str = False
+    escape = False
+    for ch in fixed:
+        if in_str:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]" and stack:
+            stack.pop()
+    return tuple(stack)
+
+
+def parse_analysis(content):
+    """
+    Parse and validate an LLM analysis answer into an EmotionAnalysis.
+
+    Raises AnalysisParseError when nothing usable can be recovered.
+    """
+    if not content or not content.strip():
+        raise AnalysisParseError("Empty model response")
+
+    data = repair_json(content)
+    if not isinstance(data, dict):
+        raise AnalysisParseError("Model response is not a JSON object")
+
+    try:
+        analysis = EmotionAnalysis.model_validate(data)
+    except ValidationError as e:
+        raise AnalysisParseError(f"Invalid analysis structure: {e}") from e
+
+    ranking = analysis.queryRanking
+    if not ranking.bestMatch and ranking.rankedQueries:
+        best = max(ranking.rankedQueries, key=lambda q: q.score)
+        ranking.bestMatch = best.query
+    return analysis
@@ -0,0 +1,243 @@
+from collections import deque
+import asyncio
+import os
+import time
+
+from metrics import metrics
+from profiling import profiled_call
+from tracing import span
+from llm_scheduler import INTERACTIVE, estimate_tokens, parse_reset, scheduler_from_env
+
+
+DEFAULT_MODELS = "openai/gpt-oss-20b:12,meta-llama/llama-4-maverick-17b-128e-instruct:15"
+
+
+class LLMUnavailable(RuntimeError):
+    pass
+
+
+class ModelRoute:
+    """
+    One model in the failover order, with its own deadline and hedge delay.
+    """
+
+    def __init__(self, name, deadline=12.0, hedge_after=4.0):
+        self.name = name
+        self.deadline = deadline
+        # Used as the hedge delay until enough latency samples exist for a p95
+        self.hedge_after = hedge_after
+
+    def __repr__(self):
+        return f"ModelRoute({self.name!r}, deadline={self.deadline})"
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and lets one trial
+    call through again after `reset_after` seconds (half-open).
+    """
+
+    def __init__(self, failure_threshold=3, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies for one model.
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+def load_routes(spec=None):
+    """
+    Parse "model:deadline,model:deadline" (EMOTICAM_LLM_MODELS) into routes.
+    """
+    spec = spec or os.getenv("EMOTICAM_LLM_MODELS", DEFAULT_MODELS)
+    hedge_after = float(os.getenv("EMOTICAM_LLM_HEDGE_AFTER", "4"))
+    routes = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, deadline = item.rpartition(":")
+        if not name or not deadline.replace(".", "", 1).isdigit():
+            name, deadline = item, "12"
+        routes.append(ModelRoute(name, float(deadline), hedge_after))
+    return routes
+
+
+class LLMRouter:
+    """
+    Sends a chat completion to an ordered list of models.
+
+    The primary model is tried first. If it has not produced a valid answer by
+    its p95 latency, the next model is fired as a hedge and the first valid
+    answer wins; a failure or deadline moves on to the next model immediately.
+    Models that keep failing are skipped by their circuit breaker, and every
+    attempt is admitted by that model's rate-limit scheduler first.
+    """
+
+    def __init__(self, client, routes, failure_threshold=3, reset_after=30.0, scheduler_factory=scheduler_from_env):
+        self.client = client
+        self.routes = list(routes)
+        # Groq rate limits are per model, so each model gets its own buckets
+        self.schedulers = {r.name: scheduler_factory() for r in self.routes}
+        self.breakers = {r.name: CircuitBreaker(failure_threshold, reset_after) for r in self.routes}
+        self.latency = {r.name: LatencyTracker() for r in self.routes}
+
+    def hedge_delay(self, route):
+        p95 = self.latency[route.name].percentile(0.95)
+        delay = p95 if p95 is not None else route.hedge_after
+        return min(delay, route.deadline)
+
+    def circuit_states(self):
+        return {name: breaker.state for name, breaker in self.breakers.items()}
+
+    def queue_depth(self):
+        return sum(scheduler.queue_depth() for scheduler in self.schedulers.values())
+
+    def _call(self, route, messages, params):
+        completions = self.client.chat.completions
+        raw_api = getattr(completions, "with_raw_response", None)
+        if raw_api is None:
+            response, headers = completions.create(
+                model=route.name, messages=messages, timeout=route.deadline, **params
+            ), None
+        else:
+            # Raw response exposes the x-ratelimit-* headers for the scheduler
+            raw = raw_api.create(model=route.name, messages=messages, timeout=route.deadline, **params)
+            response, headers = raw.parse(), raw.headers
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", None)
+        return response.choices[0].message.content or "", headers, used
+
+    async def _attempt(self, route, messages, params, validate, priority):
+        scheduler = self.schedulers[route.name]
+        queued = time.monotonic()
+        with span("llm.queue", model=route.name, priority=priority):
+            reserved = await scheduler.acquire(estimate_tokens(messages, params.get("max_tokens")), priority)
+        started = time.monotonic()
+        metrics.observe("llm.queue_ms", (started - queued) * 1000)
+        try:
+            with span("llm.attempt", model=route.name, deadline=route.deadline) as attempt:
+                content, headers, used = await asyncio.wait_for(
+                    asyncio.to_thread(profiled_call, self._call, route, messages, params),
+                    timeout=route.deadline,
+                )
+                attempt.set(tokens=used)
+            scheduler.settle(reserved, used)
+            scheduler.observe_headers(headers)
+            with span("llm.validate", model=route.name):
+                result = validate(content) if validate else content
+        except asyncio.CancelledError:
+            # Lost the hedge race; not the model's fault
+            self.breakers[route.name].trial_in_flight = False
+            raise
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                # Over quota is a scheduling problem, not a broken model
+                response = getattr(e, "response", None)
+                headers = getattr(response, "headers", None) or {}
+                scheduler.penalize(parse_reset(headers.get("retry-after")))
+                self.breakers[route.name].trial_in_flight = False
+            else:
+                self.breakers[route.name].record_failure()
+            print(f"LLM attempt failed ({route.name}):", repr(e))
+            raise
+        self.breakers[route.name].record_success()
+        self.latency[route.name].add(time.monotonic() - started)
+        metrics.observe("llm.call_ms", (time.monotonic() - started) * 1000)
+        return result
+
+    async def complete(self, messages, validate=None, priority=INTERACTIVE, **params):
+        """
+        Return (result, model_name) for the first valid answer.
+
+        `validate` turns the raw content into the result and raises if the
+        answer is unusable, which counts as a failure of that model.
+        `priority` orders the call in each model's rate-limit queue.
+        """
+        queue = list(self.routes)
+        pending = {}
+
+        def launch():
+            # Breakers are consulted lazily so a half-open trial slot is only
+            # taken by a model that is actually called
+            while queue:
+                route = queue.pop(0)
+                if self.breakers[route.name].allow():
+                    task = asyncio.create_task(self._attempt(route, messages, params, validate, priority))
+                    pending[task] = route
+                    return route
+            return None
+
+        current = launch()
+        if current is None:
+            raise LLMUnavailable("All LLM circuits are open")
+
+        try:
+            while pending:
+                timeout = self.hedge_delay(current) if queue else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Primary is slower than its p95: hedge with the next model
+                    current = launch() or current
+                    continue
+
+                for task in done:
+                    route = pending.pop(task)
+                    if not task.exception():
+                        return task.result(), route.name
+                # A model failed: fail over now rather than waiting for a hedge
+                current = launch() or current
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise LLMUnavailable("No model returned a valid answer")
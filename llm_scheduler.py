@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+import os
+import re
+import time
+
+
+# Request priorities; lower is served first
+INTERACTIVE = 0
+BATCH = 10
+
+# Rough chars-per-token ratio used to estimate prompt size before sending
+CHARS_PER_TOKEN = 4
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset(value):
+    """
+    Parse Groq reset headers ("7.66s", "2m59.56s", "120ms") into seconds.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = _DURATION_RE.findall(value)
+    if not matches:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in matches)
+
+
+def estimate_tokens(messages, max_tokens=0):
+    """
+    Upper-bound token cost of a chat call: prompt estimate plus completion budget.
+    """
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // CHARS_PER_TOKEN + 4 * len(messages) + (max_tokens or 0)
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket of `capacity` units per `period` seconds.
+    """
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, remaining, reset_after=None):
+        """
+        Align with the server's view: never believe we have more than it says.
+        """
+        self._refill()
+        if remaining is not None and remaining < self.level:
+            self.level = float(remaining)
+        if reset_after and self.level <= 0:
+            # Empty until the server's window resets
+            self.level = min(self.level, -reset_after * self.rate)
+
+
+class LLMScheduler:
+    """
+    Admission control for one model's requests-per-minute and
+    tokens-per-minute limits.
+
+    Callers `acquire` an estimated token cost at a priority; waiters are
+    released in priority order (then FIFO) as soon as both buckets cover the
+    head of the queue. After the call, `settle` corrects the estimate with the
+    real usage and `observe_headers` re-syncs with the server's rate-limit
+    headers.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._queue = []
+        self._seq = itertools.count()
+        self._timer = None
+
+    def queue_depth(self):
+        return sum(1 for _, _, _, fut in self._queue if not fut.done())
+
+    async def acquire(self, cost, priority=INTERACTIVE):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), cost, fut))
+        self._pump()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Granted just before the caller gave up: give it back
+                self.requests.refund(1)
+                self.tokens.refund(cost)
+            raise
+        return cost
+
+    def settle(self, reserved, used):
+        if used is None:
+            return
+        if used < reserved:
+            self.tokens.refund(reserved - used)
+        elif used > reserved:
+            self.tokens.consume(used - reserved)
+
+    def observe_headers(self, headers):
+        if not headers:
+            return
+        get = headers.get
+        remaining_tokens = get("x-ratelimit-remaining-tokens")
+        remaining_requests = get("x-ratelimit-remaining-requests")
+        self.tokens.sync(
+            float(remaining_tokens) if remaining_tokens is not None else None,
+            parse_reset(get("x-ratelimit-reset-tokens")),
+        )
+        self.requests.sync(
+            float(remaining_requests) if remaining_requests is not None else None,
+            parse_reset(get("x-ratelimit-reset-requests")),
+        )
+        self._pump()
+
+    def penalize(self, retry_after):
+        """
+        Hard stop after a 429: hold all waiters until `retry_after` passes.
+        """
+        retry_after = retry_after or 1.0
+        self.requests.level = -retry_after * self.requests.rate
+        self.tokens.level = min(self.tokens.level, 0.0)
+        self.requests.updated = self.tokens.updated = time.monotonic()
+        self._pump()
+
+    def _pump(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            _, _, cost, fut = self._queue[0]
+            if fut.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+            if wait > 0:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(wait, self._pump)
+                return
+            heapq.heappop(self._queue)
+            self.requests.consume(1)
+            self.tokens.consume(cost)
+            fut.set_result(None)
+
+
+def scheduler_from_env():
+    """
+    A scheduler for this process's share of the account's limits.
+
+    EMOTICAM_LLM_RPM / EMOTICAM_LLM_TPM are the limits of the API key, which
+    every worker on the node spends; each of the EMOTICAM_WORKERS processes
+    (set by serve.py) gets an equal share, so together they stay under it.
+    """
+    workers = max(1, int(os.getenv("EMOTICAM_WORKERS", "1")))
+    rpm = float(os.getenv("EMOTICAM_LLM_RPM", "30")) / workers
+    tpm = float(os.getenv("EMOTICAM_LLM_TPM", "8000")) / workers
+    return LLMScheduler(rpm, tpm)
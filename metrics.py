@@ -0,0 +1,66 @@
+from collections import defaultdict, deque
+import threading
+
+
+class Metrics:
+    """
+    In-process metrics: counters plus rolling windows of recent samples
+    (latencies, sizes) summarized as count / mean / p50 / p95 / max.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counters = defaultdict(int)
+
+    def observe(self, name, value):
+        with self._lock:
+            self._samples[name].append(float(value))
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def samples(self, name):
+        with self._lock:
+            return list(self._samples.get(name, ()))
+
+    def percentile(self, name, q):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def summary(self, name):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        n = len(samples)
+        return {
+            "count": n,
+            "mean": sum(samples) / n,
+            "p50": samples[n // 2],
+            "p95": samples[min(n - 1, int(0.95 * n))],
+            "max": samples[-1],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            names = list(self._samples)
+            counters = dict(self._counters)
+        return {
+            "counters": counters,
+            "samples": {name: self.summary(name) for name in names},
+        }
+
+
+# Process-wide registry used by the API and its helpers
+metrics = Metrics()
@@ -0,0 +1,96 @@
+import asyncio
+from itertools import combinations
+import os
+import time
+
+from analysis_cache import state_key
+from recommender import EMOTIONS, energy_level, normalize_distribution
+
+
+# Regenerate a state's analysis once it is older than this
+REFRESH_INTERVAL = float(os.getenv("EMOTICAM_PRECOMPUTE_INTERVAL", str(6 * 3600)))
+PRECOMPUTE_ENABLED = os.getenv("EMOTICAM_PRECOMPUTE", "1") != "0"
+
+
+def refresher_runs_here():
+    """
+    Whether this process keeps the shared cache warm. One process per host
+    is enough: worker 0 under serve.py, or a process started on its own.
+    """
+    return PRECOMPUTE_ENABLED and os.getenv("EMOTICAM_WORKER_INDEX", "0") == "0"
+
+
+def canonical_states():
+    """
+    Every reachable (dominant emotion, energy level) state with a
+    representative DeepFace-style distribution for it.
+
+    Of the 21 pairs, 18 are reachable; happy, surprise and angry weigh too
+    much energy to read as Low while they dominate. Representatives are
+    searched by giving the dominant emotion a share from 100% down and
+    splitting the rest evenly over one to three other emotions (each below
+    the dominant one); each state keeps the most dominant mix that lands in
+    it.
+    """
+    states = {}
+    for share in range(100, 14, -2):
+        for dominant in EMOTIONS:
+            others = [e for e in EMOTIONS if e != dominant]
+            for count in (1, 2, 3):
+                rest = (100.0 - share) / count
+                if rest >= share:
+                    continue
+                for group in combinations(others, count):
+                    emotion = {dominant: float(share)}
+                    emotion.update((other, rest) for other in group if rest > 0)
+                    energy = energy_level(normalize_distribution(emotion))
+                    states.setdefault((dominant, energy), emotion)
+    return states
+
+
+class AnalysisRefresher:
+    """
+    Keeps an LLM analysis in the cache for every canonical emotion state.
+
+    `generate(emotion, key)` produces and stores one analysis (at batch
+    priority, so it queues behind live traffic); `created(key)` returns the
+    newest cached entry's creation time. Both are coroutines. A pass regenerates states that are
+    missing or older than `interval`, one at a time, and stops early when
+    the LLM is unavailable. Only one process per host runs it (see
+    `refresher_runs_here`); the others read its entries from the shared cache.
+    """
+
+    def __init__(self, generate, created, interval=REFRESH_INTERVAL):
+        self.generate = generate
+        self.created = created
+        self.interval = interval
+        self.states = canonical_states()
+        self.last_pass = None
+
+    async def stale_states(self, now=None):
+        now = time.time() if now is None else now
+        stale = []
+        for (dominant, energy), emotion in self.states.items():
+            key = state_key(dominant, energy)
+            created = await self.created(key)
+            if created is None or now - created > self.interval:
+                stale.append((key, emotion))
+        return stale
+
+    async def refresh_once(self):
+        generated = 0
+        for key, emotion in await self.stale_states():
+            try:
+                await self.generate(emotion, key)
+                generated += 1
+            except Exception as e:
+                print(f"Precompute stopped at {key}:", e)
+                break
+        self.last_pass = {"time": time.time(), "generated": generated, "states": len(self.states)}
+        return generated
+
+    async def run(self):
+        while True:
+            await self.refresh_once()
+            # Re-check often enough that a failed pass is retried soon
+            await asyncio.sleep(min(self.interval, 600))
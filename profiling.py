@@ -0,0 +1,187 @@
+from contextvars import ContextVar
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+
+
+PROFILE_DIR = os.getenv("EMOTICAM_PROFILE_DIR", "profiles")
+# Fraction of requests profiled without being asked (0 = only on demand)
+PROFILE_SAMPLE = float(os.getenv("EMOTICAM_PROFILE_SAMPLE", "0"))
+# Shared secret for the x-profile header and the profile download endpoints;
+# on-demand profiling is disabled while it is unset
+ADMIN_TOKEN = os.getenv("EMOTICAM_ADMIN_TOKEN", "")
+MAX_PROFILES = int(os.getenv("EMOTICAM_MAX_PROFILES", "50"))
+
+_PROFILE_ID_CHARS = set("0123456789abcdef")
+
+# The profile of the request this context belongs to, if it is profiled
+_active = ContextVar("emoticam_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Profiles of one request: the event loop thread's plus one per blocking
+    job it handed to a worker thread.
+    """
+
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self.threads = []
+        self.closed = False
+        self._token = None
+
+
+def profiled_call(fn, *args):
+    """
+    Call fn(*args) in the current (worker) thread, adding its calls to the
+    profile of the request that submitted it, if that request is profiled.
+
+    Before Python 3.12 cProfile only sees the thread that enabled it, so
+    inference and LLM calls on worker threads need a profile of their own.
+    From 3.12 on, the request's profile already covers every thread and
+    enabling a second one fails; the call then just runs.
+    """
+    active = _active.get()
+    if active is None or active.closed:
+        return fn(*args)
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return fn(*args)
+    try:
+        return fn(*args)
+    finally:
+        profile.disable()
+        if not active.closed:
+            active.threads.append(profile)
+
+
+class RequestProfiler:
+    """
+    Opt-in cProfile capture of individual requests.
+
+    Only one request is profiled at a time; others run unprofiled. The
+    event loop thread is profiled for the whole request, and blocking work
+    the request sends to worker threads through `profiled_call` (decode and
+    inference, LLM calls) is profiled there and merged into the same dump.
+    While a profile is active, other coroutines sharing the event loop show
+    up in it too (on Python 3.12+, where cProfile covers all threads, so do
+    other requests' threads), so profiles are most telling on a quiet worker
+    or with the on-demand header.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE, admin_token=ADMIN_TOKEN, max_profiles=MAX_PROFILES):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.max_profiles = max_profiles
+        self._busy = threading.Lock()
+
+    def is_admin(self, token):
+        # Bytes: compare_digest refuses non-ASCII str, which a header can hold
+        return bool(self.admin_token) and hmac.compare_digest(
+            str(token).encode("utf-8"), self.admin_token.encode("utf-8")
+        )
+
+    def wanted(self, header_token):
+        if header_token is not None and self.is_admin(header_token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """
+        Start profiling the current request; returns its RequestProfile, or
+        None if another profile is active. Work submitted from this context
+        afterwards (tasks, executor jobs copying the context) belongs to it.
+        """
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = RequestProfile()
+        try:
+            profile.main.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) owns the hook
+            self._busy.release()
+            return None
+        profile._token = _active.set(profile)
+        return profile
+
+    def stop(self, profile, request_id, label):
+        try:
+            profile.main.disable()
+            # Background work the request started (refinements) keeps its
+            # context; it must not add to a profile that is already written
+            profile.closed = True
+            _active.reset(profile._token)
+        finally:
+            self._busy.release()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{request_id}.prof")
+        stats = pstats.Stats(profile.main)
+        for thread_profile in list(profile.threads):
+            stats.add(thread_profile)
+        stats.dump_stats(path)
+        with open(os.path.join(self.directory, f"{request_id}.txt"), "w") as f:
+            f.write(f"{time.strftime('%Y-%m-%dT%H:%M:%S')} {label}\n")
+        self._prune()
+        return path
+
+    def _prune(self):
+        profiles = self.list()
+        for entry in profiles[self.max_profiles:]:
+            for suffix in (".prof", ".txt"):
+                try:
+                    os.remove(os.path.join(self.directory, entry["id"] + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """
+        Saved profiles, newest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".prof"):
+                continue
+            profile_id = name[:-len(".prof")]
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            label_path = os.path.join(self.directory, profile_id + ".txt")
+            label = ""
+            if os.path.exists(label_path):
+                with open(label_path) as f:
+                    label = f.read().strip()
+            entries.append({"id": profile_id, "request": label, "created": stat.st_mtime, "bytes": stat.st_size})
+        entries.sort(key=lambda e: e["created"], reverse=True)
+        return entries
+
+    def path_for(self, profile_id):
+        # Ids are generated hex strings; anything else could escape the directory
+        if not profile_id or not set(profile_id) <= _PROFILE_ID_CHARS:
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.prof")
+        return path if os.path.exists(path) else None
+
+    def summary(self, profile_id, limit=40, sort="cumulative"):
+        path = self.path_for(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+profiler = RequestProfiler()
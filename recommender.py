@@ -0,0 +1,220 @@
+from itertools import product
+
+
+# Deterministic, LLM-free recommendations from a DeepFace emotion distribution.
+# Every (dominant emotion, energy level) combination is expanded into a full
+# analysis at import time, so a lookup is a dict access.
+
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+ENERGY_LEVELS = ["Low", "Medium", "High"]
+
+# How much each emotion contributes to perceived energy (0..1)
+ENERGY_WEIGHTS = {
+    "angry": 0.8,
+    "disgust": 0.3,
+    "fear": 0.5,
+    "happy": 1.0,
+    "sad": 0.1,
+    "surprise": 1.0,
+    "neutral": 0.4,
+}
+LOW_ENERGY_BELOW = 35.0
+HIGH_ENERGY_FROM = 60.0
+
+PRIMARY_EMOTION_LABELS = {
+    "angry": "Frustrated/Upset",
+    "disgust": "Uncomfortable/Displeased",
+    "fear": "Worried/Anxious",
+    "happy": "Happy/Excited",
+    "sad": "Sad/Upset",
+    "surprise": "Surprised/Amazed",
+    "neutral": "Calm/Content",
+}
+
+# (query, base score, energy the query suits, reasoning)
+QUERY_TABLE = {
+    "angry": [
+        ("calming songs for kids", 90, "Low", "Soothing music helps release frustration"),
+        ("kids yoga breathing exercises", 88, "Medium", "Guided breathing redirects strong feelings"),
+        ("feelings stories for children", 82, "Low", "Names and normalizes big emotions"),
+        ("kids dance freeze game", 72, "High", "Burns off energy in a structured way"),
+        ("slow animated nature videos kids", 70, "Low", "Gentle visuals lower arousal"),
+    ],
+    "disgust": [
+        ("funny animal videos for kids", 86, "Medium", "Light humor shifts the mood"),
+        ("kids cooking simple recipes", 80, "Medium", "Turns unfamiliar things into curiosity"),
+        ("gentle cartoons children safe", 78, "Low", "Low-stimulation comfort viewing"),
+        ("kids science experiments easy", 76, "High", "Channels reaction into exploration"),
+        ("sing along songs preschool", 72, "High", "Upbeat reset of attention"),
+    ],
+    "fear": [
+        ("comforting bedtime stories kids", 92, "Low", "Reassuring narration builds safety"),
+        ("brave little characters cartoon", 86, "Medium", "Models courage in a safe story"),
+        ("kids breathing exercises calm", 84, "Low", "Teaches a tool for anxious moments"),
+        ("gentle lullabies for children", 80, "Low", "Slows heart rate and settles"),
+        ("friendly animals videos kids", 74, "Medium", "Warm, predictable content"),
+    ],
+    "happy": [
+        ("kids dance movement videos", 92, "High", "Matches a playful, energetic mood"),
+        ("educational songs children safe", 90, "Medium", "Turns good mood into learning"),
+        ("simple crafts activities children", 80, "Medium", "Creative outlet for enthusiasm"),
+        ("storytelling videos kids animated", 74, "Low", "Good wind-down while still engaged"),
+        ("counting colors shapes kids", 78, "Medium", "Core preschool concepts with fun"),
+    ],
+    "sad": [
+        ("feelings stories for children", 90, "Low", "Helps understand and talk about sadness"),
+        ("gentle cartoons friendship kids", 86, "Low", "Warm characters offer comfort"),
+        ("happy songs for kids sing along", 80, "Medium", "Gently lifts the mood"),
+        ("kids drawing tutorial easy", 76, "Medium", "Expressive, calming activity"),
+        ("funny animal videos for kids", 72, "Medium", "Light humor without overstimulation"),
+    ],
+    "surprise": [
+        ("kids science experiments easy", 92, "High", "Feeds curiosity with wonder"),
+        ("amazing animal facts for kids", 88, "Medium", "Channels amazement into learning"),
+        ("magic tricks for kids simple", 80, "High", "Keeps the sense of surprise going"),
+        ("space videos for children", 82, "Medium", "Big wonders explained simply"),
+        ("nature documentary kids short", 74, "Low", "Calmer follow-up for curiosity"),
+    ],
+    "neutral": [
+        ("educational videos preschool kids", 90, "Medium", "Balanced learning for a calm state"),
+        ("counting colors shapes kids", 85, "Medium", "Core concepts while attentive"),
+        ("storytelling videos kids animated", 82, "Low", "Fits a relaxed attention span"),
+        ("kids crafts activities simple", 78, "Medium", "Gentle creative engagement"),
+        ("kids dance movement videos", 70, "High", "Adds activity if attention drifts"),
+    ],
+}
+
+CONTENT_STRATEGY = {
+    "angry": ("Calm down and regulate strong feelings", "Emotional vocabulary and self-regulation"),
+    "disgust": ("Reset the mood with light, safe content", "Curiosity about new things"),
+    "fear": ("Reassurance and a sense of safety", "Coping skills and courage"),
+    "happy": ("Engaging and fun activities to match current state", "Creative expression and interactive learning"),
+    "sad": ("Comfort and gentle mood lifting", "Understanding and expressing feelings"),
+    "surprise": ("Channel curiosity into discovery", "Science, nature and cause-and-effect"),
+    "neutral": ("Educational and entertaining content", "Interactive learning and creative expression"),
+}
+
+ENERGY_PROFILE = {
+    "Low": ("Calm, slow-paced content", "Short format (5-10 minutes)", "10-15 minutes"),
+    "Medium": ("Moderate activity level content", "Short to medium format (10-15 minutes)", "15-20 minutes"),
+    "High": ("Active content with movement and interaction", "Short to medium format (5-15 minutes)", "15-20 minutes"),
+}
+
+GOOGLE_SAFE_QUERIES = [
+    "kid-friendly educational videos 4-6 years",
+    "safe learning activities preschool children",
+    "age-appropriate entertainment kids",
+    "supervised children content educational",
+    "family-friendly kids videos learning",
+]
+
+SAFETY_ASSURANCE = [
+    "Age-appropriate content only",
+    "No inappropriate themes or language",
+    "Educational value included",
+    "Positive role models featured",
+    "Parent supervision recommended",
+    "Safe platform recommendations",
+]
+
+_ENERGY_RANK = {level: i for i, level in enumerate(ENERGY_LEVELS)}
+
+
+def normalize_distribution(emotion):
+    """
+    Map a DeepFace emotion dict to percentages over EMOTIONS (missing = 0).
+    """
+    values = {e: float(emotion.get(e, 0.0)) for e in EMOTIONS}
+    total = sum(values.values())
+    if total <= 0:
+        return {e: (100.0 if e == "neutral" else 0.0) for e in EMOTIONS}
+    return {e: v * 100.0 / total for e, v in values.items()}
+
+
+def energy_score(distribution):
+    return sum(distribution[e] * ENERGY_WEIGHTS[e] for e in EMOTIONS)
+
+
+def energy_level(distribution):
+    score = energy_score(distribution)
+    if score < LOW_ENERGY_BELOW:
+        return "Low"
+    if score >= HIGH_ENERGY_FROM:
+        return "High"
+    return "Medium"
+
+
+def _rank_queries(emotion, energy):
+    ranked = []
+    for query, base, suits, reasoning in QUERY_TABLE[emotion]:
+        # Queries suited to the current energy gain, opposite ones lose
+        distance = abs(_ENERGY_RANK[suits] - _ENERGY_RANK[energy])
+        score = max(0, min(100, base + 8 - 8 * distance))
+        ranked.append({"query": query, "score": score, "reasoning": reasoning})
+    ranked.sort(key=lambda q: q["score"], reverse=True)
+    return ranked
+
+
+def _build_analysis(emotion, energy):
+    ranked = _rank_queries(emotion, energy)
+    need, opportunity = CONTENT_STRATEGY[emotion]
+    energy_match, attention_span, duration = ENERGY_PROFILE[energy]
+    return {
+        "childAnalysis": {
+            "ageEstimate": "4-6 years",
+            "primaryEmotion": PRIMARY_EMOTION_LABELS[emotion],
+            "energyLevel": energy,
+            "developmentalStage": "Preschool",
+            "moodIndicators": f"Facial expression reads mostly {emotion}",
+        },
+        "contentStrategy": {
+            "emotionalNeed": need,
+            "learningOpportunity": opportunity,
+            "energyMatch": energy_match,
+            "attentionSpan": attention_span,
+        },
+        "youtubeKidsQueries": [q["query"] for q in ranked],
+        "googleSafeQueries": list(GOOGLE_SAFE_QUERIES),
+        "queryRanking": {
+            "bestMatch": ranked[0]["query"],
+            "reason": f"Best fit for a {PRIMARY_EMOTION_LABELS[emotion].lower()} child with {energy.lower()} energy",
+            "rankedQueries": ranked,
+        },
+        "parentalGuidance": {
+            "suggestedDuration": duration,
+            "supervisionLevel": "Guided supervision recommended",
+            "coViewingOpportunities": "Watch together and talk about what happens",
+            "discussionPoints": "Talk about feelings, characters and what was learned",
+            "followUpActivities": "Real-world play that continues the video's theme",
+        },
+        "developmentalBenefits": {
+            "emotionalDevelopment": "Supports emotional recognition and healthy expression",
+            "cognitiveSkills": "Enhances learning through visual and auditory stimulation",
+            "socialSkills": "Encourages interaction, sharing, and social development",
+            "creativeExpression": "Promotes imagination, creativity, and artistic expression",
+        },
+        "safetyAssurance": list(SAFETY_ASSURANCE),
+    }
+
+
+# Precomputed analyses; treat as read-only
+RECOMMENDATIONS = {
+    (emotion, energy): _build_analysis(emotion, energy)
+    for emotion, energy in product(EMOTIONS, ENERGY_LEVELS)
+}
+
+
+def recommend(emotion, dominant=None):
+    """
+    Instant analysis for a DeepFace emotion dict ({"happy": 87.1, ...}).
+
+    `dominant` overrides the distribution's top emotion, for callers that
+    hold a stable state apart from it (the smoothed session state).
+    Returns (analysis, dominant_emotion, energy_level). The analysis dict is
+    shared between calls and must not be mutated.
+    """
+    distribution = normalize_distribution(emotion)
+    if dominant is None:
+        dominant = max(distribution, key=distribution.get)
+    energy = energy_level(distribution)
+    return RECOMMENDATIONS[(dominant, energy)], dominant, energy
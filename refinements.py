@@ -0,0 +1,110 @@
+import time
+import uuid
+
+import orjson
+
+from sqlite_store import SQLiteStore, state_path_from_env
+
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refinements (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    analysis BLOB,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refinements_created ON refinements (created);
+"""
+
+
+class RefinementStore(SQLiteStore):
+    """
+    Handles for LLM analyses that finish after the response was sent.
+
+    The status lives in a SQLite database shared by every worker, so a
+    refinement started on one worker can be fetched from any other. The
+    task computing it stays referenced in the worker that runs it until it
+    finishes.
+
+    Only finished entries are evicted: past `ttl_seconds`, or oldest first
+    beyond `max_entries`. An entry still pending after `ttl_seconds` belongs
+    to a worker that died mid-call and is marked failed.
+    """
+
+    def __init__(self, path, max_entries=1000, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.check_every = max(1, max_entries // 50)
+        self._creates = 0
+        # refinement id -> running task, so it is not garbage collected
+        self._tasks = {}
+        super().__init__(path, SCHEMA)
+
+    async def create(self):
+        refinement_id = uuid.uuid4().hex
+        self._creates += 1
+        evict = self._creates >= self.check_every
+        if evict:
+            self._creates = 0
+        await self._run(self._create, refinement_id, evict)
+        return refinement_id
+
+    def attach_task(self, refinement_id, task):
+        self._tasks[refinement_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(refinement_id, None))
+
+    async def resolve(self, refinement_id, analysis):
+        await self._run(self._finish, refinement_id, READY, orjson.dumps(analysis))
+
+    async def fail(self, refinement_id):
+        await self._run(self._finish, refinement_id, FAILED, None)
+
+    async def get(self, refinement_id):
+        return await self._run(self._get, refinement_id)
+
+    def _create(self, refinement_id, evict):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO refinements (id, status, created) VALUES (?, ?, ?)",
+            (refinement_id, PENDING, time.time()),
+        )
+        if evict:
+            self._evict(conn)
+
+    def _finish(self, refinement_id, status, analysis):
+        self._conn().execute(
+            "UPDATE refinements SET status = ?, analysis = ? WHERE id = ? AND status = ?",
+            (status, analysis, refinement_id, PENDING),
+        )
+
+    def _get(self, refinement_id):
+        row = self._conn().execute(
+            "SELECT status, analysis, created FROM refinements WHERE id = ?", (refinement_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, analysis, created = row
+        if status == PENDING and time.time() - created > self.ttl_seconds:
+            status = FAILED
+        return {"status": status, "analysis": orjson.loads(analysis) if analysis is not None else None}
+
+    def _evict(self, conn):
+        cutoff = time.time() - self.ttl_seconds
+        conn.execute("UPDATE refinements SET status = ? WHERE status = ? AND created < ?", (FAILED, PENDING, cutoff))
+        conn.execute("DELETE FROM refinements WHERE status != ? AND created < ?", (PENDING, cutoff))
+        finished = conn.execute("SELECT COUNT(*) FROM refinements WHERE status != ?", (PENDING,)).fetchone()[0]
+        excess = finished - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM refinements WHERE id IN "
+                "(SELECT id FROM refinements WHERE status != ? ORDER BY created LIMIT ?)",
+                (PENDING, excess),
+            )
+
+
+def store_from_env():
+    return RefinementStore(state_path_from_env())
@@ -0,0 +1,190 @@
+"""
+Per-worker CPU thread topology for the inference runtimes.
+
+TensorFlow (DeepFace), torch and OpenCV each size their thread pools to the
+whole machine by default, so N workers on one box oversubscribe the cores N
+times over. `configure_env` must run before those libraries are imported (the
+OpenMP/MKL/TF pools read their environment at import); `apply` then sets the
+runtime knobs that only exist after import and optionally pins the process.
+
+Under the pre-fork launcher (serve.py) the master computes the topology once,
+from the whole CPU set, and only exports the thread counts; each forked
+worker then pins itself to its own slice and applies the runtime knobs
+(`configure_worker`).
+
+Settings (environment):
+    EMOTICAM_WORKERS            workers sharing this host (default 1)
+    EMOTICAM_WORKER_INDEX       this worker's index, set by the launcher
+    EMOTICAM_INTRA_OP_THREADS   threads inside one op (default cores / workers)
+    EMOTICAM_INTER_OP_THREADS   ops run concurrently (default 1)
+    EMOTICAM_CV2_THREADS        OpenCV threads (default = intra-op threads)
+    EMOTICAM_CPU_AFFINITY       "auto" (one core slice per worker), an explicit
+                                list like "0-3,8", or empty for no pinning
+"""
+import os
+
+
+def _available_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        return list(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(spec):
+    cpus = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+class Topology:
+    def __init__(self, workers=1, worker_index=0, intra_op=None, inter_op=1, cv2_threads=None, affinity="", cpus=None):
+        # The CPUs shared by all workers; a pinned process only sees its own
+        # slice, so workers take this from the master rather than re-reading it
+        self.cpus = list(cpus) if cpus is not None else _available_cpus()
+        self.workers = max(1, workers)
+        self.worker_index = worker_index
+        self.intra_op = intra_op or max(1, len(self.cpus) // self.workers)
+        self.inter_op = max(1, inter_op)
+        self.cv2_threads = cv2_threads if cv2_threads is not None else self.intra_op
+        self.affinity_spec = affinity
+        self.affinity = self._resolve_affinity(affinity, self.cpus)
+
+    def for_worker(self, worker_index):
+        """
+        The same topology as seen by worker `worker_index`.
+        """
+        return Topology(
+            workers=self.workers,
+            worker_index=worker_index,
+            intra_op=self.intra_op,
+            inter_op=self.inter_op,
+            cv2_threads=self.cv2_threads,
+            affinity=self.affinity_spec,
+            cpus=self.cpus,
+        )
+
+    def _resolve_affinity(self, spec, cpus):
+        if not spec:
+            return None
+        if spec == "auto":
+            # Contiguous slice of cores per worker; wraps if workers > slices
+            per_worker = max(1, len(cpus) // self.workers)
+            start = (self.worker_index * per_worker) % len(cpus)
+            return cpus[start:start + per_worker] or cpus
+        return parse_cpu_list(spec)
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ.get
+        return cls(
+            workers=int(env("EMOTICAM_WORKERS", "1")),
+            worker_index=int(env("EMOTICAM_WORKER_INDEX", "0")),
+            intra_op=int(env("EMOTICAM_INTRA_OP_THREADS", "0")) or None,
+            inter_op=int(env("EMOTICAM_INTER_OP_THREADS", "1")),
+            cv2_threads=int(env["EMOTICAM_CV2_THREADS"]) if env("EMOTICAM_CV2_THREADS") else None,
+            affinity=env("EMOTICAM_CPU_AFFINITY", ""),
+        )
+
+    def as_dict(self):
+        return {
+            "workers": self.workers,
+            "worker_index": self.worker_index,
+            "intra_op": self.intra_op,
+            "inter_op": self.inter_op,
+            "cv2_threads": self.cv2_threads,
+            "affinity": self.affinity,
+        }
+
+
+_topology = None
+# True in a pre-fork master: pinning and runtime knobs are left to the workers
+_deferred = False
+
+
+def configure_env(topology=None, defer=False):
+    """
+    Export thread-count variables read by OpenMP, MKL, OpenBLAS and TF at
+    import time. Call before importing numpy/cv2/torch/tensorflow.
+
+    Once configured, later calls without a topology keep the existing one. A
+    pre-fork master passes defer=True: the thread counts (the same for every
+    worker) are exported, but the master is not pinned and `apply` does
+    nothing until `configure_worker` runs in each worker.
+    """
+    global _topology, _deferred
+    if topology is None and _topology is not None:
+        return _topology
+    _topology = topology or Topology.from_env()
+    _deferred = defer
+    intra = str(_topology.intra_op)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+        os.environ[var] = intra
+    os.environ["TF_NUM_INTEROP_THREADS"] = str(_topology.inter_op)
+    if _topology.affinity and not defer:
+        os.sched_setaffinity(0, _topology.affinity)
+    return _topology
+
+
+def configure_worker(worker_index):
+    """
+    In a forked worker: take this worker's share of the master's topology,
+    pin the process to its CPU slice and set the runtime thread knobs.
+    """
+    global _topology, _deferred
+    os.environ["EMOTICAM_WORKER_INDEX"] = str(worker_index)
+    _topology = (_topology or Topology.from_env()).for_worker(worker_index)
+    _deferred = False
+    if _topology.affinity:
+        os.sched_setaffinity(0, _topology.affinity)
+    return apply()
+
+
+def apply():
+    """
+    Set runtime thread knobs on whichever of torch, TensorFlow and OpenCV are
+    importable. Safe to call more than once; a no-op in a pre-fork master.
+    """
+    topology = _topology or configure_env()
+    if _deferred:
+        return topology
+
+    try:
+        import torch
+        torch.set_num_threads(topology.intra_op)
+        try:
+            torch.set_num_interop_threads(topology.inter_op)
+        except RuntimeError:
+            pass  # only settable before the first parallel torch op
+    except ImportError:
+        pass
+
+    try:
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(topology.intra_op)
+            tf.config.threading.set_inter_op_parallelism_threads(topology.inter_op)
+        except RuntimeError:
+            pass  # TF already initialized; the env vars from configure_env apply
+    except ImportError:
+        pass
+
+    try:
+        import cv2
+        cv2.setNumThreads(topology.cv2_threads)
+    except ImportError:
+        pass
+
+    return topology
+
+
+def current():
+    return _topology
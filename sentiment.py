@@ -13,4 +13,23 @@ import torch
 def get_preprocess_and_model():
     processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
     model = BlipForImageCaptioning.from_pretrained("Salesforce/blip-image-captioning-base")
-    return (processor, model) 
\ No newline at end of file
+    return (processor, model)
+
+
+_blip = None
+
+
+def get_blip():
+    """
+    Process-wide BLIP (processor, model), loaded once in eval mode.
+
+    Loaded before forking, the weights are shared copy-on-write by every
+    worker as long as nothing writes to them (no .to(), .train() or .half()).
+    """
+    global _blip
+    if _blip is None:
+        processor, model = get_preprocess_and_model()
+        model.eval()
+        _blip = (processor, model)
+    return _blip
+
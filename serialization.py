@@ -0,0 +1,45 @@
+from typing import Any
+
+import numpy as np
+import orjson
+from fastapi.responses import JSONResponse
+
+
+# DeepFace results are full of numpy scalars (np.float32 emotion scores,
+# np.float64 face_confidence, ...). orjson serializes those and ndarrays
+# natively, so there is no need to walk the result converting them first.
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    # Anything OPT_SERIALIZE_NUMPY does not cover (e.g. np.float16, non
+    # contiguous arrays) goes through numpy's own conversion.
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+def dumps(obj: Any) -> str:
+    """
+    json.dumps replacement that understands numpy scalars and arrays.
+    """
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson, numpy-aware.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
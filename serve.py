@@ -0,0 +1,229 @@
+"""
+Pre-fork launcher: load models once, then fork workers that share them.
+
+    python serve.py --workers 4 --port 8000 [--preload detector]
+
+The master computes the CPU topology once (runtime_topology), imports the app
+(FastAPI, DeepFace, TensorFlow, torch modules), loads the preloaded models,
+freezes the GC and forks the workers, which all accept on one listening
+socket. Each worker then pins itself to its CPU slice and sets its thread
+knobs; the master itself stays unpinned. Everything loaded in the master is
+shared copy-on-write; gc.freeze() keeps the collector from writing to those
+objects' headers, and workers never modify the preloaded weights.
+
+What can be preloaded:
+    detector   OpenCV face detector (pure OpenCV, fork safe). The default.
+    emotion    DeepFace emotion CNN. Building the Keras model starts the
+               TensorFlow runtime and its thread pools, which do not survive
+               fork(): workers can deadlock on their first prediction. Off
+               by default; each worker loads and warms it after the fork
+               instead, which costs one private copy per worker (a few MB
+               for this model) and a slower first start.
+    blip       BLIP captioning model from sentiment.py (torch). Only the
+               caption endpoints use it, so it is not preloaded by default.
+
+The master restarts workers that die, backing off exponentially while a
+worker keeps dying soon after it starts, and periodically logs each worker's
+shared vs private memory from /proc/<pid>/smaps_rollup (also on SIGUSR1).
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+
+PRELOADERS = ("detector", "blip", "emotion")
+
+# A worker that stayed up this long was healthy; its next exit restarts at once
+HEALTHY_UPTIME = 60.0
+RESTART_BACKOFF_MAX = 30.0
+
+
+def restart_delay(failures):
+    """
+    Seconds to wait before restarting a worker that exited early `failures`
+    times in a row: 0, 1, 2, 4, ... capped at RESTART_BACKOFF_MAX.
+    """
+    if failures <= 0:
+        return 0.0
+    return min(RESTART_BACKOFF_MAX, 2.0 ** (failures - 1))
+
+
+def preload(names):
+    import numpy as np
+
+    if "detector" in names:
+        from emotion_pipeline import detect_faces
+        detect_faces(np.zeros((240, 320, 3), dtype=np.uint8), detector_backend="opencv")
+    if "blip" in names:
+        from sentiment import get_blip
+        get_blip()
+    if "emotion" in names:
+        from emotion_pipeline import get_emotion_model
+        get_emotion_model()
+
+
+def memory_rollup(pid):
+    """
+    Shared / private / proportional set size in kB for one process.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def report_memory(master_pid, workers):
+    rows = [("master", master_pid)] + [(f"worker {i}", pid) for i, pid in sorted(workers.items())]
+    print(f"{'process':<10} {'pid':>7} {'rss MB':>8} {'shared MB':>10} {'private MB':>11} {'pss MB':>8}", flush=True)
+    for name, pid in rows:
+        mem = memory_rollup(pid)
+        if mem is None:
+            continue
+        print(
+            f"{name:<10} {pid:>7} {mem['rss'] / 1024:>8.1f} {mem['shared'] / 1024:>10.1f} "
+            f"{mem['private'] / 1024:>11.1f} {mem['pss'] / 1024:>8.1f}",
+            flush=True,
+        )
+
+
+def run_worker(index, sock, args):
+    import runtime_topology
+    runtime_topology.configure_worker(index)
+
+    import uvicorn
+    import app as app_module
+
+    config = uvicorn.Config(app_module.app, log_level=args.log_level, workers=1)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fork server for the emotion API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--preload", default="detector", help=f"comma list of {', '.join(PRELOADERS)}")
+    parser.add_argument("--memory-report-interval", type=float, default=60.0)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    preloads = [p.strip() for p in args.preload.split(",") if p.strip()]
+    unknown = set(preloads) - set(PRELOADERS)
+    if unknown:
+        parser.error(f"unknown preload: {', '.join(sorted(unknown))}")
+
+    # Topology defaults (threads per worker) depend on the worker count. It is
+    # computed here, before anything is pinned, so every worker slices the
+    # full CPU set; the app import below keeps it
+    os.environ["EMOTICAM_WORKERS"] = str(args.workers)
+    import runtime_topology
+    runtime_topology.configure_env(runtime_topology.Topology.from_env(), defer=True)
+    import app  # noqa: F401  (imports every heavy module once, in the master)
+    preload(preloads)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Move everything loaded so far out of the GC's reach so collections in
+    # the workers do not dirty the shared pages
+    gc.collect()
+    gc.freeze()
+
+    master_pid = os.getpid()
+    workers = {}
+    started = {}
+    failures = {}
+    # index -> monotonic time of a scheduled restart
+    restarts = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            try:
+                run_worker(index, sock, args)
+            finally:
+                os._exit(1)
+        workers[index] = pid
+        started[index] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        restarts.clear()
+        for pid in workers.values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, lambda *_: report_memory(master_pid, workers))
+
+    for index in range(args.workers):
+        spawn(index)
+    print(f"master {master_pid}: {args.workers} workers on {args.host}:{args.port}, preloaded {preloads}", flush=True)
+
+    next_report = time.monotonic() + args.memory_report_interval
+    while workers or restarts:
+        now = time.monotonic()
+        for index, at in list(restarts.items()):
+            if now >= at:
+                del restarts[index]
+                spawn(index)
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG) if workers else (0, 0)
+        except ChildProcessError:
+            # No children left to reap; only scheduled restarts keep us going
+            workers.clear()
+            pid = 0
+        if pid:
+            index = next((i for i, p in workers.items() if p == pid), None)
+            if index is not None:
+                del workers[index]
+                if not stopping:
+                    uptime = time.monotonic() - started[index]
+                    failures[index] = 0 if uptime >= HEALTHY_UPTIME else failures.get(index, 0) + 1
+                    delay = restart_delay(failures[index])
+                    print(
+                        f"worker {index} (pid {pid}) exited with {status} after {uptime:.0f}s; "
+                        f"restarting in {delay:.0f}s",
+                        flush=True,
+                    )
+                    restarts[index] = time.monotonic() + delay
+            continue
+        if args.memory_report_interval and time.monotonic() >= next_report:
+            report_memory(master_pid, workers)
+            next_report = time.monotonic() + args.memory_report_interval
+        time.sleep(0.5)
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
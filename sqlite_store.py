@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+
+
+# Threads doing SQLite I/O for the event loop; a write can wait on another
+# worker's lock for up to the busy timeout
+IO_THREADS = 4
+
+
+class SQLiteStore:
+    """
+    Base for state kept in a SQLite database in WAL mode, shared by every
+    worker on the host.
+
+    WAL lets readers run concurrently with the one writer. Each thread gets
+    its own connection; `_run` executes a blocking method on a small thread
+    pool so callers on the event loop never wait on the database directly.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self._local = threading.local()
+        self._executor = None
+        # Neither SQLite connections nor pool threads survive fork();
+        # forked workers start their own
+        os.register_at_fork(after_in_child=self._reset_connections)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(schema)
+
+    def _reset_connections(self):
+        self._local = threading.local()
+        self._executor = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+
+def state_path_from_env():
+    """
+    The database holding per-session state that every worker must see
+    (refinements, emotion versions).
+    """
+    return os.getenv("EMOTICAM_STATE_PATH", os.path.join("cache", "state.sqlite3"))
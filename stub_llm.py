@@ -0,0 +1,60 @@
+import os
+import time
+from types import SimpleNamespace
+
+import orjson
+
+from recommender import recommend
+
+
+# Simulated completion latency, so load tests see a realistic LLM stage
+STUB_LATENCY_MS = float(os.getenv("EMOTICAM_STUB_LLM_LATENCY_MS", "400"))
+
+
+def _emotion_from_prompt(content):
+    """
+    The emotion dict embedded in a user prompt ("Emotion data: [...]" or a
+    group summary), or {} when there is none.
+    """
+    starts = [i for i in (content.find("["), content.find("{")) if i >= 0]
+    if not starts:
+        return {}
+    try:
+        data = orjson.loads(content[min(starts):])
+    except orjson.JSONDecodeError:
+        return {}
+    if isinstance(data, list):
+        data = data[0] if data else {}
+    return data.get("emotion") or data.get("distribution") or {}
+
+
+class _Completions:
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    def create(self, model, messages, timeout=None, **params):
+        time.sleep(self.latency_ms / 1000.0)
+        system = messages[0]["content"] if messages else ""
+        emotion = _emotion_from_prompt(messages[-1]["content"] if messages else "")
+        analysis, _, _ = recommend(emotion)
+        if "JSON" in system:
+            content = orjson.dumps(analysis).decode("utf-8")
+        else:
+            # The plain-list prompts (URLs, titles) get one line per query
+            content = "\n".join(analysis["youtubeKidsQueries"])
+        message = SimpleNamespace(content=content)
+        usage = SimpleNamespace(total_tokens=(len(system) + len(content)) // 4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=model)
+
+
+class StubClient:
+    """
+    Offline stand-in for the Groq client: answers chat completions from the
+    rule-based recommender after a fixed delay. Used for load tests and
+    development without an API key.
+    """
+
+    kind = "stub"
+
+    def __init__(self, latency_ms=STUB_LATENCY_MS):
+        self.chat = SimpleNamespace(completions=_Completions(latency_ms))
@@ -0,0 +1,47 @@
+import asyncio
+
+from analysis_cache import AnalysisCache, normalize_emotion, prompt_version, state_key
+
+
+def test_normalize_emotion_buckets_nearby_frames_together():
+    a = normalize_emotion({"happy": 71.0, "neutral": 29.0})
+    b = normalize_emotion({"happy": 69.0, "neutral": 31.0, "sad": 0.2})
+    assert a == b == "happy=70,neutral=30"
+    assert normalize_emotion({}) == "neutral=100"
+
+
+def test_prompt_version_tracks_the_prompt():
+    assert prompt_version("a") == prompt_version("a") != prompt_version("b")
+    assert state_key("happy", "High") == "state:happy/High"
+
+
+def test_round_trip_and_model_preference(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "a.sqlite3"))
+
+    async def scenario():
+        await cache.put("backup", "v1", "happy=100", {"from": "backup"})
+        first = await cache.get_any(["primary", "backup"], "v1", "happy=100")
+        await cache.put("primary", "v1", "happy=100", {"from": "primary"})
+        second = await cache.get_any(["primary", "backup"], "v1", "happy=100")
+        other_version = await cache.get("primary", "v2", "happy=100")
+        newest = await cache.newest(["primary", "backup"], "v1", "happy=100")
+        return first, second, other_version, newest
+
+    first, second, other_version, newest = asyncio.run(scenario())
+    assert first == ({"from": "backup"}, "backup")
+    assert second == ({"from": "primary"}, "primary")
+    assert other_version is None
+    assert newest is not None
+
+
+def test_trimmed_to_max_entries_periodically(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "a.sqlite3"), max_entries=5, check_every=3)
+
+    async def fill():
+        for i in range(12):
+            await cache.put("m", "v1", f"key{i}", {"i": i})
+
+    asyncio.run(fill())
+    assert len(cache) <= 5 + cache.check_every
+    # The most recently written entries survive
+    assert asyncio.run(cache.get("m", "v1", "key11")) == {"i": 11}
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("deepface")
+
+import analyze_video  # noqa: E402
+import emotion_pipeline  # noqa: E402
+
+
+def test_warm_up_runs_the_given_pipeline_on_a_blank_frame():
+    seen = []
+    emotion_pipeline.warm_up(lambda frame: seen.append(frame.shape), "L")
+    emotion_pipeline.warm_up(lambda frame: seen.append(frame.shape))
+    assert seen == [(240, 320), (240, 320, 3)]
+
+
+def test_analyze_keeps_the_most_confident_face(monkeypatch):
+    faces = [
+        {"face_confidence": 0.4, "dominant_emotion": "sad", "emotion": {"sad": 90.0}, "region": {"x": 0}},
+        {"face_confidence": 0.9, "dominant_emotion": "happy", "emotion": {"happy": 80.0}, "region": {"x": 5}},
+    ]
+    monkeypatch.setattr(emotion_pipeline, "analyze_frame", lambda frame: faces)
+    record = analyze_video._analyze(np.zeros((4, 4, 3), dtype=np.uint8))
+    assert record == {"faces": 2, "dominant_emotion": "happy", "emotion": {"happy": 80.0}, "region": {"x": 5}}
+
+
+def test_analyze_reports_errors_instead_of_raising(monkeypatch):
+    def fail(frame):
+        raise ValueError("no face")
+
+    monkeypatch.setattr(emotion_pipeline, "analyze_frame", fail)
+    assert analyze_video._analyze(np.zeros((4, 4, 3), dtype=np.uint8)) == {"error": "no face"}
+
+
+def test_analyze_uses_the_configured_pipeline(monkeypatch):
+    monkeypatch.setattr(emotion_pipeline, "PIPELINE_MODE", "gray")
+    seen = []
+
+    def analyze_gray(frame, detector_backend):
+        seen.append(frame.shape)
+        return [{"dominant_emotion": "sad", "emotion": {"sad": 70.0}}]
+
+    monkeypatch.setattr(emotion_pipeline, "analyze_frame_gray", analyze_gray)
+    record = analyze_video._analyze(np.zeros((4, 4), dtype=np.uint8))
+    assert seen == [(4, 4)] and record["dominant_emotion"] == "sad"
+
+
+def test_iter_frames_samples_and_downscales(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10.0, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    frames = list(analyze_video.iter_frames(path, sample_fps=2, max_width=32))
+    assert [index for index, _, _ in frames] == [0, 5, 10, 15]
+    assert frames[1][1] == pytest.approx(0.5)
+    assert frames[0][2].shape == (24, 32, 3)
+    gray = list(analyze_video.iter_frames(path, sample_fps=2, mode="L"))
+    assert gray[0][2].shape == (48, 64)
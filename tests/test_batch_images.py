@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+import batch_images  # noqa: E402
+
+
+def test_list_images_from_tree_and_manifest(tmp_path):
+    (tmp_path / "a").mkdir()
+    for name in ("a/2.jpg", "1.PNG", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    paths = batch_images.list_images(str(tmp_path))
+    assert [p[len(str(tmp_path)) + 1:] for p in paths] == ["1.PNG", "a/2.jpg"]
+
+    manifest = tmp_path / "list.txt"
+    manifest.write_text("x.jpg\n\n y.jpg \n")
+    assert batch_images.list_images(str(manifest)) == ["x.jpg", "y.jpg"]
+
+
+def test_default_format_follows_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        expected = "parquet"
+    except ImportError:
+        expected = "memmap"
+    assert batch_images.default_format() == expected
+
+
+def test_memmap_writer_rows_and_index(tmp_path):
+    writer = batch_images.MemmapWriter(str(tmp_path), total=4)
+    probs = np.eye(7, dtype=np.float32)[:2]
+    writer.write(1, 2, ["c.jpg", "d.jpg"], probs, np.array([1, 0]), np.array([0.9, 0.0]), [None, "decode failed"])
+    writer.close()
+
+    stored = np.memmap(tmp_path / "probs.f32", dtype=np.float32, mode="r", shape=(4, 7))
+    assert np.array_equal(stored[2:4], probs)
+    rows = [json.loads(line) for line in (tmp_path / "index.jsonl").read_text().splitlines()]
+    assert [(r["row"], r["path"], r["error"]) for r in rows] == [(2, "c.jpg", None), (3, "d.jpg", "decode failed")]
+
+
+def test_checkpoint_round_trip_and_mismatch(tmp_path):
+    out = str(tmp_path)
+    assert batch_images.load_checkpoint(out, "m1") == 0
+    batch_images.save_checkpoint(out, "m1", 3, 64)
+    assert batch_images.load_checkpoint(out, "m1") == 3
+    with pytest.raises(SystemExit):
+        batch_images.load_checkpoint(out, "other")
+
+
+def fake_infer_chunk(images, detector_backend="opencv"):
+    # infer_chunk's contract without loading the models
+    n = len(images)
+    probs = np.full((n, 7), np.nan, dtype=np.float32)
+    errors = [None if image is not None else "unreadable or not an image" for image in images]
+    for i, image in enumerate(images):
+        if image is not None:
+            probs[i] = np.eye(7, dtype=np.float32)[3]
+    return probs, np.array([int(image is not None) for image in images], dtype=np.int32), np.zeros(n, dtype=np.float32), errors
+
+
+def test_missing_file_mid_chunk_is_an_error_row_not_a_failed_batch(tmp_path, monkeypatch):
+    cv2 = pytest.importorskip("cv2")
+    images_dir = tmp_path / "in"
+    images_dir.mkdir()
+    paths = []
+    for i in range(3):
+        path = images_dir / f"{i}.png"
+        cv2.imwrite(str(path), np.full((8, 8, 3), 128, dtype=np.uint8))
+        paths.append(str(path))
+    paths[1] = str(images_dir / "gone.png")
+    manifest = tmp_path / "list.txt"
+    manifest.write_text("\n".join(paths))
+
+    assert batch_images.load_image(paths[1]) is None
+    monkeypatch.setattr(batch_images, "infer_chunk", fake_infer_chunk)
+    monkeypatch.setattr(batch_images, "_init_worker", lambda: None)
+    out = tmp_path / "out"
+    done, _ = batch_images.run(str(manifest), str(out), workers=1, io_threads=2, chunk_size=3, fmt="memmap")
+
+    assert done == 3
+    rows = [json.loads(line) for line in (out / "index.jsonl").read_text().splitlines()]
+    assert [r["error"] for r in rows] == [None, "unreadable or not an image", None]
+    assert batch_images.load_checkpoint(str(out), json.loads((out / "checkpoint.json").read_text())["manifest"]) == 1
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from client import client_kind, get_client  # noqa: E402
+from stub_llm import StubClient  # noqa: E402
+
+
+def test_stub_only_when_asked_for(monkeypatch):
+    monkeypatch.setenv("EMOTICAM_LLM", "stub")
+    monkeypatch.setenv("GROQ_API_KEY", "key")
+    client = get_client()
+    assert isinstance(client, StubClient)
+    assert client_kind(client) == "stub"
+
+
+def test_missing_key_is_an_error_not_a_silent_stub(monkeypatch):
+    monkeypatch.delenv("EMOTICAM_LLM", raising=False)
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    with pytest.raises(RuntimeError, match="GROQ_API_KEY"):
+        get_client()
+
+
+def test_real_clients_have_their_own_kind():
+    assert client_kind(object()) == "groq"
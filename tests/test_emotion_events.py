@@ -0,0 +1,67 @@
+import asyncio
+
+from emotion_events import EmotionHub
+
+
+def test_version_only_moves_on_change(tmp_path):
+    hub = EmotionHub(str(tmp_path / "state.sqlite3"), default_emotion="happy")
+
+    async def scenario():
+        return [await hub.publish("s", e) for e in ("happy", "sad", "sad", "happy")]
+
+    assert asyncio.run(scenario()) == [0, 1, 1, 2]
+
+
+def test_wait_returns_at_once_for_a_new_version_and_times_out_otherwise(tmp_path):
+    hub = EmotionHub(str(tmp_path / "state.sqlite3"))
+
+    async def scenario():
+        await hub.publish("s", "sad")
+        fresh = await hub.wait("s", None, 1.0)
+        stale = await hub.wait("s", fresh["version"], 0.05)
+        return fresh, stale
+
+    fresh, stale = asyncio.run(scenario())
+    assert fresh == {"sessionId": "s", "emotion": "sad", "version": 1, "changed": True}
+    assert stale["changed"] is False
+
+
+def test_change_on_another_worker_wakes_a_subscriber(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    worker_a = EmotionHub(path, poll_interval=0.02)
+    worker_b = EmotionHub(path, poll_interval=0.02)
+
+    async def scenario():
+        since = (await worker_b.wait("s", None, 0))["version"]
+        waiter = asyncio.create_task(worker_b.wait("s", since, 2.0))
+        await asyncio.sleep(0.05)
+        await worker_a.publish("s", "surprise")
+        return await asyncio.wait_for(waiter, 1.0)
+
+    state = asyncio.run(scenario())
+    assert state["changed"] and state["emotion"] == "surprise"
+
+
+def test_stale_local_view_does_not_swallow_a_change(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    worker_a, worker_b = EmotionHub(path), EmotionHub(path)
+
+    async def scenario():
+        await worker_a.publish("s", "sad")
+        # worker_b still believes the default emotion; publishing it is a change
+        return await worker_b.publish("s", "happy"), (await worker_a.wait("s", None, 0))["emotion"]
+
+    assert asyncio.run(scenario()) == (2, "happy")
+
+
+def test_evicted_waiter_times_out_instead_of_seeing_a_default_state(tmp_path):
+    hub = EmotionHub(str(tmp_path / "state.sqlite3"), default_emotion="happy", max_sessions=1)
+
+    async def scenario():
+        await hub.publish("a", "sad")
+        waiter = asyncio.ensure_future(hub.wait("a", 1, 5.0))
+        await asyncio.sleep(0.05)
+        hub._state("b")  # pushes "a" out of the local LRU
+        return await asyncio.wait_for(waiter, 1.0)
+
+    assert asyncio.run(scenario()) == {"sessionId": "a", "emotion": "sad", "version": 1, "changed": False}
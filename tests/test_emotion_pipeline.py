@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("deepface")
+
+import emotion_pipeline  # noqa: E402
+from emotion_pipeline import EMOTIONS, analyze_frame, analyze_frame_gray, frame_pipeline, preprocess_gray_crops  # noqa: E402
+
+
+def fake_classifier(batch):
+    probs = np.zeros((len(batch), len(EMOTIONS)), dtype=np.float32)
+    probs[:, EMOTIONS.index("happy")] = 1.0
+    return probs
+
+
+def test_frame_pipeline_follows_the_mode(monkeypatch):
+    monkeypatch.setattr(emotion_pipeline, "PIPELINE_MODE", "rgb")
+    assert frame_pipeline() == (analyze_frame, "RGB")
+    monkeypatch.setattr(emotion_pipeline, "PIPELINE_MODE", "gray")
+    analyze, mode = frame_pipeline()
+    assert mode == "L" and analyze.func is analyze_frame_gray
+    # Detectors that need color keep the RGB path
+    assert frame_pipeline("retinaface") == (analyze_frame, "RGB")
+
+
+def test_gray_crops_are_cut_and_scaled_without_color_conversion():
+    gray = np.full((100, 120), 255, dtype=np.uint8)
+    gray[10:60, 20:70] = 0
+    batch = preprocess_gray_crops(gray, [(20, 10, 50, 50), (0, 0, 120, 100)])
+    assert batch.shape == (2, 48, 48, 1)
+    assert batch.dtype == np.float32
+    assert batch[0].max() == 0.0
+    assert 0.0 < batch[1].mean() < 1.0
+
+
+def test_gray_frame_without_faces_is_classified_whole(monkeypatch):
+    monkeypatch.setattr(emotion_pipeline, "classify_crops", fake_classifier)
+    faces = analyze_frame_gray(np.zeros((48, 64), dtype=np.uint8), detector_backend="skip")
+    assert len(faces) == 1
+    assert faces[0]["region"] == {"x": 0, "y": 0, "w": 64, "h": 48}
+    assert faces[0]["face_confidence"] == 0
+    assert faces[0]["dominant_emotion"] == "happy"
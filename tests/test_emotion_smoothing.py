@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from emotion_smoothing import EmotionSmoother
+from timeline_store import EMOTIONS
+
+
+def probs(**weights):
+    return [weights.get(e, 0.0) for e in EMOTIONS]
+
+
+def smoother_at(tmp_path, **kwargs):
+    settings = dict(alpha=0.5, margin=0.1, min_dwell=1.0)
+    settings.update(kwargs)
+    return EmotionSmoother(str(tmp_path / "state.sqlite3"), **settings)
+
+
+def feed(smoother, frames, session_id="s"):
+    async def run():
+        return [await smoother.update(session_id, p, now=t) for t, p in frames]
+
+    return asyncio.run(run())
+
+
+def test_first_frame_sets_the_state(tmp_path):
+    smoother = smoother_at(tmp_path)
+    [(session, changed)] = feed(smoother, [(0.0, probs(happy=1.0))])
+    assert changed and session.state == "happy"
+    assert smoother.emotion_dict(session)["happy"] == pytest.approx(100.0)
+
+
+def test_single_frame_flicker_does_not_switch(tmp_path):
+    smoother = smoother_at(tmp_path)
+    results = feed(smoother, [(0.0, probs(neutral=1.0)), (0.1, probs(happy=1.0)), (0.2, probs(neutral=1.0))])
+    # happy and neutral are level in the average: no margin, no switch
+    assert [(s.state, changed) for s, changed in results[1:]] == [("neutral", False), ("neutral", False)]
+    assert results[2][0].challenger is None
+
+
+def test_switches_after_leading_for_the_dwell_time(tmp_path):
+    smoother = smoother_at(tmp_path)
+    results = feed(smoother, [(0.0, probs(neutral=1.0)), (0.1, probs(happy=1.0)), (0.2, probs(happy=1.0))])
+    session, changed = results[-1]
+    assert not changed and session.challenger == "happy"
+    asyncio.run(smoother.set_analysis(session, {"cached": True}))
+    session, changed = feed(smoother, [(1.3, probs(happy=1.0))])[0]
+    assert changed and session.state == "happy"
+    assert session.analysis is None
+
+
+def test_state_can_differ_from_the_smoothed_top_emotion(tmp_path):
+    # Why callers must use session.state, not the argmax of the average
+    smoother = smoother_at(tmp_path, alpha=0.3)
+    frames = [(0.0, probs(neutral=1.0))] + [(t / 10, probs(neutral=0.4, happy=0.6)) for t in range(1, 10)]
+    session, _ = feed(smoother, frames)[-1]
+    smoothed = smoother.emotion_dict(session)
+    assert max(smoothed, key=smoothed.get) == "happy"
+    assert session.state == "neutral"
+
+
+def test_workers_share_one_smoothed_state(tmp_path):
+    # Two workers, frames of one session alternating between them
+    first, second = smoother_at(tmp_path), smoother_at(tmp_path)
+    feed(first, [(0.0, probs(neutral=1.0))])
+    feed(second, [(0.1, probs(happy=1.0))])
+    session, _ = feed(first, [(0.2, probs(happy=1.0))])[0]
+    assert session.challenger == "happy"
+    asyncio.run(first.set_analysis(session, {"source": "rules"}))
+    session, changed = feed(second, [(0.3, probs(happy=1.0))])[0]
+    assert not changed and session.analysis == {"source": "rules"}
+    session, changed = feed(second, [(1.3, probs(happy=1.0))])[0]
+    assert changed and session.state == "happy"
+    assert feed(first, [(1.4, probs(happy=1.0))])[0][0].state == "happy"
+
+
+def test_idle_sessions_start_over(tmp_path):
+    smoother = smoother_at(tmp_path, session_ttl=10.0)
+    feed(smoother, [(0.0, probs(sad=1.0))])
+    session, changed = feed(smoother, [(60.0, probs(happy=1.0))])[0]
+    assert changed and session.state == "happy"
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+pytest.importorskip("deepface")
+
+from face_models import ModelBudgetExceeded, ModelRegistry  # noqa: E402
+
+
+class FakeLoader:
+    def __init__(self, gate=None):
+        self.calls = []
+        self.released = []
+        self.gate = gate
+        self.started = threading.Event()
+
+    def load(self, action):
+        self.calls.append(action)
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return f"model:{action}"
+
+    def release(self, action):
+        self.released.append(action)
+
+
+def registry(budget_mb, loader):
+    return ModelRegistry(budget_mb=budget_mb, loader=loader.load, releaser=loader.release)
+
+
+def test_models_load_once_and_evict_least_recently_used():
+    loader = FakeLoader()
+    models = registry(600, loader)
+    assert models.get("emotion") == "model:emotion"
+    assert models.get("emotion") == "model:emotion"
+    models.get("age")
+    models.get("emotion")
+    assert loader.calls == ["emotion", "age"]
+    models.get("gender")
+    # Age made way for gender; DeepFace's copy is released with it
+    assert models.loaded() == ["emotion", "gender"]
+    assert loader.released == ["age"]
+
+
+def test_pinned_actions_that_do_not_fit_raise():
+    models = registry(600, FakeLoader())
+    models.get("age")
+    with pytest.raises(ModelBudgetExceeded):
+        models.get("gender", keep=("age",))
+    assert models.loaded() == ["age"]
+
+
+def test_concurrent_callers_share_one_load_without_blocking_others():
+    gate = threading.Event()
+    loader = FakeLoader(gate)
+    models = registry(2000, loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(models.get("age"))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    assert loader.started.wait(5)
+    # The registry lock is free while age loads: a loaded model is served
+    models._models["emotion"] = "model:emotion"
+    assert models.get("emotion") == "model:emotion"
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert results == ["model:age"] * 3
+    assert loader.calls == ["age"]
+
+
+def test_failed_loads_are_not_cached():
+    class Flaky(FakeLoader):
+        def load(self, action):
+            self.calls.append(action)
+            if len(self.calls) == 1:
+                raise OSError("download failed")
+            return f"model:{action}"
+
+    loader = Flaky()
+    models = registry(600, loader)
+    with pytest.raises(OSError):
+        models.get("emotion")
+    assert models.get("emotion") == "model:emotion"
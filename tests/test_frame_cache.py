@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from frame_cache import FrameAnalysisCache, frame_digest
+
+
+def test_digest_is_content_addressed():
+    assert frame_digest(b"frame") == frame_digest(b"frame")
+    assert frame_digest(b"frame") != frame_digest(b"frame2")
+    assert len(frame_digest(b"")) == 32
+
+
+def test_identical_frames_share_one_computation():
+    cache = FrameAnalysisCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"faces": 1}
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_compute(("d", "frame"), compute) for _ in range(5)))
+        again = await cache.get_or_compute(("d", "frame"), compute)
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results) and again is results[0]
+
+
+def test_errors_and_uncacheable_results_are_not_kept():
+    cache = FrameAnalysisCache()
+
+    async def fail():
+        raise ValueError("bad frame")
+
+    async def rejected():
+        return (None, "no face")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await cache.get_or_compute("a", fail)
+        await cache.get_or_compute("b", rejected, cacheable=lambda r: r[1] is None)
+
+    asyncio.run(scenario())
+    assert len(cache) == 0
+
+
+def test_least_recently_used_frames_are_dropped():
+    cache = FrameAnalysisCache(max_entries=2)
+
+    def value(v):
+        async def compute():
+            return v
+        return compute
+
+    async def scenario():
+        await cache.get_or_compute("a", value(1))
+        await cache.get_or_compute("b", value(2))
+        await cache.get_or_compute("a", value(99))  # hit, now most recent
+        await cache.get_or_compute("c", value(3))
+        return await cache.get_or_compute("a", value(99)), await cache.get_or_compute("b", value(20))
+
+    assert asyncio.run(scenario()) == (1, 20)
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    cache = FrameAnalysisCache()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        second = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+    assert len(cache) == 1
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("deepface")
+
+from emotion_pipeline import EMOTIONS, aggregate_distribution, preprocess_crops, summarize_group  # noqa: E402
+
+
+def one_hot(*names):
+    probs = np.zeros((len(names), len(EMOTIONS)), dtype=np.float32)
+    for i, name in enumerate(names):
+        probs[i, EMOTIONS.index(name)] = 1.0
+    return probs
+
+
+def test_aggregate_counts_and_mean():
+    group = aggregate_distribution(one_hot("happy", "happy", "sad"))
+    assert group["dominant_emotion"] == "happy"
+    assert group["dominant_counts"] == {"happy": 2, "sad": 1}
+    assert group["distribution"]["happy"] == pytest.approx(66.67)
+    assert group["distribution"]["angry"] == 0
+
+
+def test_aggregate_no_faces_is_neutral():
+    group = aggregate_distribution(np.zeros((0, len(EMOTIONS)), dtype=np.float32))
+    assert group["dominant_emotion"] == "neutral"
+    assert group["dominant_counts"] == {}
+
+
+def test_preprocess_crops_batches_any_size():
+    faces = [{"face": np.random.rand(80, 60, 3)}, {"face": np.zeros((120, 120, 3), dtype=np.uint8)}]
+    batch = preprocess_crops(faces)
+    assert batch.shape == (2, 48, 48, 1)
+    assert batch.dtype == np.float32
+    assert 0.0 <= batch.min() and batch.max() <= 1.0
+
+
+def test_summary_drops_per_face_data_and_tiny_shares():
+    group = aggregate_distribution(one_hot("happy", "happy", "sad"))
+    group.update(face_count=3, faces=[{}, {}, {}])
+    summary = summarize_group(group)
+    assert "faces" not in summary
+    assert set(summary["distribution"]) == {"happy", "sad"}
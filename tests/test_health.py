@@ -0,0 +1,49 @@
+from health import FAILED, READY, ServiceHealth
+
+
+def ready_health(**kwargs):
+    health = ServiceHealth(max_queue=4, p95_slo_ms=100, latency_window_s=60, **kwargs)
+    health.warm_state = READY
+    return health
+
+
+def test_not_ready_until_warm():
+    health = ServiceHealth()
+    state = health.readiness(None, {}, 0)
+    assert state["drain"] and state["weight"] == 0
+    health.warm_state = FAILED
+    assert health.readiness(None, {}, 0)["reasons"] == ["models failed"]
+
+
+def test_queue_depth_lowers_weight_then_drains():
+    health = ready_health()
+    assert health.readiness(None, {}, 0)["weight"] == 100
+    with health.inference_slot(), health.inference_slot():
+        assert health.readiness(None, {}, 0)["weight"] == 50
+        with health.inference_slot(), health.inference_slot():
+            assert health.readiness(None, {}, 0)["drain"]
+    assert health.inference_queue == 0
+
+
+def test_slow_window_drains_until_it_ages_out():
+    health = ready_health()
+    for i in range(10):
+        health.observe_latency(500, now=1000.0 + i)
+    p95 = health.latency_p95(now=1010.0)
+    assert p95 == 500
+    assert health.readiness(p95, {}, 0)["drain"]
+
+    # No traffic while drained: the slow samples expire and it recovers
+    assert health.latency_p95(now=1100.0) is None
+    assert health.readiness(health.latency_p95(now=1100.0), {}, 0)["ready"]
+
+
+def test_too_few_samples_do_not_judge_latency():
+    health = ready_health()
+    health.observe_latency(5000, now=1.0)
+    assert health.latency_p95(now=2.0) is None
+
+
+def test_all_circuits_open_halves_weight_but_stays_ready():
+    state = ready_health().readiness(None, {"a": "open", "b": "open"}, 3)
+    assert state["ready"] and state["weight"] == 50
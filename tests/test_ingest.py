@@ -0,0 +1,85 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ingest import ImageRejected, decode_base64, ingest_image
+
+
+def encode(image, fmt, **params):
+    buf = io.BytesIO()
+    image.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def test_decode_base64_strips_data_url_prefix():
+    payload = base64.b64encode(b"abc").decode()
+    assert decode_base64("data:image/jpeg;base64," + payload) == b"abc"
+
+
+def test_decode_base64_rejects_empty_and_oversized():
+    with pytest.raises(ImageRejected):
+        decode_base64("")
+    with pytest.raises(ImageRejected) as e:
+        decode_base64("A" * 400, max_bytes=100)
+    assert e.value.status_code == 413
+
+
+def test_large_jpeg_is_downscaled_to_working_size():
+    img_bytes = encode(Image.new("RGB", (2000, 1000), (200, 10, 10)), "JPEG")
+    frame, stats = ingest_image(img_bytes, working_size=640)
+    assert frame.shape == (320, 640, 3)
+    assert stats["source_size"] == (2000, 1000)
+
+
+def test_grayscale_mode_decodes_one_channel():
+    frame, _ = ingest_image(encode(Image.new("RGB", (64, 48), (255, 255, 255)), "PNG"), mode="L")
+    assert frame.shape == (48, 64)
+    assert frame.dtype == np.uint8
+
+
+def test_transparent_png_is_flattened_onto_white():
+    image = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+    frame, _ = ingest_image(encode(image, "PNG"))
+    assert frame.shape == (8, 8, 3)
+    assert (frame == 255).all()
+
+
+def test_frames_are_independent_arrays():
+    red = encode(Image.new("RGB", (16, 16), (255, 0, 0)), "PNG")
+    blue = encode(Image.new("RGB", (16, 16), (0, 0, 255)), "PNG")
+    first, _ = ingest_image(red)
+    second, _ = ingest_image(blue)
+    assert first[0, 0].tolist() == [255, 0, 0]
+    assert second[0, 0].tolist() == [0, 0, 255]
+
+
+def test_pixel_bomb_rejected_from_the_header():
+    img_bytes = encode(Image.new("L", (100, 100)), "PNG")
+    with pytest.raises(ImageRejected) as e:
+        ingest_image(img_bytes, max_pixels=5000)
+    assert e.value.status_code == 413
+
+
+def test_unsupported_and_garbage_uploads():
+    with pytest.raises(ImageRejected) as e:
+        ingest_image(encode(Image.new("RGB", (4, 4)), "BMP"))
+    assert e.value.status_code == 415
+    with pytest.raises(ImageRejected):
+        ingest_image(b"not an image")
+
+
+def test_webp_is_accepted_in_both_modes():
+    img_bytes = encode(Image.new("RGB", (32, 24), (10, 200, 10)), "WEBP", lossless=True)
+    rgb, _ = ingest_image(img_bytes)
+    gray, _ = ingest_image(img_bytes, mode="L")
+    assert rgb.shape == (24, 32, 3)
+    assert gray.shape == (24, 32)
+
+
+def test_stats_label_the_peak_as_an_estimate():
+    _, stats = ingest_image(encode(Image.new("RGB", (64, 48)), "PNG"))
+    assert "peak_bytes" not in stats
+    assert stats["est_peak_bytes"] >= 2 * 64 * 48 * 3
@@ -0,0 +1,59 @@
+import pytest
+
+from llm_analysis import AnalysisParseError, parse_analysis, repair_json
+
+
+def test_fenced_single_quoted_with_trailing_comma():
+    text = "Here you go:\n```json\n{'a': 'x', 'b': [1, 2,],}\n```\nEnjoy!"
+    assert repair_json(text) == {"a": "x", "b": [1, 2]}
+
+
+def test_apostrophe_inside_single_quoted_string():
+    assert repair_json("{'reason': 'it's calm', 'ok': 'yes'}") == {"reason": "it's calm", "ok": "yes"}
+
+
+def test_truncated_string_value_is_dropped():
+    assert repair_json('{"a": 1, "bestMatch": "tru') == {"a": 1}
+
+
+def test_truncated_array_element_is_dropped():
+    assert repair_json('{"q": ["calm music", "y') == {"q": ["calm music"]}
+
+
+def test_truncated_number_is_dropped():
+    assert repair_json('{"a": "x", "score": 0.9') == {"a": "x"}
+
+
+def test_truncated_after_complete_container_keeps_it():
+    assert repair_json('{"a": {"b": [1, 2]}') == {"a": {"b": [1, 2]}}
+
+
+def test_truncated_after_complete_string_element_keeps_it():
+    assert repair_json('{"q": ["a", "b"') == {"q": ["a", "b"]}
+
+
+def test_dangling_key_is_dropped():
+    assert repair_json('{"a": 1, "b"') == {"a": 1}
+
+
+def test_malformed_complete_object_raises():
+    with pytest.raises(AnalysisParseError):
+        repair_json('{"a": nope}')
+
+
+def test_no_object_raises():
+    with pytest.raises(AnalysisParseError):
+        repair_json("no json here")
+
+
+def test_parse_analysis_fills_best_match_from_ranking():
+    analysis = parse_analysis(
+        '{"childAnalysis": {}, "contentStrategy": {}, "queryRanking": {"rankedQueries": '
+        '[{"query": "a", "score": 0.2}, {"query": "b", "score": 0.9}]}}'
+    )
+    assert analysis.queryRanking.bestMatch == "b"
+
+
+def test_parse_analysis_rejects_missing_sections():
+    with pytest.raises(AnalysisParseError):
+        parse_analysis('{"childAnalysis": {}}')
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llm_router import CircuitBreaker, LLMRouter, LLMUnavailable, ModelRoute, load_routes
+from llm_scheduler import LLMScheduler
+
+
+class FakeCompletions:
+    """
+    Chat completions that answer per model after a delay, or raise.
+    """
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.calls = []
+
+    def create(self, model, messages, timeout, **params):
+        self.calls.append(model)
+        delay, answer = self.behaviour[model]
+        time.sleep(delay)
+        if isinstance(answer, Exception):
+            raise answer
+        message = SimpleNamespace(content=answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def make_router(behaviour, routes, **kwargs):
+    completions = FakeCompletions(behaviour)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    router = LLMRouter(client, routes, scheduler_factory=lambda: LLMScheduler(1000, 1_000_000), **kwargs)
+    return router, completions
+
+
+def test_load_routes_parses_deadlines():
+    routes = load_routes("a/model:5, other-model ,c:2.5")
+    assert [(r.name, r.deadline) for r in routes] == [("a/model", 5.0), ("other-model", 12.0), ("c", 2.5)]
+
+
+def test_primary_answer_wins():
+    router, completions = make_router({"a": (0, "one"), "b": (0, "two")}, [ModelRoute("a"), ModelRoute("b")])
+    assert asyncio.run(router.complete([{"role": "user", "content": "hi"}])) == ("one", "a")
+    assert completions.calls == ["a"]
+
+
+def test_invalid_answer_fails_over():
+    def validate(content):
+        if content == "bad":
+            raise ValueError(content)
+        return content
+
+    router, _ = make_router({"a": (0, "bad"), "b": (0, "good")}, [ModelRoute("a"), ModelRoute("b")])
+    result = asyncio.run(router.complete([{"role": "user", "content": "hi"}], validate=validate))
+    assert result == ("good", "b")
+
+
+def test_slow_primary_is_hedged():
+    routes = [ModelRoute("a", deadline=5, hedge_after=0.05), ModelRoute("b", deadline=5)]
+    router, completions = make_router({"a": (0.5, "slow"), "b": (0, "fast")}, routes)
+    assert asyncio.run(router.complete([{"role": "user", "content": "hi"}])) == ("fast", "b")
+    assert completions.calls == ["a", "b"]
+
+
+def test_all_failing_raises_and_opens_circuits():
+    routes = [ModelRoute("a"), ModelRoute("b")]
+    router, _ = make_router({"a": (0, RuntimeError("down")), "b": (0, RuntimeError("down"))}, routes,
+                            failure_threshold=1)
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(router.complete([{"role": "user", "content": "hi"}]))
+    assert router.circuit_states() == {"a": "open", "b": "open"}
+    with pytest.raises(LLMUnavailable, match="circuits are open"):
+        asyncio.run(router.complete([{"role": "user", "content": "hi"}]))
+
+
+def test_breaker_half_open_allows_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, TokenBucket, estimate_tokens, parse_reset, scheduler_from_env
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66), ("2m59.56s", 179.56), ("120ms", 0.12), ("1h", 3600.0), ("3", 3.0), ("soon", None), (None, None),
+])
+def test_parse_reset(value, seconds):
+    assert parse_reset(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+
+def test_estimate_tokens_includes_completion_budget():
+    assert estimate_tokens([{"role": "user", "content": "x" * 400}], max_tokens=100) == 100 + 4 + 100
+
+
+def test_bucket_waits_for_refill_and_caps_at_capacity():
+    bucket = TokenBucket(60, period=60.0)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    # Asking for more than the bucket holds waits for a full bucket, not forever
+    bucket.refund(1000)
+    assert bucket.level == 60
+    assert bucket.wait_time(500) == 0.0
+
+
+def test_sync_never_trusts_more_than_the_server():
+    bucket = TokenBucket(100)
+    bucket.sync(remaining=10)
+    assert bucket.level == pytest.approx(10, abs=0.1)
+    bucket.sync(remaining=500)
+    assert bucket.level < 11
+
+
+def test_interactive_requests_jump_the_batch_queue():
+    async def scenario():
+        scheduler = LLMScheduler(rpm=6000, tpm=1_000_000)
+        scheduler.requests.level = 0  # next slot in 10 ms
+        order = []
+
+        async def call(name, priority):
+            await scheduler.acquire(10, priority)
+            order.append(name)
+
+        batch = [asyncio.create_task(call(f"batch{i}", BATCH)) for i in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(call("interactive", INTERACTIVE))
+        await asyncio.gather(*batch, interactive)
+        return order
+
+    assert asyncio.run(scenario())[0] == "interactive"
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = LLMScheduler(rpm=60, tpm=1_000_000)
+        scheduler.requests.level = 0
+        waiter = asyncio.create_task(scheduler.acquire(10))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return scheduler.queue_depth()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_settle_refunds_unused_tokens():
+    scheduler = LLMScheduler(rpm=60, tpm=1000)
+    scheduler.tokens.consume(500)
+    scheduler.settle(reserved=500, used=100)
+    assert scheduler.tokens.level == pytest.approx(900, abs=1)
+
+
+def test_each_worker_gets_its_share_of_the_limits(monkeypatch):
+    monkeypatch.setenv("EMOTICAM_LLM_RPM", "30")
+    monkeypatch.setenv("EMOTICAM_LLM_TPM", "8000")
+    monkeypatch.setenv("EMOTICAM_WORKERS", "4")
+    scheduler = scheduler_from_env()
+    assert scheduler.requests.capacity == 7.5
+    assert scheduler.tokens.capacity == 2000
+    monkeypatch.delenv("EMOTICAM_WORKERS")
+    assert scheduler_from_env().requests.capacity == 30
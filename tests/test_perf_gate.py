@@ -0,0 +1,50 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from perf_gate import STAGES, compare, mann_whitney_greater  # noqa: E402
+
+ARGS = SimpleNamespace(tolerance=0.15, p95_tolerance=0.3, alpha=0.01, min_delta_ms=1.0)
+
+
+def test_mann_whitney_small_sample_value():
+    # U = 9 of 9, continuity-corrected normal approximation
+    assert mann_whitney_greater([1, 2, 3], [4, 5, 6]) == pytest.approx(0.0404, abs=1e-4)
+
+
+def test_mann_whitney_direction_and_ties():
+    rng = np.random.default_rng(0)
+    base = rng.normal(100, 5, 200)
+    assert mann_whitney_greater(base, base + 20) < 1e-6
+    assert mann_whitney_greater(base + 20, base) > 0.999
+    assert mann_whitney_greater([5.0] * 10, [5.0] * 10) > 0.5
+    assert mann_whitney_greater([], [1.0]) == 1.0
+
+
+def run(base_stages, now_stages, base_fps=(10.0,), now_fps=(10.0,)):
+    baseline = {"stages": base_stages, "throughput_fps": list(base_fps)}
+    current = {"stages": now_stages, "throughput_fps": list(now_fps)}
+    return compare(baseline, current, ARGS)
+
+
+def test_compare_flags_significant_slowdowns_only():
+    rng = np.random.default_rng(1)
+    steady = list(rng.normal(50, 2, 100))
+    assert run({"request": steady}, {"request": list(np.array(steady) * 1.02)}) == []
+    assert run({"request": steady}, {"request": list(np.array(steady) * 1.5)}) == ["request"]
+
+
+def test_compare_ignores_tiny_absolute_changes_and_missing_stages():
+    fast = [0.1] * 50
+    assert run({"llm.queue": fast}, {"llm.queue": [0.5] * 50}) == []
+    assert set(STAGES) >= {"request", "llm.queue"}
+    assert run({}, {}) == []
+
+
+def test_compare_flags_throughput_drops():
+    assert run({}, {}, base_fps=(10.0, 10.0), now_fps=(8.0, 8.0)) == ["throughput"]
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import precompute
+from analysis_cache import state_key
+from precompute import AnalysisRefresher, canonical_states
+from recommender import EMOTIONS, ENERGY_LEVELS, energy_level, normalize_distribution
+
+
+def test_canonical_states_cover_every_reachable_state():
+    states = canonical_states()
+    unreachable = {("happy", "Low"), ("surprise", "Low"), ("angry", "Low")}
+    assert set(states) == {(e, level) for e in EMOTIONS for level in ENERGY_LEVELS} - unreachable
+    for (dominant, energy), emotion in states.items():
+        distribution = normalize_distribution(emotion)
+        assert max(distribution, key=distribution.get) == dominant
+        assert energy_level(distribution) == energy
+
+
+def test_refresh_regenerates_missing_and_stale_states_and_stops_on_failure():
+    created = {}
+    generated = []
+
+    async def generate(emotion, key):
+        if len(generated) == 2:
+            raise RuntimeError("LLM down")
+        generated.append(key)
+        created[key] = 1000.0
+
+    async def created_at(key):
+        return created.get(key)
+
+    refresher = AnalysisRefresher(generate, created_at, interval=100)
+    fresh = state_key("happy", "High")
+    created[fresh] = 990.0
+
+    async def scenario():
+        stale = await refresher.stale_states(now=1000.0)
+        assert fresh not in [key for key, _ in stale]
+        assert len(stale) == len(refresher.states) - 1
+        return await refresher.refresh_once()
+
+    assert asyncio.run(scenario()) == 2
+    assert refresher.last_pass["generated"] == 2
+
+
+@pytest.mark.parametrize("index, runs", [(None, True), ("0", True), ("3", False)])
+def test_only_one_process_refreshes(monkeypatch, index, runs):
+    monkeypatch.setattr(precompute, "PRECOMPUTE_ENABLED", True)
+    if index is None:
+        monkeypatch.delenv("EMOTICAM_WORKER_INDEX", raising=False)
+    else:
+        monkeypatch.setenv("EMOTICAM_WORKER_INDEX", index)
+    assert precompute.refresher_runs_here() is runs
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import pstats
+
+from profiling import RequestProfiler, profiled_call
+
+
+def offloaded_work():
+    return sum(i * i for i in range(1000))
+
+
+def profiled_functions(path):
+    return {name for _, _, name in pstats.Stats(path).stats}
+
+
+def test_work_handed_to_threads_lands_in_the_request_profile(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path), sample_rate=0.0, admin_token="secret")
+    profile = profiler.start()
+    assert profile is not None
+    assert profiler.start() is None  # one profile at a time
+    ctx = contextvars.copy_context()
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(ctx.run, profiled_call, offloaded_work).result() == 332833500
+    path = profiler.stop(profile, "ab12", "POST /api/emotion")
+
+    assert "offloaded_work" in profiled_functions(path)
+    assert profiler.list()[0]["request"].endswith("POST /api/emotion")
+
+
+def test_work_after_stop_is_not_added(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path), sample_rate=0.0)
+    profile = profiler.start()
+    ctx = contextvars.copy_context()
+    profiler.stop(profile, "cd34", "GET /")
+    ctx.run(profiled_call, offloaded_work)
+    assert profile.threads == []
+    # Outside a profiled request the call just runs
+    assert profiled_call(offloaded_work) == 332833500
+
+
+def test_admin_token_comparison():
+    profiler = RequestProfiler(sample_rate=0.0, admin_token="secret")
+    assert profiler.wanted("secret")
+    assert not profiler.wanted("wrong")
+    assert not profiler.wanted("sécret")  # non-ASCII header value
+    assert not RequestProfiler(sample_rate=0.0, admin_token="").wanted("")
+
+
+def test_path_for_only_accepts_generated_ids(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path), sample_rate=0.0)
+    assert profiler.path_for("../etc/passwd") is None
+    assert profiler.path_for("") is None
+    assert profiler.path_for("ab12") is None
+    (tmp_path / "ab12.prof").write_bytes(b"")
+    assert profiler.path_for("ab12") == str(tmp_path / "ab12.prof")
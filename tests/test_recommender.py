@@ -0,0 +1,38 @@
+import pytest
+
+from llm_analysis import EmotionAnalysis
+from recommender import ENERGY_LEVELS, EMOTIONS, RECOMMENDATIONS, energy_level, normalize_distribution, recommend
+
+
+def test_normalize_distribution_handles_probabilities_and_empty():
+    assert normalize_distribution({"happy": 0.5, "sad": 0.5})["happy"] == pytest.approx(50.0)
+    assert normalize_distribution({})["neutral"] == 100.0
+
+
+@pytest.mark.parametrize("emotion, energy", [
+    ({"sad": 100}, "Low"),
+    ({"neutral": 100}, "Medium"),
+    ({"happy": 100}, "High"),
+])
+def test_energy_levels(emotion, energy):
+    assert energy_level(normalize_distribution(emotion)) == energy
+
+
+def test_recommend_picks_dominant_and_ranks_by_score():
+    analysis, dominant, energy = recommend({"happy": 90.0, "neutral": 10.0})
+    assert (dominant, energy) == ("happy", "High")
+    scores = [q["score"] for q in analysis["queryRanking"]["rankedQueries"]]
+    assert scores == sorted(scores, reverse=True)
+    assert analysis["queryRanking"]["bestMatch"] == analysis["queryRanking"]["rankedQueries"][0]["query"]
+
+
+def test_every_state_is_a_valid_analysis():
+    assert len(RECOMMENDATIONS) == len(EMOTIONS) * len(ENERGY_LEVELS)
+    for analysis in RECOMMENDATIONS.values():
+        EmotionAnalysis.model_validate(analysis)
+
+
+def test_recommend_follows_a_given_stable_state():
+    analysis, dominant, energy = recommend({"happy": 52.0, "neutral": 48.0}, dominant="neutral")
+    assert dominant == "neutral"
+    assert analysis is RECOMMENDATIONS[("neutral", energy)]
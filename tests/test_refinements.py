@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from refinements import FAILED, PENDING, READY, RefinementStore
+
+
+def test_status_is_visible_to_another_store_on_the_same_file(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    worker_a, worker_b = RefinementStore(path), RefinementStore(path)
+
+    async def scenario():
+        refinement_id = await worker_a.create()
+        pending = await worker_b.get(refinement_id)
+        await worker_a.resolve(refinement_id, {"queryRanking": {"bestMatch": "x"}})
+        ready = await worker_b.get(refinement_id)
+        return pending, ready
+
+    pending, ready = asyncio.run(scenario())
+    assert pending == {"status": PENDING, "analysis": None}
+    assert ready == {"status": READY, "analysis": {"queryRanking": {"bestMatch": "x"}}}
+
+
+def test_pending_entries_are_never_evicted(tmp_path):
+    store = RefinementStore(str(tmp_path / "state.sqlite3"), max_entries=2)
+
+    async def scenario():
+        pending = await store.create()
+        for _ in range(5):
+            await store.fail(await store.create())
+        return await store.get(pending)
+
+    assert asyncio.run(scenario())["status"] == PENDING
+    conn = store._conn()
+    assert conn.execute("SELECT COUNT(*) FROM refinements WHERE status != ?", (PENDING,)).fetchone()[0] <= store.max_entries + store.check_every
+
+
+def test_running_task_stays_referenced_until_done(tmp_path):
+    store = RefinementStore(str(tmp_path / "state.sqlite3"))
+
+    async def scenario():
+        refinement_id = await store.create()
+        task = asyncio.ensure_future(asyncio.sleep(0.01))
+        store.attach_task(refinement_id, task)
+        held = refinement_id in store._tasks
+        await task
+        await asyncio.sleep(0)
+        return held, refinement_id in store._tasks
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_abandoned_pending_entry_reads_as_failed(tmp_path):
+    store = RefinementStore(str(tmp_path / "state.sqlite3"), ttl_seconds=60)
+    refinement_id = asyncio.run(store.create())
+    store._conn().execute("UPDATE refinements SET created = ?", (time.time() - 120,))
+    assert asyncio.run(store.get(refinement_id))["status"] == FAILED
@@ -0,0 +1,63 @@
+import pytest
+
+import runtime_topology
+from runtime_topology import Topology, parse_cpu_list
+
+
+@pytest.fixture
+def eight_cpus(monkeypatch):
+    monkeypatch.setattr(runtime_topology, "_available_cpus", lambda: list(range(8)))
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-3,8") == [0, 1, 2, 3, 8]
+    assert parse_cpu_list(" 2 , 5-6 ,") == [2, 5, 6]
+    assert parse_cpu_list("") == []
+
+
+def test_threads_default_to_an_even_share_of_the_cores(eight_cpus):
+    topology = Topology(workers=3)
+    assert topology.intra_op == 2
+    assert topology.inter_op == 1
+    assert topology.cv2_threads == 2
+    assert topology.affinity is None
+    assert Topology(workers=16).intra_op == 1
+    assert Topology(workers=2, intra_op=3, cv2_threads=0).as_dict()["cv2_threads"] == 0
+
+
+def test_auto_affinity_gives_each_worker_its_own_slice(eight_cpus):
+    slices = [Topology(workers=4, worker_index=i, affinity="auto").affinity for i in range(4)]
+    assert slices == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    # More workers than slices wrap around
+    assert Topology(workers=4, worker_index=5, affinity="auto").affinity == [2, 3]
+    assert Topology(workers=2, affinity="1,3").affinity == [1, 3]
+
+
+def test_workers_slice_the_masters_cpu_set_not_their_inherited_mask(eight_cpus, monkeypatch):
+    master = Topology(workers=4, affinity="auto")
+    # A pinned process would only see its own slice from here on
+    monkeypatch.setattr(runtime_topology, "_available_cpus", lambda: [0, 1])
+    assert [master.for_worker(i).affinity for i in range(4)] == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    assert master.for_worker(3).intra_op == 2
+
+
+def test_deferred_master_is_not_pinned_until_the_worker(eight_cpus, monkeypatch):
+    pinned = []
+    monkeypatch.setattr(runtime_topology.os, "sched_setaffinity", lambda pid, cpus: pinned.append(list(cpus)), raising=False)
+    monkeypatch.setattr(runtime_topology, "_topology", None)
+    monkeypatch.setattr(runtime_topology, "_deferred", False)
+    monkeypatch.delenv("EMOTICAM_WORKER_INDEX", raising=False)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        monkeypatch.delenv(var, raising=False)
+
+    master = runtime_topology.configure_env(Topology(workers=2, affinity="auto"), defer=True)
+    assert runtime_topology.os.environ["OMP_NUM_THREADS"] == "4"
+    # The app import configures again without a topology; the master's is kept
+    assert runtime_topology.configure_env() is master
+    assert runtime_topology.apply() is master
+    assert pinned == []
+
+    worker = runtime_topology.configure_worker(1)
+    assert pinned == [[4, 5, 6, 7]]
+    assert worker.worker_index == 1
+    assert runtime_topology.os.environ["EMOTICAM_WORKER_INDEX"] == "1"
@@ -0,0 +1,38 @@
+import numpy as np
+import orjson
+from pydantic import BaseModel
+
+from serialization import ORJSONResponse, dumps
+
+
+class Point(BaseModel):
+    x: int
+    y: int
+
+
+def test_numpy_scalars_and_arrays():
+    payload = {
+        "emotion": {"happy": np.float32(97.5), "sad": np.float64(2.5)},
+        "region": {"x": np.int64(3), "left_eye": (10, 20)},
+        "embedding": np.arange(3, dtype=np.float32),
+        "half": np.float16(0.5),
+    }
+    assert orjson.loads(dumps(payload)) == {
+        "emotion": {"happy": 97.5, "sad": 2.5},
+        "region": {"x": 3, "left_eye": [10, 20]},
+        "embedding": [0.0, 1.0, 2.0],
+        "half": 0.5,
+    }
+
+
+def test_non_contiguous_array_and_model():
+    grid = np.arange(6).reshape(2, 3)[:, ::2]
+    assert orjson.loads(dumps({"grid": grid, "point": Point(x=1, y=2)})) == {
+        "grid": [[0, 2], [3, 5]],
+        "point": {"x": 1, "y": 2},
+    }
+
+
+def test_response_renders_numpy():
+    response = ORJSONResponse({"score": np.float32(0.25)})
+    assert orjson.loads(response.body) == {"score": 0.25}
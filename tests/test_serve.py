@@ -0,0 +1,7 @@
+from serve import RESTART_BACKOFF_MAX, restart_delay
+
+
+def test_restart_backoff_grows_and_is_capped():
+    assert restart_delay(0) == 0.0
+    assert [restart_delay(n) for n in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 8.0]
+    assert restart_delay(50) == RESTART_BACKOFF_MAX
@@ -0,0 +1,96 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from timeline_store import EMOTIONS, TimelineStore, emotion_vector
+
+
+def probs(emotion):
+    return emotion_vector({emotion: 100.0})
+
+
+def append(store, session_id, p, ts):
+    asyncio.run(store.append(session_id, p, ts=ts))
+
+
+def test_emotion_vector_normalizes_percentages():
+    vec = emotion_vector({"happy": 75.0, "sad": 25.0})
+    assert vec[EMOTIONS.index("happy")] == pytest.approx(0.75)
+    assert vec.dtype == np.float32
+
+
+def test_query_filters_by_session_and_range(tmp_path):
+    store = TimelineStore(str(tmp_path), segment_records=3)
+    for i in range(10):
+        append(store, "a" if i % 2 == 0 else "b", probs("happy"), 100.0 + i)
+    records = store.query("a", 102.0, 107.0)
+    assert records["ts"].tolist() == [102.0, 104.0, 106.0]
+
+
+def test_bucketed_means_and_counts(tmp_path):
+    store = TimelineStore(str(tmp_path))
+    append(store, "s", probs("happy"), 0.5)
+    append(store, "s", probs("sad"), 1.5)
+    append(store, "s", probs("sad"), 2.5)
+    starts, means, counts = store.bucketed("s", 0.0, 3.0, 1.0)
+    assert starts.tolist() == [0.0, 1.0, 2.0]
+    assert counts.tolist() == [1, 1, 1]
+    assert means[0, EMOTIONS.index("happy")] == 1.0
+
+    starts, means, counts = store.bucketed("s", 0.0, 3.0, 2.0)
+    assert counts.tolist() == [2, 1]
+    assert means[0, EMOTIONS.index("sad")] == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize("bucket_seconds", [0, -5])
+def test_bucketed_rejects_non_positive_buckets(tmp_path, bucket_seconds):
+    with pytest.raises(ValueError):
+        TimelineStore(str(tmp_path)).bucketed("s", 0.0, 10.0, bucket_seconds)
+
+
+def test_window_average(tmp_path):
+    store = TimelineStore(str(tmp_path))
+    append(store, "s", probs("angry"), 10.0)
+    append(store, "s", probs("happy"), 95.0)
+    append(store, "s", probs("sad"), 99.0)
+    average, samples = store.window_average("s", 10.0, now=100.0)
+    assert samples == 2
+    assert average["happy"] == pytest.approx(0.5) and average["angry"] == 0.0
+
+
+def test_interleaved_workers_are_merged_in_order(tmp_path, monkeypatch):
+    store = TimelineStore(str(tmp_path))
+    for i, worker in enumerate(["0", "1", "1", "0", "1", "0"]):
+        monkeypatch.setenv("EMOTICAM_WORKER_INDEX", worker)
+        append(store, "s", probs("happy"), 10.0 + i)
+    reader = TimelineStore(str(tmp_path))
+    assert reader.query("s", 11.0, 15.0)["ts"].tolist() == [11.0, 12.0, 13.0, 14.0]
+    assert len(reader._chains()) == 2
+
+
+def test_timestamps_never_go_backwards_within_a_segment(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMOTICAM_WORKER_INDEX", "0")
+    store = TimelineStore(str(tmp_path))
+    append(store, "s", probs("happy"), 50.0)
+    append(store, "s", probs("sad"), 40.0)  # clock stepped back
+    assert store.query("s")["ts"].tolist() == [50.0, 50.0]
+    assert len(store.query("s", 45.0, 60.0)) == 2
+
+
+def test_directory_is_scanned_once_per_writer(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMOTICAM_WORKER_INDEX", "0")
+    store = TimelineStore(str(tmp_path), segment_records=2)
+    scans = []
+    chains = store._chains
+    monkeypatch.setattr(store, "_chains", lambda: scans.append(1) or chains())
+    for i in range(5):
+        append(store, "s", probs("happy"), float(i))
+    assert len(scans) == 1
+    assert len(list(tmp_path.iterdir())) == 3  # rolled over at 2 records
+
+    # A restarted writer continues its newest segment
+    resumed = TimelineStore(str(tmp_path), segment_records=2)
+    append(resumed, "s", probs("sad"), 1.0)
+    assert len(list(tmp_path.iterdir())) == 3
+    assert resumed.query("s")["ts"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 4.0]
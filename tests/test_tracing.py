@@ -0,0 +1,43 @@
+import orjson
+import pytest
+
+from tracing import NOOP_SPAN, JsonlSink, Tracer, current_trace_id
+
+
+def read_spans(path):
+    return [orjson.loads(line) for line in path.read_bytes().splitlines()]
+
+
+def test_unsampled_requests_get_the_noop_span(tmp_path):
+    tracer = Tracer(JsonlSink(str(tmp_path / "spans.jsonl")), sample_rate=0.0)
+    with tracer.start_trace("GET /") as root:
+        assert root is NOOP_SPAN
+        assert tracer.span("child") is NOOP_SPAN
+    assert not (tmp_path / "spans.jsonl").exists()
+
+
+def test_children_link_to_their_parent_and_root_flushes(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(JsonlSink(str(path), batch_size=100), sample_rate=0.0)
+    with tracer.start_trace("POST /api/emotion", trace_id="t1", force=True) as root:
+        assert current_trace_id() == "t1"
+        with tracer.span("decode", mode="RGB") as child:
+            child.set(faces=1)
+            with tracer.span("resize"):
+                pass
+    assert current_trace_id() is None
+
+    spans = {s["name"]: s for s in read_spans(path)}
+    assert spans["resize"]["parent_id"] == spans["decode"]["span_id"]
+    assert spans["decode"]["parent_id"] == root.span_id
+    assert spans["decode"]["attrs"] == {"mode": "RGB", "faces": 1}
+    assert {s["trace_id"] for s in spans.values()} == {"t1"}
+
+
+def test_errors_are_recorded_and_propagate(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(JsonlSink(str(path)), sample_rate=1.0)
+    with pytest.raises(KeyError):
+        with tracer.start_trace("job"):
+            raise KeyError("x")
+    assert read_spans(path)[0]["error"] == "KeyError: 'x'"
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from video_index import VideoIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def video(video_id, energy, **emotions):
+    return {"id": video_id, "title": video_id, "energy": energy, "emotions": emotions}
+
+
+@pytest.fixture
+def index():
+    return VideoIndex([
+        video("calm-song", "Low", sad=1.0, neutral=0.5),
+        video("dance-party", "High", happy=1.0),
+        video("story-time", "Medium", neutral=1.0),
+    ])
+
+
+def test_query_ranks_the_closest_video_first(index):
+    results = index.query({"happy": 95.0, "neutral": 5.0}, k=3)
+    assert [r["id"] for r in results][0] == "dance-party"
+    scores = [r["score"] for r in results]
+    assert scores == sorted(scores, reverse=True)
+    assert index.query({"sad": 90.0, "neutral": 10.0}, k=1)[0]["id"] == "calm-song"
+
+
+def test_energy_override_changes_the_ranking(index):
+    neutral = {"neutral": 60.0, "sad": 40.0}
+    assert index.query(neutral, k=1, energy="Medium")[0]["id"] == "story-time"
+    assert index.query(neutral, k=1, energy="Low")[0]["id"] == "calm-song"
+
+
+def test_k_is_clamped(index):
+    assert len(index.query({"happy": 1.0}, k=10)) == len(index) == 3
+    assert index.query({"happy": 1.0}, k=0) == []
+
+
+def test_bad_tags_are_rejected():
+    with pytest.raises(ValueError):
+        VideoIndex([video("x", "Loud", happy=1.0)])
+    with pytest.raises(ValueError):
+        VideoIndex([video("x", "Low", bored=1.0)])
+
+
+def test_shipped_catalog_loads_and_answers():
+    index = VideoIndex.from_file(os.path.join(ROOT, "data", "video_catalog.json"))
+    assert len(index) > 0
+    assert len(index.query({"happy": 80.0, "surprise": 20.0}, k=5)) == min(5, len(index))
+    # Entries are channel searches, and named as such
+    assert all("/search?" in v["searchUrl"] and "url" not in v for v in index.videos)
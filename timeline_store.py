@@ -0,0 +1,230 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+# One fixed-size record per analyzed frame (44 bytes)
+RECORD = np.dtype([
+    ("ts", "<f8"),
+    ("session", "<u8"),
+    ("probs", "<f4", (len(EMOTIONS),)),
+])
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".tl"
+
+
+def session_key(session_id):
+    """
+    Stable 64-bit key for a session id string.
+    """
+    digest = hashlib.blake2b(str(session_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def emotion_vector(emotion):
+    """
+    DeepFace emotion dict (percent) -> float32 probabilities in EMOTIONS order.
+    """
+    vec = np.array([float(emotion.get(e, 0.0)) for e in EMOTIONS], dtype=np.float32)
+    total = vec.sum()
+    return vec / total if total > 0 else vec
+
+
+class _OpenSegment:
+    __slots__ = ("path", "file", "count", "last_ts")
+
+    def __init__(self, path, count, last_ts):
+        self.path = path
+        self.file = open(path, "ab", buffering=0)
+        self.count = count
+        self.last_ts = last_ts
+
+
+class TimelineStore:
+    """
+    Append-only emotion timeline in fixed-record segment files.
+
+    Every writing process has its own chain of segments (named by
+    EMOTICAM_WORKER_INDEX, else the pid), so concurrent workers never
+    interleave records in one file. Within a chain records are appended in
+    timestamp order, and each chain's newest segment is rotated every
+    `segment_records` records. The writer keeps its newest segment open and
+    counts its records, so the directory is only scanned once per writer;
+    `append` does the file I/O on a thread of its own, off the event loop. Reads memory-map the segments,
+    binary-search the timestamp column and mask by session, then merge the
+    chains by timestamp, so range queries and windowed aggregates never
+    materialize Python objects per record.
+    """
+
+    def __init__(self, directory, segment_records=1 << 20):
+        self.directory = directory
+        self.segment_records = segment_records
+        self._lock = threading.Lock()
+        self._sealed = {}  # path -> memmap of full, immutable segments
+        self._open = {}  # writer -> _OpenSegment being appended to
+        self._executor = None
+        # Open files and pool threads are the parent's; a forked worker
+        # starts its own chain
+        os.register_at_fork(after_in_child=self._reset_writer)
+        os.makedirs(directory, exist_ok=True)
+
+    def _reset_writer(self):
+        self._lock = threading.Lock()
+        self._open = {}
+        self._executor = None
+
+    @staticmethod
+    def _writer():
+        # Read at append time: serve.py imports the app before forking
+        return os.getenv("EMOTICAM_WORKER_INDEX") or f"pid{os.getpid()}"
+
+    @staticmethod
+    def _parse(name):
+        # segment-<start ms>-<writer>.tl; older files have no writer part
+        start, _, writer = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)].partition("-")
+        return int(start) / 1000.0, writer
+
+    def _chains(self):
+        """
+        writer -> its segment paths, oldest first.
+        """
+        chains = {}
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                _, writer = self._parse(name)
+                chains.setdefault(writer, []).append(os.path.join(self.directory, name))
+        for paths in chains.values():
+            paths.sort(key=lambda p: self._parse(os.path.basename(p))[0])
+        return chains
+
+    def _map(self, path):
+        mapped = self._sealed.get(path)
+        if mapped is not None:
+            return mapped
+        count = os.path.getsize(path) // RECORD.itemsize  # ignore a torn last record
+        if count == 0:
+            return np.empty(0, dtype=RECORD)
+        mapped = np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+        if count >= self.segment_records:
+            self._sealed[path] = mapped
+        return mapped
+
+    def _resume(self, writer):
+        # Once per writer: continue its newest segment from an earlier run
+        chain = self._chains().get(writer)
+        if not chain:
+            return None
+        records = self._map(chain[-1])
+        last_ts = float(records["ts"][-1]) if len(records) else -np.inf
+        return _OpenSegment(chain[-1], len(records), last_ts)
+
+    def _append(self, session_id, probs, ts):
+        record = np.zeros(1, dtype=RECORD)
+        record["session"] = session_key(session_id)
+        record["probs"] = probs
+
+        with self._lock:
+            writer = self._writer()
+            if writer not in self._open:
+                self._open[writer] = self._resume(writer)
+            segment = self._open[writer]
+            # Timestamps are taken under the lock and never go backwards
+            # within a segment (threads racing, clock steps), which is what
+            # the binary search in query relies on
+            ts = time.time() if ts is None else ts
+            if segment is not None:
+                ts = max(ts, segment.last_ts)
+            record["ts"] = ts
+            if segment is None or segment.count >= self.segment_records:
+                if segment is not None:
+                    segment.file.close()
+                path = os.path.join(
+                    self.directory, f"{SEGMENT_PREFIX}{int(ts * 1000):015d}-{writer}{SEGMENT_SUFFIX}"
+                )
+                segment = self._open[writer] = _OpenSegment(path, 0, ts)
+            # Unbuffered: a reader sees the record as soon as this returns
+            segment.file.write(record.tobytes())
+            segment.count += 1
+            segment.last_ts = ts
+
+    async def append(self, session_id, probs, ts=None):
+        if self._executor is None:
+            # One thread: appends are ordered and never contend for the lock
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="timeline")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, functools.partial(self._append, session_id, probs, ts))
+
+    def query(self, session_id, start=None, end=None):
+        """
+        Records of one session with start <= ts < end, as a structured array
+        in timestamp order.
+        """
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        key = session_key(session_id)
+
+        chains = self._chains()
+        parts = []
+        for segments in chains.values():
+            for i, path in enumerate(segments):
+                seg_start = self._parse(os.path.basename(path))[0]
+                seg_end = self._parse(os.path.basename(segments[i + 1]))[0] if i + 1 < len(segments) else np.inf
+                if seg_end <= start or seg_start >= end:
+                    continue
+                records = self._map(path)
+                ts = records["ts"]
+                lo = np.searchsorted(ts, start, side="left")
+                hi = np.searchsorted(ts, end, side="left")
+                window = records[lo:hi]
+                parts.append(window[window["session"] == key])
+
+        if not parts:
+            return np.empty(0, dtype=RECORD)
+        records = np.concatenate(parts)
+        if len(chains) > 1:
+            records = records[np.argsort(records["ts"], kind="stable")]
+        return records
+
+    def window_average(self, session_id, seconds, now=None):
+        """
+        Mean distribution of a session over the last `seconds` and the sample count.
+        """
+        now = time.time() if now is None else now
+        records = self.query(session_id, now - seconds, np.inf)
+        if len(records) == 0:
+            return {e: 0.0 for e in EMOTIONS}, 0
+        mean = records["probs"].mean(axis=0)
+        return dict(zip(EMOTIONS, mean.tolist())), len(records)
+
+    def bucketed(self, session_id, start, end, bucket_seconds):
+        """
+        Mean distribution per time bucket over [start, end).
+
+        Returns (bucket_starts, means (B, 7), counts (B,)); empty buckets are zero.
+        """
+        if not bucket_seconds > 0:
+            raise ValueError("bucket_seconds must be positive")
+        records = self.query(session_id, start, end)
+        n_buckets = max(1, int(np.ceil((end - start) / bucket_seconds)))
+        sums = np.zeros((n_buckets, len(EMOTIONS)), dtype=np.float64)
+        counts = np.zeros(n_buckets, dtype=np.int64)
+        if len(records):
+            idx = ((records["ts"] - start) // bucket_seconds).astype(np.int64)
+            np.add.at(sums, idx, records["probs"])
+            np.add.at(counts, idx, 1)
+        means = sums / np.maximum(counts, 1)[:, None]
+        bucket_starts = start + np.arange(n_buckets) * bucket_seconds
+        return bucket_starts, means.astype(np.float32), counts
+
+
+def store_from_env():
+    return TimelineStore(os.getenv("EMOTICAM_TIMELINE_DIR", "timeline"))
@@ -0,0 +1,135 @@
+from contextvars import ContextVar
+import atexit
+import os
+import random
+import threading
+import time
+import uuid
+
+import orjson
+
+
+# Fraction of requests traced; unsampled requests only pay a contextvar lookup
+SAMPLE_RATE = float(os.getenv("EMOTICAM_TRACE_SAMPLE", "0.01"))
+TRACE_FILE = os.getenv("EMOTICAM_TRACE_FILE", os.path.join("traces", "spans.jsonl"))
+
+_current = ContextVar("emoticam_span", default=None)
+
+
+class _NoopSpan:
+    trace_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlSink:
+    """
+    Appends finished spans as JSON lines, flushed in batches.
+    """
+
+    def __init__(self, path, batch_size=64):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def emit(self, record, flush=False):
+        with self._lock:
+            self._pending.append(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY))
+            if flush or len(self._pending) >= self.batch_size:
+                self._write()
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(b"\n".join(lines) + b"\n")
+
+
+class Span:
+    def __init__(self, tracer, name, trace_id, parent_id, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.error = None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.time()
+        self._perf = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = (time.perf_counter() - self._perf) * 1000
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer.sink.emit({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(duration, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }, flush=self.parent_id is None)
+        return False
+
+
+class Tracer:
+    def __init__(self, sink, sample_rate=SAMPLE_RATE):
+        self.sink = sink
+        self.sample_rate = sample_rate
+
+    def start_trace(self, name, trace_id=None, force=False, **attrs):
+        """
+        Root span for a request, or NOOP_SPAN if the request is not sampled.
+        """
+        if not force and random.random() >= self.sample_rate:
+            return NOOP_SPAN
+        return Span(self, name, trace_id or uuid.uuid4().hex, None, attrs)
+
+    def span(self, name, **attrs):
+        """
+        Child of the current span; a no-op outside a sampled trace.
+        """
+        parent = _current.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attrs)
+
+
+def current_trace_id():
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+tracer = Tracer(JsonlSink(TRACE_FILE))
+atexit.register(tracer.sink.flush)
+span = tracer.span
@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy as np
+
+from recommender import EMOTIONS, ENERGY_LEVELS, energy_level, normalize_distribution
+
+
+# Share of the similarity that comes from matching energy rather than emotion
+ENERGY_WEIGHT = 0.3
+# Soft energy match: a Medium item still partly suits a Low or High child
+ENERGY_KERNEL = np.array([
+    [1.0, 0.5, 0.0],
+    [0.5, 1.0, 0.5],
+    [0.0, 0.5, 1.0],
+], dtype=np.float32)
+
+
+class VideoIndex:
+    """
+    Nearest-neighbour lookup over a curated catalog of kid-safe video
+    searches.
+
+    Each entry is a themed search inside a vetted kids' channel (`searchUrl`),
+    not a single video, so `typicalMinutes` is the usual length of what it
+    finds. Each entry is tagged with target emotion weights and an energy level.
+    Tags are packed once into a row-normalized float32 matrix
+    [emotion weights | energy one-hot]; a query builds the same kind of
+    vector from a DeepFace distribution, and one matrix-vector product scores
+    the whole catalog.
+    """
+
+    def __init__(self, videos):
+        self.videos = videos
+        self.matrix = np.zeros((len(videos), len(EMOTIONS) + len(ENERGY_LEVELS)), dtype=np.float32)
+        for row, video in zip(self.matrix, videos):
+            unknown = set(video["emotions"]) - set(EMOTIONS)
+            if unknown or video["energy"] not in ENERGY_LEVELS:
+                raise ValueError(f"bad tags on catalog entry {video['id']}")
+            emotions = np.array([float(video["emotions"].get(e, 0.0)) for e in EMOTIONS], dtype=np.float32)
+            row[:len(EMOTIONS)] = (1.0 - ENERGY_WEIGHT) * emotions / (np.linalg.norm(emotions) or 1.0)
+            row[len(EMOTIONS) + ENERGY_LEVELS.index(video["energy"])] = ENERGY_WEIGHT
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["videos"])
+
+    def query_vector(self, emotion, energy=None):
+        distribution = normalize_distribution(emotion)
+        probs = np.array([distribution[e] for e in EMOTIONS], dtype=np.float32)
+        probs /= np.linalg.norm(probs) or 1.0
+        # Same energy thresholds as the rule-based recommender
+        energy = energy or energy_level(distribution)
+        return np.concatenate([probs, ENERGY_KERNEL[ENERGY_LEVELS.index(energy)]])
+
+    def query(self, emotion, k=5, energy=None):
+        """
+        Top-k catalog entries for a DeepFace emotion dict, best first, each
+        with its similarity score.
+        """
+        k = min(k, len(self.videos))
+        if k <= 0:
+            return []
+        scores = self.matrix @ self.query_vector(emotion, energy)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.videos[i], score=round(float(scores[i]), 4)) for i in top]
+
+    def __len__(self):
+        return len(self.videos)
+
+
+def index_from_env():
+    path = os.getenv("EMOTICAM_VIDEO_CATALOG", os.path.join("data", "video_catalog.json"))
+    return VideoIndex.from_file(path)